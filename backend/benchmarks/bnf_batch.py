@@ -0,0 +1,141 @@
+"""BnF lookups of a batch of ISBNs: one SRU query per ISBN against batches
+
+A mock transport stands in for the BnF catalogue, answering every request
+after a simulated round trip. It finds a Dublin Core record for most of
+the ISBNs of a query and a default cover for every record. The ISBNs are
+looked up one by one with `isbn2book_bnf`, at most
+`constants.ISBN_PROVIDER_CONCURRENCY` at a time as in a batch ingestion,
+then with `isbns2books_bnf`.
+
+    python -m backend.benchmarks.bnf_batch
+"""
+
+from io import BytesIO
+
+import asyncio
+import random
+import re
+import time
+
+import httpx
+import isbnlib
+from PIL import Image
+
+from backend.benchmarks.tools import print_table
+from backend.internals import constants
+from backend.internals.book_notice import (
+    ProviderLimits,
+    _query_provider,
+    isbn2book_bnf,
+    isbns2books_bnf,
+)
+
+ISBN_COUNT = 200
+FOUND_RATE = 0.8
+ROUND_TRIP = 0.05  # seconds
+
+RECORD = """<srw:record><srw:recordData>
+<oai_dc:dc xmlns:oai_dc="http://www.openarchives.org/OAI/2.0/oai_dc/"
+  xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:identifier>http://catalogue.bnf.fr/ark:/12148/cb{isbn}</dc:identifier>
+<dc:identifier>ISBN {isbn}</dc:identifier>
+<dc:title>Title {isbn} / Author</dc:title>
+<dc:publisher>Publisher (Paris)</dc:publisher>
+<dc:date>2020</dc:date>
+<dc:format>200 p.</dc:format>
+<dc:language>fre</dc:language>
+</oai_dc:dc></srw:recordData>
+<srw:recordIdentifier>ark:/12148/cb{isbn}</srw:recordIdentifier></srw:record>"""
+
+
+def default_cover() -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (92, 138)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def bnf_transport(found: set[str]) -> tuple[httpx.MockTransport, dict]:
+    counts = {"sru": 0, "cover": 0}
+    cover = default_cover()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(ROUND_TRIP)
+        if request.url.path == "/api/SRU":
+            counts["sru"] += 1
+            isbns = re.findall(r'"(\d{13})"', request.url.params["query"])
+            records = [RECORD.format(isbn=isbn) for isbn in isbns if isbn in found]
+            return httpx.Response(
+                200,
+                text='<srw:searchRetrieveResponse xmlns:srw="http://www.loc.gov/zing/srw/">'
+                f"<srw:numberOfRecords>{len(records)}</srw:numberOfRecords>"
+                f"<srw:records>{''.join(records)}</srw:records>"
+                "</srw:searchRetrieveResponse>",
+            )
+        counts["cover"] += 1
+        return httpx.Response(200, content=cover)
+
+    return httpx.MockTransport(handler), counts
+
+
+async def main() -> None:
+    generator = random.Random(0)
+    isbns = []
+    for index in range(ISBN_COUNT):
+        digits = f"978207{index:06}"
+        isbns.append(digits + isbnlib.check_digit13(digits))
+    found = {isbn for isbn in isbns if generator.random() < FOUND_RATE}
+
+    rows = []
+    transport, counts = bnf_transport(found)
+    async with httpx.AsyncClient(transport=transport) as client:
+        limits = ProviderLimits()
+        start = time.perf_counter()
+        books = await asyncio.gather(
+            *(
+                _query_provider(
+                    limits, "bnf", isbn2book_bnf, isbn, "dublincore", client=client
+                )
+                for isbn in isbns
+            )
+        )
+        duration = time.perf_counter() - start
+        rows.append(
+            [
+                "one query per ISBN",
+                sum(book is not None for book in books),
+                counts["sru"],
+                counts["cover"],
+                duration,
+            ]
+        )
+
+    transport, counts = bnf_transport(found)
+    async with httpx.AsyncClient(transport=transport) as client:
+        start = time.perf_counter()
+        chunks = [
+            isbns[start : start + constants.BNF_SRU_BATCH_SIZE]
+            for start in range(0, len(isbns), constants.BNF_SRU_BATCH_SIZE)
+        ]
+        results = await asyncio.gather(
+            *(isbns2books_bnf(chunk, client=client) for chunk in chunks)
+        )
+        duration = time.perf_counter() - start
+        rows.append(
+            [
+                f"batches of {constants.BNF_SRU_BATCH_SIZE}",
+                sum(len(books) for books in results),
+                counts["sru"],
+                counts["cover"],
+                duration,
+            ]
+        )
+
+    print(
+        f"{ISBN_COUNT} ISBNs, {len(found)} in the catalogue, "
+        f"{ROUND_TRIP * 1000:.0f} ms round trip\n"
+    )
+    print_table(["lookup", "found", "SRU requests", "cover requests", "s"], rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
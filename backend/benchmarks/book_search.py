@@ -0,0 +1,71 @@
+"""Book search latency: FTS5 index against LIKE scans
+
+Compares `GET /books/search` with the LIKE search of the proof of concept,
+which normalizes every title and author before comparing them.
+
+    python -m backend.benchmarks.book_search
+"""
+
+from sqlalchemy.sql import func, or_
+from sqlmodel import Session, select
+
+from backend.benchmarks.tools import (
+    benchmark_client,
+    insert_books,
+    measure,
+    print_table,
+    temporary_engine,
+)
+from backend.internals.book_search import search_books_statement
+from backend.models import BookTable
+
+BOOK_COUNT = 100_000
+QUERIES = ["Title 4242", "Author 17", "nothing matches"]
+
+
+def normalize_column(column):
+    return func.replace(func.replace(func.lower(column), " ", ""), "-", "")
+
+
+def like_statement(query: str):
+    pattern = f"%{query.lower().replace(' ', '').replace('-', '')}%"
+    return select(BookTable).where(
+        or_(
+            normalize_column(BookTable.title).like(pattern),
+            normalize_column(BookTable.author).like(pattern),
+        )
+    )
+
+
+def main() -> None:
+    rows = []
+    with temporary_engine() as engine:
+        insert_books(engine, BOOK_COUNT)
+
+        with Session(engine) as session, benchmark_client(engine) as client:
+            for query in QUERIES:
+                like = measure(
+                    lambda: session.exec(like_statement(query).limit(20)).all(),
+                    repeat=5,
+                )
+                fts = measure(
+                    lambda: session.exec(search_books_statement(query).limit(20)).all()
+                )
+                endpoint = measure(
+                    lambda: client.get("/api/v1/books/search", params={"q": query})
+                )
+                rows.append([query, like, fts, endpoint])
+
+    print_table(
+        [
+            f"query on {BOOK_COUNT} books",
+            "LIKE (ms)",
+            "FTS5 (ms)",
+            "GET /books/search (ms)",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
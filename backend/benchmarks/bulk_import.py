@@ -0,0 +1,64 @@
+"""Book import throughput: one POST per book against POST /books/bulk
+
+python -m backend.benchmarks.bulk_import
+"""
+
+import json
+import time
+
+from backend.benchmarks.tools import (
+    benchmark_client,
+    book_rows,
+    print_table,
+    temporary_engine,
+)
+
+SINGLE_POST_COUNT = 2_000
+BULK_COUNT = 20_000
+
+
+def main() -> None:
+    rows = []
+
+    with temporary_engine() as engine, benchmark_client(engine) as client:
+        books = book_rows(SINGLE_POST_COUNT)
+        start = time.perf_counter()
+        for book in books:
+            client.post("/api/v1/books", json=book)
+        duration = time.perf_counter() - start
+        rows.append(["POST /books", SINGLE_POST_COUNT, duration, len(books) / duration])
+
+    for content_type in ["application/x-ndjson", "text/csv"]:
+        books = book_rows(BULK_COUNT)
+        if content_type == "text/csv":
+            fields = list(books[0])
+            content = "\n".join(
+                [",".join(fields)]
+                + [",".join(str(book[field]) for field in fields) for book in books]
+            )
+        else:
+            content = "\n".join(json.dumps(book) for book in books)
+
+        with temporary_engine() as engine, benchmark_client(engine) as client:
+            start = time.perf_counter()
+            response = client.post(
+                "/api/v1/books/bulk",
+                content=content,
+                headers={"content-type": content_type},
+            )
+            duration = time.perf_counter() - start
+            assert response.json()["inserted"] == BULK_COUNT
+        rows.append(
+            [
+                f"POST /books/bulk ({content_type})",
+                BULK_COUNT,
+                duration,
+                BULK_COUNT / duration,
+            ]
+        )
+
+    print_table(["method", "books", "duration (s)", "rows per second"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Sync and async database sessions of the routes under concurrent requests
+
+The application is called in process through an `httpx.ASGITransport`, on a
+temporary database file. Each client repeats a mix of book list, book read
+and book update requests. The routes query the database either through sync
+sessions on the thread pool, or through aiosqlite sessions on the event
+loop, as selected by `DatabaseSettings.async_sessions`. The benchmark
+measures the throughput, the request latencies and the lag of the event
+loop, i.e. how late a task sleeping 1 ms wakes up.
+"""
+
+from typing import AsyncIterator
+
+import asyncio
+import random
+import statistics
+import time
+
+import httpx
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.benchmarks.tools import insert_books, print_table, temporary_engine
+from backend.database import (
+    DatabaseSettings,
+    get_async_session,
+    get_database_settings,
+    get_session,
+)
+from backend.main import app
+
+BOOK_COUNT = 10_000
+REQUESTS = 600
+CONCURRENCIES = [1, 8, 32, 128]
+
+
+async def book_requests(client: httpx.AsyncClient, random_generator, count: int):
+    durations = []
+    errors = 0
+    for index in range(count):
+        book_id = random_generator.randrange(1, BOOK_COUNT + 1)
+        start = time.perf_counter()
+        if index % 3 == 0:
+            response = await client.get("/api/v1/books", params={"limit": 20})
+        elif index % 3 == 1:
+            response = await client.get(f"/api/v1/books/{book_id}")
+        else:
+            response = await client.patch(
+                f"/api/v1/books/{book_id}", json={"available": index % 2 == 0}
+            )
+        durations.append(time.perf_counter() - start)
+        errors += response.status_code != 200
+    return durations, errors
+
+
+async def loop_lags(stop: asyncio.Event) -> list[float]:
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - start - 0.001)
+    return lags
+
+
+async def run(engine: Engine, async_sessions: bool, concurrency: int) -> list:
+    async_engine = create_async_engine(
+        str(engine.url).replace("sqlite", "sqlite+aiosqlite", 1)
+    )
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    async def get_async_session_override() -> AsyncIterator[AsyncSession]:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    settings = DatabaseSettings(async_sessions=async_sessions)
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    app.dependency_overrides[get_database_settings] = lambda: settings
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            stop = asyncio.Event()
+            lags = asyncio.create_task(loop_lags(stop))
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(
+                    book_requests(client, random.Random(index), REQUESTS // concurrency)
+                    for index in range(concurrency)
+                )
+            )
+            duration = time.perf_counter() - start
+            stop.set()
+            lags = await lags
+    finally:
+        app.dependency_overrides.clear()
+        await async_engine.dispose()
+
+    durations = [duration for result in results for duration in result[0]]
+    quantiles = statistics.quantiles(durations, n=100)
+    return [
+        "async" if async_sessions else "sync",
+        concurrency,
+        len(durations) / duration,
+        quantiles[49] * 1000,
+        quantiles[94] * 1000,
+        max(lags) * 1000,
+        sum(result[1] for result in results),
+    ]
+
+
+async def main() -> None:
+    rows = []
+    with temporary_engine() as engine:
+        insert_books(engine, BOOK_COUNT)
+        for concurrency in CONCURRENCIES:
+            for async_sessions in (False, True):
+                rows.append(await run(engine, async_sessions, concurrency))
+
+    print(f"\nBook list, read and update requests, {REQUESTS} per run\n")
+    print_table(
+        [
+            "sessions",
+            "concurrency",
+            "requests / s",
+            "p50 ms",
+            "p95 ms",
+            "max loop lag ms",
+            "errors",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
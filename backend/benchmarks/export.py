@@ -0,0 +1,80 @@
+"""Whole catalog extraction: paging through the list API against the export
+
+Measures the duration and the peak Python memory of reading every book
+page by page as `GET /books?limit=100&page=N` does, and by streaming them
+as `GET /books/export` does. The test client buffers whole responses, so
+the server side functions are measured directly.
+
+    python -m backend.benchmarks.export
+"""
+
+from typing import Callable
+
+import time
+import tracemalloc
+
+from sqlmodel import Session, select
+
+from backend.benchmarks.tools import insert_books, print_table, temporary_engine
+from backend.internals.table_export import ExportFormat, export_rows
+from backend.internals.table_management import paginate
+from backend.models import BookPublic, BookTable
+
+TABLE_SIZES = [10_000, 50_000]
+
+
+def measure_with_memory(function: Callable[[], int]) -> tuple[float, float, int]:
+    """Duration in seconds, peak memory in MiB and result of `function`"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function()
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return duration, peak / 2**20, result
+
+
+def main() -> None:
+    rows = []
+    for table_size in TABLE_SIZES:
+        with temporary_engine() as engine, Session(engine) as session:
+            insert_books(engine, table_size)
+
+            def walk_pages() -> int:
+                count = 0
+                page = 1
+                while True:
+                    data, _ = paginate(
+                        session, select(BookTable), page, 100, cached_table=BookTable
+                    )
+                    if not data:
+                        return count
+                    count += len(
+                        [
+                            BookPublic.model_validate(book).model_dump_json()
+                            for book in data
+                        ]
+                    )
+                    session.expunge_all()
+                    page += 1
+
+            def export(format: ExportFormat) -> int:
+                statement = select(BookTable).order_by(BookTable.id)
+                count = 0
+                for chunk in export_rows(session, statement, BookPublic, format):
+                    count += chunk.count("\n")
+                return count
+
+            for name, function in [
+                ("pages of 100", walk_pages),
+                ("export NDJSON", lambda: export(ExportFormat.ndjson)),
+                ("export CSV", lambda: export(ExportFormat.csv)),
+            ]:
+                duration, peak, count = measure_with_memory(function)
+                rows.append([table_size, name, count, duration, peak])
+
+    print_table(["books", "method", "lines read", "duration (s)", "peak (MiB)"], rows)
+
+
+if __name__ == "__main__":
+    main()
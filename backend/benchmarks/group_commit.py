@@ -0,0 +1,160 @@
+"""Checkout rush, with and without the group commits of the writes
+
+Each client checks books out: it creates a circulation, then marks its
+book as unavailable, through the API called in process with an
+`httpx.ASGITransport`. The writes are committed either by each request on
+its own aiosqlite connection, or in groups by the `WriteCoordinator`, on a
+temporary database file opened with a storage profile. The benchmark
+measures the checkouts per second, their latencies and the commits.
+"""
+
+from datetime import date
+from typing import AsyncIterator
+
+import asyncio
+import statistics
+import time
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from backend.benchmarks.tools import insert_books, print_table, temporary_engine
+from backend.database import (
+    DatabaseSettings,
+    StorageProfile,
+    enable_storage_profile,
+    get_async_session,
+    get_database_settings,
+    get_session,
+)
+from backend.internals.write_coordinator import WriteCoordinator, create_writer_engine
+from backend.main import app
+from backend.models import MemberTable
+
+BOOK_COUNT = 2_000
+CHECKOUTS = 400
+CONCURRENCIES = [1, 16, 64]
+PROFILES = [StorageProfile.wal, StorageProfile.durable]
+
+
+async def checkouts(client: httpx.AsyncClient, book_ids: range) -> tuple[list, int]:
+    durations = []
+    errors = 0
+    for book_id in book_ids:
+        start = time.perf_counter()
+        response = await client.post(
+            "/api/v1/circulations",
+            json={
+                "borrowed_date": str(date.today()),
+                "book_id": book_id,
+                "member_id": 1,
+            },
+        )
+        errors += response.status_code != 200
+        response = await client.patch(
+            f"/api/v1/books/{book_id}", json={"available": False}
+        )
+        errors += response.status_code != 200
+        durations.append(time.perf_counter() - start)
+    return durations, errors
+
+
+async def run(
+    engine: Engine, profile: StorageProfile, group_commit: bool, concurrency: int
+) -> list:
+    settings = DatabaseSettings(storage_profile=profile, group_commit=group_commit)
+    async_engine = create_async_engine(
+        str(engine.url).replace("sqlite", "sqlite+aiosqlite", 1)
+    )
+    enable_storage_profile(async_engine.sync_engine, settings)
+    writer_engine = create_writer_engine(str(engine.url))
+    enable_storage_profile(writer_engine, settings)
+    commits = []
+    for counted_engine in (async_engine.sync_engine, writer_engine):
+        event.listen(counted_engine, "commit", lambda connection: commits.append(1))
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    async def get_async_session_override() -> AsyncIterator[AsyncSession]:
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    app.dependency_overrides[get_database_settings] = lambda: settings
+    app.state.write_coordinator = WriteCoordinator(writer_engine)
+    app.state.write_coordinator.start()
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    per_client = CHECKOUTS // concurrency
+    try:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://benchmark"
+        ) as client:
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(
+                    checkouts(
+                        client,
+                        range(index * per_client + 1, (index + 1) * per_client + 1),
+                    )
+                    for index in range(concurrency)
+                )
+            )
+            duration = time.perf_counter() - start
+    finally:
+        await app.state.write_coordinator.stop()
+        del app.state.write_coordinator
+        app.dependency_overrides.clear()
+        await async_engine.dispose()
+        writer_engine.dispose()
+
+    durations = [duration for result in results for duration in result[0]]
+    quantiles = statistics.quantiles(durations, n=100)
+    return [
+        profile.value,
+        "group" if group_commit else "per request",
+        concurrency,
+        len(durations) / duration,
+        quantiles[49] * 1000,
+        quantiles[94] * 1000,
+        len(commits),
+        sum(result[1] for result in results),
+    ]
+
+
+async def main() -> None:
+    rows = []
+    for profile in PROFILES:
+        for concurrency in CONCURRENCIES:
+            for group_commit in (False, True):
+                with temporary_engine() as engine:
+                    insert_books(engine, BOOK_COUNT)
+                    with Session(engine) as session:
+                        session.add(MemberTable(firstname="Ada", surname="Lovelace"))
+                        session.commit()
+                    rows.append(await run(engine, profile, group_commit, concurrency))
+
+    print(f"\n{CHECKOUTS} checkouts, a circulation insert and a book update each\n")
+    print_table(
+        [
+            "profile",
+            "writes",
+            "concurrency",
+            "checkouts / s",
+            "p50 ms",
+            "p95 ms",
+            "commits",
+            "errors",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
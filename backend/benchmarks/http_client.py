@@ -0,0 +1,170 @@
+"""Metadata provider lookups with a client per lookup against a shared client
+
+A local HTTPS server stands in for a provider. It adds a simulated network
+round trip to every request, and two to every new connection for the TCP
+and TLS handshakes. Each lookup sends two requests to it, as the BnF
+lookup does for the record and the cover. The lookups are run one after
+the other, then concurrently, with a new `httpx.AsyncClient` per lookup
+as the providers used to do, and with the shared client of the
+application.
+
+    python -m backend.benchmarks.http_client
+"""
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import asyncio
+import ssl
+import time
+
+import httpx
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.x509.oid import NameOID
+
+from backend.benchmarks.tools import print_table
+from backend.internals.http_client import create_http_client
+
+LOOKUPS = 50
+CONCURRENCY = 10
+ROUND_TRIP = 0.005  # simulated network round trip, in seconds
+BODY = b"<record>" + b"x" * 2000 + b"</record>"
+
+
+def write_certificate(directory: Path) -> tuple[Path, Path]:
+    """Self-signed certificate of localhost, return (certificate, key) paths"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.now(timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - timedelta(days=1))
+        .not_valid_after(now + timedelta(days=1))
+        .add_extension(
+            x509.SubjectAlternativeName([x509.DNSName("localhost")]), critical=False
+        )
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    certificate_path = directory / "certificate.pem"
+    key_path = directory / "key.pem"
+    certificate_path.write_bytes(certificate.public_bytes(serialization.Encoding.PEM))
+    key_path.write_bytes(
+        key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+    )
+    return certificate_path, key_path
+
+
+class StandInServer:
+    """Minimal HTTP/1.1 keep-alive server counting its connections"""
+
+    def __init__(self) -> None:
+        self.connections = 0
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connections += 1
+        # TCP and TLS 1.3 handshakes
+        await asyncio.sleep(2 * ROUND_TRIP)
+        try:
+            while True:
+                request = await reader.readuntil(b"\r\n\r\n")
+                if not request:
+                    break
+                await asyncio.sleep(ROUND_TRIP)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/xml\r\n"
+                    + f"Content-Length: {len(BODY)}\r\n\r\n".encode()
+                    + BODY
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def lookup(client: httpx.AsyncClient, url: str, index: int) -> None:
+    record = await client.get(f"{url}/record/{index}")
+    cover = await client.get(f"{url}/cover/{index}")
+    assert record.status_code == cover.status_code == 200
+
+
+async def run_lookups(lookup_once, concurrency: int) -> float:
+    """Duration in seconds of LOOKUPS lookups, `concurrency` at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(index: int) -> None:
+        async with semaphore:
+            await lookup_once(index)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(bounded(index) for index in range(LOOKUPS)))
+    return time.perf_counter() - start
+
+
+async def main() -> None:
+    with TemporaryDirectory() as directory:
+        certificate_path, key_path = write_certificate(Path(directory))
+        server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        server_context.load_cert_chain(certificate_path, key_path)
+
+        stand_in = StandInServer()
+        server = await asyncio.start_server(
+            stand_in.handle, "localhost", 0, ssl=server_context
+        )
+        port = server.sockets[0].getsockname()[1]
+        url = f"https://localhost:{port}"
+
+        async def client_per_lookup(index: int) -> None:
+            # httpx builds a new SSL context for every client
+            context = ssl.create_default_context(cafile=certificate_path)
+            async with httpx.AsyncClient(verify=context) as client:
+                await lookup(client, url, index)
+
+        shared_client = create_http_client(
+            verify=ssl.create_default_context(cafile=certificate_path)
+        )
+
+        async def shared(index: int) -> None:
+            await lookup(shared_client, url, index)
+
+        rows = []
+        async with server, shared_client:
+            for concurrency in [1, CONCURRENCY]:
+                for name, lookup_once in [
+                    ("client per lookup", client_per_lookup),
+                    ("shared client", shared),
+                ]:
+                    stand_in.connections = 0
+                    duration = await run_lookups(lookup_once, concurrency)
+                    rows.append(
+                        [
+                            name,
+                            concurrency,
+                            duration * 1000 / LOOKUPS,
+                            LOOKUPS / duration,
+                            stand_in.connections,
+                        ]
+                    )
+
+    print(f"{LOOKUPS} lookups of 2 requests, {ROUND_TRIP * 1000:.0f} ms round trip\n")
+    print_table(
+        ["client", "concurrency", "ms / lookup", "lookups / s", "connections"], rows
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
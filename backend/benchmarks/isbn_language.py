@@ -0,0 +1,58 @@
+"""Language inference of an ISBN: group table against the babelfish scan
+
+Compares `isbn2language`, which reads the table of the registration groups
+met so far, with the former implementation, which called `isbnlib.info`
+then scanned every language of babelfish.
+
+    python -m backend.benchmarks.isbn_language
+"""
+
+import time
+
+import babelfish
+import isbnlib
+
+from backend.benchmarks.tools import measure, print_table
+from backend.internals import isbn_language
+from backend.internals.isbn_language import isbn2language
+
+ISBNS = ["9782070438617", "9780141036144", "9784000000000", "9789932000005"]
+REPEAT = 1000
+
+
+def scan_isbn2language(isbn):
+    words = isbnlib.info(isbn).split()
+    if not words:
+        return None
+    lang = words[0]
+    lang2 = [item.alpha2 for item in babelfish.LANGUAGE_MATRIX if item.name == lang]
+    if len(lang2) > 0:
+        return lang2[0]
+    return None
+
+
+def main() -> None:
+    rows = []
+    for isbn in ISBNS:
+        isbn_language.group_languages.clear()
+        start = time.perf_counter()
+        isbn2language(isbn)
+        first = (time.perf_counter() - start) * 1000
+        print(f"First lookup of {isbn} in {first:.2f} ms")
+        scan = measure(lambda: [scan_isbn2language(isbn) for _ in range(REPEAT)])
+        table = measure(lambda: [isbn2language(isbn) for _ in range(REPEAT)])
+        rows.append(
+            [
+                isbn,
+                isbn2language(isbn),
+                scan * 1000 / REPEAT,
+                table * 1000 / REPEAT,
+                scan / table,
+            ]
+        )
+    print()
+    print_table(["isbn", "language", "scan µs", "table µs", "speedup"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""Book lookups replayed from recorded provider responses
+
+The requests of `isbn2book` are answered by a `ReplayTransport` from a
+recording of the provider responses, behind the per host limits of the
+shared client. Each host answers after a simulated latency; the latencies
+below are assumptions, not measurements. The benchmark measures:
+
+- the end-to-end latency of `isbn2book` for each ISBN, one at a time
+- the throughput of lookups at several concurrencies, with all providers
+  answering and with injected failures
+- the parse cost of each provider lookup, replayed without latency
+
+The recording of the unit tests is replayed by default. A recording of the
+live providers can be made, then replayed, with:
+
+    python -m backend.benchmarks.isbn_lookup --record recording.json isbns.txt
+    python -m backend.benchmarks.isbn_lookup recording.json isbns.txt
+"""
+
+from pathlib import Path
+
+import asyncio
+import statistics
+import sys
+import time
+
+import httpx
+import isbnlib
+
+from backend.benchmarks.tools import print_table
+from backend.config import Settings, get_settings
+from backend.internals import book_notice
+from backend.internals.http_client import (
+    HostLimitedTransport,
+    get_http_client_settings,
+)
+from backend.internals.provider_health import provider_health
+from backend.internals.provider_replay import (
+    HostBehaviour,
+    Recording,
+    RecordingTransport,
+    ReplayTransport,
+)
+from backend.internals.provider_scheduler import provider_scheduler
+
+RECORDING = (
+    Path(__file__).parent.parent
+    / "unit_tests"
+    / "fixtures"
+    / "providers"
+    / "recording.json"
+)
+# ISBNs of the recording: found by BnF, by Google Books, by BAnQ only, nowhere
+ISBNS = ["9782070360123", "9780141036144", "9782890379046", "9791099999993"]
+REPLAY_SETTINGS = Settings(
+    admin_email="admin@example.com",
+    google_api_key="key",
+    google_custom_search_engine="engine",
+)
+
+REPEAT = 5
+LOOKUPS = 32
+CONCURRENCIES = [4, 16, 32]
+JITTER = 0.5  # share of the latency added at random
+# Simulated latency of each host, in seconds
+HOST_LATENCIES = {
+    "catalogue.bnf.fr": 0.30,
+    "www.googleapis.com": 0.15,
+    "openlibrary.org": 0.40,
+    "covers.openlibrary.org": 0.25,
+    "www.sudoc.fr": 0.25,
+    "cap.banq.qc.ca": 0.20,
+}
+# Scenario: host: (failure rate, failure)
+SCENARIOS: dict[str, dict[str, tuple[float, str]]] = {
+    "healthy": {},
+    "Google Books errors 30%": {"www.googleapis.com": (0.3, "error")},
+    "BnF 503 20%": {"catalogue.bnf.fr": (0.2, "status")},
+}
+
+
+def read_isbns(path: str) -> list[str]:
+    """EAN-13 of the valid ISBNs of a file, one per line"""
+    with open(path) as file:
+        isbns = [isbnlib.ean13(line.strip()) for line in file if line.strip()]
+    return list(filter(None, isbns))
+
+
+def replay_transport(
+    recording: Recording,
+    failures: dict[str, tuple[float, str]],
+    latency: bool = True,
+    seed: int = 0,
+) -> ReplayTransport:
+    hosts = {
+        host: HostBehaviour(
+            latency=seconds if latency else 0.0,
+            jitter=seconds * JITTER if latency else 0.0,
+            failure_rate=failures.get(host, (0.0, "error"))[0],
+            failure=failures.get(host, (0.0, "error"))[1],
+        )
+        for host, seconds in HOST_LATENCIES.items()
+    }
+    return ReplayTransport(recording, hosts, seed=seed)
+
+
+def replay_client(transport: ReplayTransport) -> httpx.AsyncClient:
+    """Client with the per host limits of the shared client"""
+    provider_health.reset()
+    provider_scheduler.reset()
+    return httpx.AsyncClient(
+        transport=HostLimitedTransport(
+            transport,
+            get_http_client_settings().max_connections_per_host,
+            provider_health,
+        )
+    )
+
+
+async def lookup_latencies(recording: Recording, isbns: list[str]) -> list[list]:
+    rows = []
+    for isbn in isbns:
+        transport = replay_transport(recording, {})
+        durations = []
+        async with replay_client(transport) as client:
+            for _ in range(REPEAT):
+                start = time.perf_counter()
+                book = await book_notice.isbn2book(isbn, REPLAY_SETTINGS, client=client)
+                durations.append(time.perf_counter() - start)
+        rows.append(
+            [
+                isbn,
+                "no" if book is None else "yes",
+                statistics.median(durations) * 1000,
+                max(durations) * 1000,
+                sum(transport.requests.values()) / REPEAT,
+            ]
+        )
+    return rows
+
+
+async def throughput(
+    recording: Recording,
+    isbns: list[str],
+    failures: dict[str, tuple[float, str]],
+    concurrency: int,
+) -> list:
+    transport = replay_transport(recording, failures)
+    semaphore = asyncio.Semaphore(concurrency)
+    durations = []
+
+    async def bounded(isbn: str) -> bool:
+        async with semaphore:
+            start = time.perf_counter()
+            book = await book_notice.isbn2book(isbn, REPLAY_SETTINGS, client=client)
+            durations.append(time.perf_counter() - start)
+            return book is not None
+
+    async with replay_client(transport) as client:
+        start = time.perf_counter()
+        found = await asyncio.gather(
+            *(bounded(isbns[index % len(isbns)]) for index in range(LOOKUPS))
+        )
+        duration = time.perf_counter() - start
+
+    quantiles = statistics.quantiles(durations, n=100)
+    return [
+        concurrency,
+        LOOKUPS / duration,
+        quantiles[49] * 1000,
+        quantiles[94] * 1000,
+        sum(found),
+        sum(transport.failures.values()),
+    ]
+
+
+async def parse_costs(recording: Recording, isbns: list[str]) -> list[list]:
+    """Median duration of each provider lookup without latency, in ms"""
+    rows = []
+    transport = replay_transport(recording, {}, latency=False)
+    async with httpx.AsyncClient(transport=transport) as client:
+        for name, lookup in book_notice.BOOK_PROVIDERS:
+            row = [name]
+            for isbn in isbns:
+                durations = []
+                errors = set()
+                for _ in range(REPEAT * 4):
+                    start = time.perf_counter()
+                    try:
+                        await lookup(isbn, client=client)
+                    except Exception as error:
+                        errors.add(f"{type(error).__name__} {error}")
+                    durations.append(time.perf_counter() - start)
+                row.append(statistics.median(durations) * 1000)
+                for error in errors:
+                    print(f"{isbn} {name}: {error}")
+            rows.append(row)
+    return rows
+
+
+async def record(path: str, isbns_path: str) -> None:
+    """Record the responses of every provider for the ISBNs of a file"""
+    isbns = read_isbns(isbns_path)
+    settings = get_settings()
+
+    recording = Recording()
+    transport = RecordingTransport(httpx.AsyncHTTPTransport(), recording)
+    async with httpx.AsyncClient(transport=transport) as client:
+        for isbn in isbns:
+            lookups = [
+                *(
+                    (name, lookup, [isbn])
+                    for name, lookup in book_notice.BOOK_PROVIDERS
+                ),
+                ("openlibrarycover", book_notice.openlibrarycover, [isbn]),
+                (
+                    "googleimages",
+                    book_notice.googleimagescover,
+                    [
+                        isbn,
+                        settings.google_api_key,
+                        settings.google_custom_search_engine,
+                    ],
+                ),
+            ]
+            for name, lookup, args in lookups:
+                try:
+                    await lookup(*args, client=client)
+                except Exception as error:
+                    print(f"{isbn} {name}: {type(error).__name__} {error}")
+        await book_notice.isbns2books_bnf(isbns, client=client)
+    recording.save(Path(path))
+    print(f"{len(recording.responses)} responses recorded in {path}")
+
+
+async def main() -> None:
+    if len(sys.argv) == 4 and sys.argv[1] == "--record":
+        await record(sys.argv[2], sys.argv[3])
+        return
+    if len(sys.argv) == 3:
+        recording = Recording.load(Path(sys.argv[1]))
+        isbns = read_isbns(sys.argv[2])
+    else:
+        recording = Recording.load(RECORDING)
+        isbns = ISBNS
+
+    latencies = await lookup_latencies(recording, isbns)
+    rates = [
+        [scenario, *await throughput(recording, isbns, failures, concurrency)]
+        for scenario, failures in SCENARIOS.items()
+        for concurrency in CONCURRENCIES
+    ]
+    costs = await parse_costs(recording, isbns)
+
+    print(f"\nisbn2book, one lookup at a time, median of {REPEAT}\n")
+    print_table(["isbn", "found", "p50 ms", "max ms", "requests / lookup"], latencies)
+    print(f"\nisbn2book, {LOOKUPS} lookups\n")
+    print_table(
+        [
+            "scenario",
+            "concurrency",
+            "lookups / s",
+            "p50 ms",
+            "p95 ms",
+            "found",
+            "injected failures",
+        ],
+        rates,
+    )
+    print("\nProvider lookups without latency, median ms\n")
+    print_table(["provider", *isbns], costs)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
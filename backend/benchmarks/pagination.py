@@ -0,0 +1,99 @@
+"""List latency as the book table grows
+
+Compares the total item count of the pagination metadata computed by
+loading every row, by a `SELECT COUNT(*)` subquery and by the row count
+cache, then the latency of `GET /books` itself. Filtered lists compare a
+page query plus a count query, a single query carrying a `COUNT(*) OVER()`
+window column and the single query used by `paginate`, carrying a
+`(SELECT COUNT(*) ...)` column.
+
+    python -m backend.benchmarks.pagination
+"""
+
+from sqlalchemy.sql import func
+from sqlmodel import Session, select
+
+from backend.benchmarks.tools import (
+    benchmark_client,
+    insert_books,
+    measure,
+    print_table,
+    temporary_engine,
+)
+from backend.internals.table_management import (
+    count_items,
+    paginate,
+    row_count_cache,
+)
+from backend.models import BookTable
+
+TABLE_SIZES = [1_000, 10_000, 100_000]
+
+
+def main() -> None:
+    rows = []
+    for table_size in TABLE_SIZES:
+        with temporary_engine() as engine:
+            insert_books(engine, table_size)
+
+            with Session(engine) as session:
+                statement = select(BookTable)
+                load_all = measure(lambda: len(session.exec(statement).all()), repeat=3)
+                count_subquery = measure(lambda: count_items(session, statement))
+                row_count_cache.get(session, BookTable)
+                cached = measure(lambda: row_count_cache.get(session, BookTable))
+
+                filtered = select(BookTable).where(BookTable.available)
+                page_and_count = measure(
+                    lambda: (
+                        session.exec(filtered.offset(40).limit(20)).all(),
+                        count_items(session, filtered),
+                    )
+                )
+                page_with_window = measure(
+                    lambda: session.execute(
+                        filtered.add_columns(func.count().over()).offset(40).limit(20)
+                    ).all()
+                )
+                page_with_count_column = measure(
+                    lambda: paginate(session, filtered, page=3, limit=20)
+                )
+
+            with benchmark_client(engine) as client:
+                first_page = measure(lambda: client.get("/api/v1/books?page=1"))
+                last_page = measure(
+                    lambda: client.get(f"/api/v1/books?page={table_size // 20}")
+                )
+
+        rows.append(
+            [
+                table_size,
+                load_all,
+                count_subquery,
+                cached,
+                page_and_count,
+                page_with_window,
+                page_with_count_column,
+                first_page,
+                last_page,
+            ]
+        )
+
+    print_table(
+        [
+            "books",
+            "count by loading rows (ms)",
+            "COUNT(*) subquery (ms)",
+            "cached count (ms)",
+            "filtered page + COUNT (ms)",
+            "filtered page with COUNT OVER (ms)",
+            "filtered page with COUNT column (ms)",
+            "GET /books page 1 (ms)",
+            "GET /books last page (ms)",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
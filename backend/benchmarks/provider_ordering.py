@@ -0,0 +1,208 @@
+"""Book lookups with the default provider order against the learned order
+
+Replays a corpus of provider answers, one row per ISBN and provider:
+
+    isbn,provider,found,latency_ms
+    9782070438617,bnf,1,412.5
+
+The providers of a lookup are all queried at once and their records taken
+by priority, so a lookup lasts as long as the slowest provider before the
+first one that found the book. With the default order every provider is
+queried; with the provider scheduler the order is learned per ISBN range
+while the corpus is replayed, and the providers that rarely find a range
+are only queried when the others found nothing.
+
+Without a corpus a synthetic one is generated, of French, English and
+Quebec ISBNs whose hit rates and latencies are assumptions, not
+measurements. A corpus can be recorded from the real providers with:
+
+    python -m backend.benchmarks.provider_ordering --record corpus.csv isbns.txt
+    python -m backend.benchmarks.provider_ordering corpus.csv
+"""
+
+from collections import defaultdict
+
+import asyncio
+import csv
+import random
+import statistics
+import sys
+import time
+
+import isbnlib
+
+from backend.benchmarks.tools import print_table
+from backend.internals.book_notice import BOOK_PROVIDERS
+from backend.internals.http_client import create_http_client
+from backend.internals.provider_scheduler import ProviderScheduler
+
+SYNTHETIC_LOOKUPS = 3000
+# ISBN prefix: provider: (hit rate, median latency in ms)
+SYNTHETIC_RANGES = {
+    "9782070": {  # Gallimard, France
+        "bnf": (0.95, 400),
+        "googlebooks": (0.7, 150),
+        "openlibrary": (0.3, 600),
+        "sudoc": (0.8, 500),
+        "banq": (0.2, 300),
+    },
+    "9780141": {  # Penguin, United Kingdom
+        "bnf": (0.1, 400),
+        "googlebooks": (0.95, 150),
+        "openlibrary": (0.8, 600),
+        "sudoc": (0.3, 500),
+        "banq": (0.05, 300),
+    },
+    "97828954": {  # Quebec publisher
+        "bnf": (0.3, 400),
+        "googlebooks": (0.5, 150),
+        "openlibrary": (0.1, 600),
+        "sudoc": (0.3, 500),
+        "banq": (0.95, 300),
+    },
+}
+
+Corpus = list[tuple[str, dict[str, tuple[bool, float]]]]
+
+
+def synthetic_corpus(seed: int = 0) -> Corpus:
+    generator = random.Random(seed)
+    corpus = []
+    for _ in range(SYNTHETIC_LOOKUPS):
+        prefix, providers = generator.choice(list(SYNTHETIC_RANGES.items()))
+        digits = "".join(
+            generator.choice("0123456789") for _ in range(12 - len(prefix))
+        )
+        isbn = prefix + digits + isbnlib.check_digit13(prefix + digits)
+        answers = {
+            name: (
+                generator.random() < hit_rate,
+                generator.lognormvariate(0, 0.4) * latency_ms,
+            )
+            for name, (hit_rate, latency_ms) in providers.items()
+        }
+        corpus.append((isbn, answers))
+    return corpus
+
+
+def read_corpus(path: str) -> Corpus:
+    answers: dict[str, dict[str, tuple[bool, float]]] = defaultdict(dict)
+    with open(path, newline="") as file:
+        for row in csv.DictReader(file):
+            answers[row["isbn"]][row["provider"]] = (
+                row["found"] == "1",
+                float(row["latency_ms"]),
+            )
+    return list(answers.items())
+
+
+async def record_corpus(path: str, isbns_path: str) -> None:
+    """Query every provider for the ISBNs of a file, one per line"""
+    with open(isbns_path) as file:
+        isbns = [isbnlib.ean13(line.strip()) for line in file if line.strip()]
+
+    async with create_http_client() as client:
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["isbn", "provider", "found", "latency_ms"])
+            for isbn in filter(None, isbns):
+                for name, lookup in BOOK_PROVIDERS:
+                    start = time.perf_counter()
+                    try:
+                        book = await lookup(isbn, client=client)
+                    except Exception as error:
+                        print(f"{isbn} {name}: {type(error).__name__} {error}")
+                        book = None
+                    latency_ms = (time.perf_counter() - start) * 1000
+                    writer.writerow([isbn, name, int(book is not None), latency_ms])
+
+
+def replay_lookup(
+    now: list[str], deferred: list[str], answers: dict[str, tuple[bool, float]]
+) -> tuple[float, int, str | None, dict[str, float]]:
+    """Simulate a lookup
+
+    Returns
+    ----------
+    (duration in ms, requests sent, provider of the record,
+    latency of the providers answering before the record was chosen)
+    """
+    duration = 0.0
+    requests = 0
+    answered: dict[str, float] = {}
+    for wave in [now, deferred]:
+        start = duration
+        requests += len(wave)
+        for name in wave:
+            found, latency_ms = answers[name]
+            duration = max(duration, start + latency_ms)
+            if found:
+                break
+        for name in wave:
+            latency_ms = answers[name][1]
+            if start + latency_ms <= duration:
+                answered[name] = latency_ms
+        for name in wave:
+            if answers[name][0]:
+                return duration, requests, name, answered
+    return duration, requests, None, answered
+
+
+def replay(corpus: Corpus, adaptive: bool) -> tuple[list, list]:
+    scheduler = ProviderScheduler()
+    providers = [(name, None) for name, _ in BOOK_PROVIDERS]
+    durations, requests, chosen = [], 0, []
+    for isbn, answers in corpus:
+        if adaptive:
+            now, deferred = scheduler.order(isbn, providers)
+        else:
+            now, deferred = providers, []
+        duration, sent, provider, answered = replay_lookup(
+            [name for name, _ in now], [name for name, _ in deferred], answers
+        )
+        durations.append(duration)
+        requests += sent
+        chosen.append(provider)
+        for name, latency_ms in answered.items():
+            scheduler.record(isbn, name, latency_ms / 1000, found=answers[name][0])
+
+    quantiles = statistics.quantiles(durations, n=100)
+    return [
+        statistics.mean(durations),
+        quantiles[49],
+        quantiles[94],
+        requests / len(corpus),
+        sum(provider is not None for provider in chosen) / len(corpus),
+    ], chosen
+
+
+def main() -> None:
+    if len(sys.argv) == 4 and sys.argv[1] == "--record":
+        asyncio.run(record_corpus(sys.argv[2], sys.argv[3]))
+        return
+    if len(sys.argv) == 2:
+        corpus = read_corpus(sys.argv[1])
+        print(f"Corpus {sys.argv[1]}: {len(corpus)} ISBNs\n")
+    else:
+        corpus = synthetic_corpus()
+        print(f"Synthetic corpus: {len(corpus)} ISBNs\n")
+
+    static, static_chosen = replay(corpus, adaptive=False)
+    adaptive, adaptive_chosen = replay(corpus, adaptive=True)
+    same = sum(a == b for a, b in zip(static_chosen, adaptive_chosen))
+    print_table(
+        [
+            "order",
+            "mean ms",
+            "p50 ms",
+            "p95 ms",
+            "requests / lookup",
+            "found",
+        ],
+        [["default", *static], ["learned", *adaptive]],
+    )
+    print(f"\nSame provider record as the default order: {same / len(corpus):.1%}")
+
+
+if __name__ == "__main__":
+    main()
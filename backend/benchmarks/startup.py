@@ -0,0 +1,61 @@
+"""Schema check at startup, with create_all and with the migrations
+
+On an up-to-date temporary database file, each startup opens a new engine
+and either runs `SQLModel.metadata.create_all`, which checks every table
+and index, or `migrate`, which reads the version of the schema. The
+benchmark measures the duration of a startup and its SQL statements.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel import SQLModel, create_engine
+
+from backend.benchmarks.tools import (
+    insert_books,
+    measure,
+    print_table,
+    temporary_engine,
+)
+from backend.internals.migrations import migrate
+
+BOOK_COUNTS = [0, 100_000]
+
+
+def startup(engine: Engine, check, statements: list) -> None:
+    startup_engine = create_engine(engine.url)
+    event.listen(
+        startup_engine,
+        "before_cursor_execute",
+        lambda connection, cursor, statement, *args: statements.append(statement),
+    )
+    check(startup_engine)
+    startup_engine.dispose()
+
+
+def main() -> None:
+    rows = []
+    for book_count in BOOK_COUNTS:
+        with temporary_engine() as engine:
+            insert_books(engine, book_count)
+            migrate(engine)
+            for name, check in (
+                ("create_all", SQLModel.metadata.create_all),
+                ("migrate", migrate),
+            ):
+                statements = []
+                startup(engine, check, statements)
+                rows.append(
+                    [
+                        book_count,
+                        name,
+                        measure(lambda: startup(engine, check, [])),
+                        len(statements),
+                    ]
+                )
+
+    print("\nStartup on an up-to-date database\n")
+    print_table(["books", "schema check", "ms", "statements"], rows)
+
+
+if __name__ == "__main__":
+    main()
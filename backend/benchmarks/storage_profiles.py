@@ -0,0 +1,130 @@
+"""Mixed read and write load on each SQLite storage profile
+
+Reader threads page through the available books while writer threads
+update the availability of random books, one transaction per update, on a
+temporary database file opened with the PRAGMAs of each profile. The
+benchmark measures the reads and writes per second, their latencies and
+the "database is locked" errors.
+"""
+
+import random
+import statistics
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from backend.benchmarks.tools import insert_books, print_table, temporary_engine
+from backend.database import (
+    DatabaseSettings,
+    StorageProfile,
+    enable_storage_profile,
+    read_pragmas,
+)
+from backend.models import BookTable
+
+BOOK_COUNT = 20_000
+READERS = 4
+WRITERS = 2
+DURATION = 3.0  # seconds per profile
+
+
+def read(session: Session, random_generator: random.Random) -> None:
+    offset = random_generator.randrange(0, BOOK_COUNT // 2)
+    statement = (
+        select(BookTable)
+        .where(BookTable.available == True)  # noqa: E712
+        .order_by(BookTable.title)
+        .offset(offset)
+        .limit(20)
+    )
+    session.exec(statement).all()
+
+
+def write(session: Session, random_generator: random.Random) -> None:
+    book = session.get(BookTable, random_generator.randrange(1, BOOK_COUNT + 1))
+    book.available = not book.available
+    session.add(book)
+    session.commit()
+
+
+def worker(engine, operation, seed: int, stop: threading.Event, results: list):
+    random_generator = random.Random(seed)
+    durations = []
+    errors = 0
+    while not stop.is_set():
+        start = time.perf_counter()
+        with Session(engine) as session:
+            try:
+                operation(session, random_generator)
+            except OperationalError:
+                errors += 1
+                continue
+        durations.append(time.perf_counter() - start)
+    results.append((durations, errors))
+
+
+def run(profile: StorageProfile) -> list:
+    settings = DatabaseSettings(storage_profile=profile)
+    with temporary_engine() as engine:
+        enable_storage_profile(engine, settings)
+        # the connections of the table creation predate the profile
+        engine.dispose()
+        insert_books(engine, BOOK_COUNT)
+        with Session(engine) as session:
+            journal_mode = read_pragmas(session)["journal_mode"]
+
+        stop = threading.Event()
+        reads: list = []
+        writes: list = []
+        threads = [
+            threading.Thread(target=worker, args=(engine, read, index, stop, reads))
+            for index in range(READERS)
+        ] + [
+            threading.Thread(target=worker, args=(engine, write, index, stop, writes))
+            for index in range(WRITERS)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(DURATION)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    read_durations = [duration for result in reads for duration in result[0]]
+    write_durations = [duration for result in writes for duration in result[0]]
+    return [
+        profile.value,
+        journal_mode,
+        len(read_durations) / DURATION,
+        statistics.quantiles(read_durations, n=100)[94] * 1000,
+        len(write_durations) / DURATION,
+        statistics.quantiles(write_durations, n=100)[94] * 1000,
+        sum(result[1] for result in reads + writes),
+    ]
+
+
+def main() -> None:
+    rows = [run(profile) for profile in StorageProfile]
+
+    print(
+        f"\n{READERS} readers and {WRITERS} writers for {DURATION:.0f} s,"
+        f" {BOOK_COUNT} books\n"
+    )
+    print_table(
+        [
+            "profile",
+            "journal",
+            "reads / s",
+            "read p95 ms",
+            "writes / s",
+            "write p95 ms",
+            "locked errors",
+        ],
+        rows,
+    )
+
+
+if __name__ == "__main__":
+    main()
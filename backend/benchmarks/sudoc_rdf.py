@@ -0,0 +1,83 @@
+"""Sudoc record parsing: streaming extractor against the rdflib query
+
+Parses recorded Sudoc RDF/XML records with `extract_sudoc_fields`, one
+`iterparse` pass, and with `query_sudoc_fields`, an rdflib graph queried
+with SPARQL as `isbn2book_sudoc` used to. The records of the unit tests
+are parsed by default, other records can be given:
+
+    python -m backend.benchmarks.sudoc_rdf [record.rdf ...]
+"""
+
+from pathlib import Path
+
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from backend.benchmarks.tools import measure, print_table
+from backend.internals.sudoc_rdf import extract_sudoc_fields, query_sudoc_fields
+
+FIXTURES = Path(__file__).parent.parent / "unit_tests" / "fixtures" / "sudoc"
+
+
+def peak_memory(function) -> float:
+    """Peak of the memory allocated by `function`, in KiB"""
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def import_time(module: str) -> float:
+    """Duration of the import of a module in a new interpreter, in ms"""
+    code = f"import time; s = time.perf_counter(); import {module}; "
+    code += "print(time.perf_counter() - s)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    return float(output.stdout) * 1000
+
+
+def main() -> None:
+    paths = [Path(path) for path in sys.argv[1:]] or sorted(FIXTURES.glob("*.rdf"))
+
+    # first query, rdflib loads its SPARQL parser
+    start = time.perf_counter()
+    query_sudoc_fields(paths[0].read_text())
+    first_query = (time.perf_counter() - start) * 1000
+
+    rows = []
+    for path in paths:
+        content = path.read_bytes()
+        text = content.decode()
+        for name, parse in [
+            ("iterparse", lambda: extract_sudoc_fields(content)),
+            ("rdflib", lambda: query_sudoc_fields(text)),
+        ]:
+            try:
+                parse()
+            except Exception as error:
+                rows.append([path.name, name, type(error).__name__, "", ""])
+                continue
+            rows.append(
+                [
+                    path.name,
+                    name,
+                    len(content),
+                    measure(parse, repeat=200),
+                    peak_memory(parse),
+                ]
+            )
+
+    print_table(["record", "parser", "bytes", "ms", "peak KiB"], rows)
+    print(f"\nFirst rdflib query, loading SPARQL: {first_query:.0f} ms")
+    print(
+        f"Import in a new interpreter: rdflib {import_time('rdflib'):.0f} ms, "
+        f"xml.etree.ElementTree {import_time('xml.etree.ElementTree'):.0f} ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Shared helpers for the benchmark scripts
+
+Benchmarks are plain scripts, run from the repository root with
+`python -m backend.benchmarks.<name>`. They are not collected by pytest.
+"""
+
+from contextlib import contextmanager
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Callable, Iterator
+
+import statistics
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel, create_engine
+
+from backend.database import get_session
+from backend.main import app
+from backend.models import BookTable
+
+
+@contextmanager
+def temporary_engine() -> Iterator[Engine]:
+    """SQLite engine on a temporary database file, with all tables created"""
+    with TemporaryDirectory() as directory:
+        database_path = Path(directory) / "benchmark.db"
+        engine = create_engine(
+            f"sqlite:///{database_path}", connect_args={"check_same_thread": False}
+        )
+        SQLModel.metadata.create_all(engine)
+        try:
+            yield engine
+        finally:
+            engine.dispose()
+
+
+@contextmanager
+def benchmark_client(engine: Engine) -> Iterator[TestClient]:
+    """API test client using the given engine"""
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+
+
+def book_rows(count: int, start: int = 0) -> list[dict]:
+    """Generate `count` synthetic book rows"""
+    return [
+        {
+            "title": f"Title {index} of the catalog",
+            "author": f"Author {index % 997}",
+            "abstract": f"Abstract of book {index}",
+            "publisher": f"Publisher {index % 101}",
+            "category_type": f"type {index % 7}",
+            "category_age": f"age {index % 5}",
+            "category_topics": f"topic {index % 13}",
+            "available": index % 3 != 0,
+            "archived": False,
+        }
+        for index in range(start, start + count)
+    ]
+
+
+def insert_books(engine: Engine, count: int, chunk_size: int = 10_000) -> None:
+    """Fill the book table with `count` synthetic books"""
+    with Session(engine) as session:
+        for start in range(0, count, chunk_size):
+            session.exec(
+                insert(BookTable),
+                params=book_rows(min(chunk_size, count - start), start),
+            )
+        session.commit()
+
+
+def measure(function: Callable[[], object], repeat: int = 20) -> float:
+    """Median duration of `function` in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations) * 1000
+
+
+def print_table(headers: list[str], rows: list[list]) -> None:
+    """Print benchmark results as a markdown table"""
+    print("| " + " | ".join(headers) + " |")
+    print("|" + "---|" * len(headers))
+    for row in rows:
+        cells = [
+            f"{cell:.2f}" if isinstance(cell, float) else str(cell) for cell in row
+        ]
+        print("| " + " | ".join(cells) + " |")
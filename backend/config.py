@@ -14,4 +14,5 @@ class Settings(BaseSettings):
     google_api_key: str
     google_custom_search_engine: str
 
-    model_config = SettingsConfigDict(env_file=".env")
+    # other settings classes read their own variables from the same file
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
@@ -1,23 +1,284 @@
-from sqlmodel import SQLModel, create_engine, Session
+from enum import Enum
+from functools import lru_cache
+from typing import Callable, Optional, TypeVar, Union
+
+import sqlite3
+
+from fastapi import Depends, Request
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing_extensions import Annotated
+
+from backend.internals.migrations import migrate
+from backend.internals.write_coordinator import (
+    WriteCoordinator,
+    get_write_coordinator,
+)
 
 DEFAULT_DATABASE_NAME = "database.db"
 
-database_name = DEFAULT_DATABASE_NAME
+_Result = TypeVar("_Result")
+
+
+class StorageProfile(str, Enum):
+    default = "default"  # SQLite defaults: rollback journal, synchronous FULL
+    wal = "wal"  # WAL, fsync at checkpoints only, large page cache and mmap
+    durable = "durable"  # WAL, fsync at each commit
+    litefs = "litefs"  # WAL on the LiteFS FUSE mount, without mmap
+
+
+# PRAGMAs of the storage profiles, applied in this order
+PRAGMA_NAMES = [
+    "journal_mode",
+    "synchronous",
+    "cache_size",
+    "mmap_size",
+    "temp_store",
+    "busy_timeout",
+    "foreign_keys",
+]
+STORAGE_PROFILES: dict[StorageProfile, dict[str, Union[str, int]]] = {
+    StorageProfile.default: {},
+    StorageProfile.wal: {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "cache_size": -64_000,  # KiB
+        "mmap_size": 256 * 2**20,
+        "temp_store": "memory",
+        "busy_timeout": 5000,  # ms
+    },
+    StorageProfile.durable: {
+        "journal_mode": "wal",
+        "synchronous": "full",
+        "cache_size": -64_000,
+        "mmap_size": 256 * 2**20,
+        "temp_store": "memory",
+        "busy_timeout": 5000,
+    },
+    # LiteFS supports the WAL journal and ships each transaction from it,
+    # the database file is read through FUSE rather than memory mapped
+    StorageProfile.litefs: {
+        "journal_mode": "wal",
+        "synchronous": "full",
+        "cache_size": -64_000,
+        "mmap_size": 0,
+        "temp_store": "memory",
+        "busy_timeout": 5000,
+    },
+}
+
+
+class DatabaseSettings(BaseSettings):
+    """Settings of the database, read from DATABASE_* variables"""
+
+    # path of the database file, e.g. /litefs/db on the LiteFS mount
+    name: str = DEFAULT_DATABASE_NAME
+    # the routes query the database through aiosqlite on the event loop,
+    # else through sync sessions on the thread pool
+    async_sessions: bool = True
+    # the writes of the routes are committed in groups by a single writer
+    group_commit: bool = True
+    reader_connections: int = 8  # pooled read-only connections, per engine
+    storage_profile: StorageProfile = StorageProfile.wal
+    # override the PRAGMAs of the storage profile when set
+    journal_mode: Optional[str] = None
+    synchronous: Optional[str] = None
+    cache_size: Optional[int] = None
+    mmap_size: Optional[int] = None
+    temp_store: Optional[str] = None
+    busy_timeout: Optional[int] = None
+    # off by default: deleting a book keeps its circulations and jobs
+    foreign_keys: Optional[bool] = None
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_prefix="database_", extra="ignore"
+    )
+
+    def pragmas(self) -> dict[str, Union[str, int]]:
+        """PRAGMAs of the storage profile with their overrides"""
+        pragmas = dict(STORAGE_PROFILES[self.storage_profile])
+        for name in PRAGMA_NAMES:
+            value = getattr(self, name)
+            if value is not None:
+                pragmas[name] = int(value) if isinstance(value, bool) else value
+        return pragmas
+
+
+@lru_cache
+def get_database_settings():
+    return DatabaseSettings()
+
+
+database_name = get_database_settings().name
 sqlite_url = f"sqlite:///{database_name}"
+sqlite_async_url = f"sqlite+aiosqlite:///{database_name}"
+# read-only connections of the GET routes
+sqlite_read_url = f"sqlite:///file:{database_name}?mode=ro&uri=true"
+sqlite_async_read_url = f"sqlite+aiosqlite:///file:{database_name}?mode=ro&uri=true"
+
+
+def apply_pragmas(dbapi_connection, pragmas: dict[str, Union[str, int]]) -> None:
+    """Run the PRAGMAs on a new DBAPI connection"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            if name == "journal_mode":
+                cursor.execute("PRAGMA journal_mode")
+                if cursor.fetchone()[0] == str(value).lower():
+                    continue
+            try:
+                cursor.execute(f"PRAGMA {name} = {value}")
+            except sqlite3.OperationalError as error:
+                # e.g. journal mode of a read-only database or LiteFS replica,
+                # which keeps the journal mode set on the primary
+                print(f"Database: PRAGMA {name} = {value} not applied, {error}")
+    finally:
+        cursor.close()
+
+
+def enable_storage_profile(engine: Engine, settings: DatabaseSettings) -> None:
+    """Apply the PRAGMAs of the settings to each connection of an engine
+
+    Parameters
+    ----------
+    engine:
+        sync engine, or the `sync_engine` of an async engine
+    """
+    pragmas = settings.pragmas()
+
+    def on_connect(dbapi_connection, connection_record) -> None:
+        apply_pragmas(dbapi_connection, pragmas)
+
+    event.listen(engine, "connect", on_connect)
+
+
+def read_pragmas(session: Session) -> dict[str, str]:
+    """Values of the PRAGMAs of a storage profile on the connection of a session"""
+    connection = session.connection()
+    return {
+        name: str(connection.exec_driver_sql(f"PRAGMA {name}").scalar())
+        for name in PRAGMA_NAMES
+    }
+
 
 # Create database engine
 engine_echo = False
 connect_args = {"check_same_thread": False}  # to work with FastAPI
 global_engine = create_engine(sqlite_url, echo=engine_echo, connect_args=connect_args)
+# same database, queried through aiosqlite by the async routes
+global_async_engine = create_async_engine(sqlite_async_url, echo=engine_echo)
+global_read_engine = create_engine(
+    sqlite_read_url,
+    echo=engine_echo,
+    connect_args=connect_args,
+    pool_size=get_database_settings().reader_connections,
+)
+global_async_read_engine = create_async_engine(
+    sqlite_async_read_url,
+    echo=engine_echo,
+    pool_size=get_database_settings().reader_connections,
+)
+for _engine in (global_engine, global_read_engine):
+    enable_storage_profile(_engine, get_database_settings())
+for _async_engine in (global_async_engine, global_async_read_engine):
+    enable_storage_profile(_async_engine.sync_engine, get_database_settings())
 
 
 # Start database engine
 def create_db_and_tables() -> None:
-    """Create database and the its tables"""
-    SQLModel.metadata.create_all(global_engine)
+    """Create database and the its tables, or migrate them to the last schema"""
+    migrate(global_engine)
 
 
 def get_session():
     """Get session for FastAPI Dependency"""
     with Session(global_engine) as session:
         yield session
+
+
+async def get_async_session():
+    """Get async session for FastAPI Dependency"""
+    # the rows returned by a route are serialized after its last commit
+    async with AsyncSession(global_async_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def get_read_session():
+    """Get read-only session for FastAPI Dependency"""
+    with Session(global_read_engine) as session:
+        yield session
+
+
+async def get_async_read_session():
+    """Get read-only async session for FastAPI Dependency"""
+    async with AsyncSession(global_async_read_engine) as session:
+        yield session
+
+
+class SessionRunner:
+    """Run the database work of a route, written for a sync `Session`
+
+    With an `AsyncSession`, the work runs on the event loop through
+    `run_sync`, each query awaited on the aiosqlite connection. With a
+    `Session`, it runs on the thread pool, as FastAPI runs the sync routes.
+    The work must load everything the response needs: relationships can't
+    be lazy loaded from an `AsyncSession` once it is done.
+
+    Parameters
+    ----------
+    session
+    coordinator:
+        runs the writes in group commits, instead of the session
+    """
+
+    def __init__(
+        self,
+        session: Union[Session, AsyncSession],
+        coordinator: Optional[WriteCoordinator] = None,
+    ):
+        self.session = session
+        self.coordinator = coordinator
+
+    async def run(self, work: Callable[..., _Result], *args, **kwargs) -> _Result:
+        """Call `work(session, *args, **kwargs)` and return its result"""
+        if isinstance(self.session, AsyncSession):
+            return await self.session.run_sync(work, *args, **kwargs)
+        return await run_in_threadpool(work, self.session, *args, **kwargs)
+
+    async def write(self, work: Callable[..., _Result], *args, **kwargs) -> _Result:
+        """Same as `run`, for a work committing changes"""
+        if self.coordinator is not None:
+            return await self.coordinator.write(work, *args, **kwargs)
+        return await self.run(work, *args, **kwargs)
+
+
+def get_session_runner(
+    request: Request,
+    settings: Annotated[DatabaseSettings, Depends(get_database_settings)],
+    session: Session = Depends(get_session),
+    async_session: AsyncSession = Depends(get_async_session),
+) -> SessionRunner:
+    """Get the session runner of the async routes for FastAPI Dependency
+
+    Both sessions are cheap until they query, only the one selected by
+    `DatabaseSettings.async_sessions` is used.
+    """
+    coordinator = get_write_coordinator(request) if settings.group_commit else None
+    return SessionRunner(
+        async_session if settings.async_sessions else session, coordinator
+    )
+
+
+def get_read_session_runner(
+    settings: Annotated[DatabaseSettings, Depends(get_database_settings)],
+    session: Session = Depends(get_read_session),
+    async_session: AsyncSession = Depends(get_async_read_session),
+) -> SessionRunner:
+    """Get the session runner of the GET routes for FastAPI Dependency,
+    on the read-only connections"""
+    return SessionRunner(async_session if settings.async_sessions else session)
@@ -1,15 +1,30 @@
 from xml.etree.ElementTree import Element
+from typing import Callable
+from contextlib import nullcontext
+from functools import partial
 
 from backend.models import BookCreate
 from backend.config import Settings
+from ..internals import constants
+from ..internals.cover_store import recent_downloads
+from ..internals.http_client import (
+    PROVIDER_TIMEOUTS,
+    DeadlinePause,
+    provider_client,
+    provider_deadline,
+)
+from ..internals.isbn_language import isbn2language
+from ..internals.sudoc_rdf import sudoc_fields
+from ..internals.provider_health import provider_health
+from ..internals.provider_scheduler import provider_scheduler
 
 import xml.etree.ElementTree as ET
-from rdflib import Graph
-from io import StringIO
 import httpx
 from PIL import Image
 from io import BytesIO
 
+import asyncio
+import time
 import isbnlib
 import babelfish
 from random_header_generator import HeaderGenerator
@@ -31,7 +46,13 @@ from random_header_generator import HeaderGenerator
 # } LIMIT 100
 
 
-async def isbn2book_sudoc(isbn: int) -> BookCreate | None:
+class ProviderError(Exception):
+    """A provider refused or failed to answer"""
+
+
+async def isbn2book_sudoc(
+    isbn: int, client: httpx.AsyncClient | None = None
+) -> BookCreate | None:
     """Query Sudoc api to find a book notice
 
     Parameters
@@ -39,13 +60,19 @@ async def isbn2book_sudoc(isbn: int) -> BookCreate | None:
     isbn : int
         ISBN to search
 
+    client : httpx.AsyncClient or None
+        shared HTTP client, a temporary one when None
+
     Returns
     -------
     BookCreate or None
         Book if found
     """
-    async with httpx.AsyncClient() as client:
-        r = await client.get(f"https://www.sudoc.fr/services/isbn2ppn/{isbn}")
+    async with provider_client(client) as client:
+        r = await client.get(
+            f"https://www.sudoc.fr/services/isbn2ppn/{isbn}",
+            timeout=PROVIDER_TIMEOUTS["sudoc"],
+        )
         # print(r.text)
 
         root = ET.fromstring(r.text)
@@ -63,53 +90,36 @@ async def isbn2book_sudoc(isbn: int) -> BookCreate | None:
         ppn = x.find("ppn").text
         # print(f"Got PPN: {ppn}")
 
-        r = await client.get(f"https://www.sudoc.fr/{ppn}.rdf")
+        r = await client.get(
+            f"https://www.sudoc.fr/{ppn}.rdf", timeout=PROVIDER_TIMEOUTS["sudoc"]
+        )
         # print(r.text)
 
-        # Create a Graph
-        g = Graph()
-
-        # Parse in an RDF file hosted on the Internet
-        g.parse(StringIO(r.text), format="application/rdf+xml")
-
-        knows_query3 = """
-        select ?book ?title ?abstract ?date ?publisher ?format where {
-            ?book a bibo:Book .
-            ?book dc:title ?title .
-            OPTIONAL { ?book dcterms:abstract ?abstract }
-            ?book dc:date ?date .
-            ?book dc:publisher ?publisher .
-            ?book dc:format ?format .
-        }"""
-
-        qres = g.query(knows_query3)
-        for row in qres:
-            # debug(row)
-            # print(f"{row.book} knows {row.title}")
-
-            title = row.title.split(" / ")
-
-            if len(title) > 1:
-                author = title[1].split(" ; ")[0]
-            else:
-                author = ""
-
-            publisher = row.publisher.split(" : ")[1].split(" , ")[0].strip("[]")
-
-            book = BookCreate(
-                title=title[0],
-                abstract=row.abstract or "",
-                publication_date=row.date,
-                publisher=publisher,
-                author=author,
-                format=row.format,
-                language=isbn2language(isbn),
-                isbn=isbn,
-                record_source=row.book,
-            )
-            return book
+    row = sudoc_fields(r.content, r.text)
+    if row is None:
+        return None
 
-    return None
+    title = row["title"].split(" / ")
+
+    if len(title) > 1:
+        author = title[1].split(" ; ")[0]
+    else:
+        author = ""
+
+    publisher = row["publisher"].split(" : ")[1].split(" , ")[0].strip("[]")
+
+    book = BookCreate(
+        title=title[0],
+        abstract=row["abstract"] or "",
+        publication_date=row["date"],
+        publisher=publisher,
+        author=author,
+        format=row["format"],
+        language=isbn2language(isbn),
+        isbn=isbn,
+        record_source=row["book"],
+    )
+    return book
 
 
 def unimarcxchange2book(record: Element):
@@ -179,7 +189,40 @@ def dublincore2book(record: Element):
     return book
 
 
-async def isbn2book_bnf(isbn: int, format: str = "unimarcXchange") -> BookCreate | None:
+BNF_NAMESPACES = {
+    "srw": "http://www.loc.gov/zing/srw/",
+    "mxc": "info:lc/xmlns/marcxchange-v2",
+    "oai_dc": "http://www.openarchives.org/OAI/2.0/oai_dc/",
+    "dc": "http://purl.org/dc/elements/1.1/",
+}
+
+
+async def bnf_cover(client: httpx.AsyncClient, record_identifier: str) -> str | None:
+    """URL of the BnF cover of a record, None for the default cover"""
+    couv_url = f"https://catalogue.bnf.fr/couverture?&appName=NE&idArk={record_identifier}&couverture=1"
+    couv = await client.get(couv_url, timeout=PROVIDER_TIMEOUTS["bnf"])
+
+    if couv.status_code != 200:
+        print(f"Bnf: Couverture status {couv.status_code}, url {couv.url}")
+        return None
+
+    # only reads the image header
+    im = Image.open(BytesIO(couv.content))
+    # print(im.format, im.size, im.mode)
+    if im.size == (92, 138):
+        print("BnF: default cover detected")
+        return None
+
+    # kept for the cover store
+    recent_downloads.add(couv_url, couv.content)
+    return couv_url
+
+
+async def isbn2book_bnf(
+    isbn: int,
+    format: str = "unimarcXchange",
+    client: httpx.AsyncClient | None = None,
+) -> BookCreate | None:
     """Query bnf SRU api to find a book record
     https://api.bnf.fr/api-sru-catalogue-general
     https://couverture.geobib.fr/
@@ -193,24 +236,23 @@ async def isbn2book_bnf(isbn: int, format: str = "unimarcXchange") -> BookCreate
     format : str
         either "dublincore" or "unimarcXchange"
 
+    client : httpx.AsyncClient or None
+        shared HTTP client, a temporary one when None
+
     Returns
     -------
     BookCreate or None
         Book if found
     """
-    async with httpx.AsyncClient() as client:
+    async with provider_client(client) as client:
         r = await client.get(
-            f"https://catalogue.bnf.fr/api/SRU?version=1.2&operation=searchRetrieve&query=bib.fuzzyISBN%20all%20%22{isbn}%22&recordSchema={format}&maximumRecords=100&startRecord=1"
+            f"https://catalogue.bnf.fr/api/SRU?version=1.2&operation=searchRetrieve&query=bib.fuzzyISBN%20all%20%22{isbn}%22&recordSchema={format}&maximumRecords=100&startRecord=1",
+            timeout=PROVIDER_TIMEOUTS["bnf"],
         )
 
         root = ET.fromstring(r.text)
 
-        namespaces = {
-            "srw": "http://www.loc.gov/zing/srw/",
-            "mxc": "info:lc/xmlns/marcxchange-v2",
-            "oai_dc": "http://www.openarchives.org/OAI/2.0/oai_dc/",
-            "dc": "http://purl.org/dc/elements/1.1/",
-        }
+        namespaces = BNF_NAMESPACES
 
         nb = int(root.find("srw:numberOfRecords", namespaces).text)
         # print(f"found {nb} records")
@@ -224,18 +266,7 @@ async def isbn2book_bnf(isbn: int, format: str = "unimarcXchange") -> BookCreate
         ).text
         print(recordIdentifier)
 
-        couv_url = f"https://catalogue.bnf.fr/couverture?&appName=NE&idArk={recordIdentifier}&couverture=1"
-        couv = await client.get(couv_url)
-
-        if couv.status_code != 200:
-            print(f"Bnf: Couverture status {couv.status_code}, url {couv.url}")
-            couv_url = None
-        else:
-            im = Image.open(BytesIO(couv.content))
-            # print(im.format, im.size, im.mode)
-            if im.size == (92, 138):
-                print("BnF: default cover detected")
-                couv_url = None
+        couv_url = await bnf_cover(client, recordIdentifier)
 
         # recordData contain standart record format : unimarcXchange,dublincore
         for recordData in root.findall(
@@ -253,7 +284,107 @@ async def isbn2book_bnf(isbn: int, format: str = "unimarcXchange") -> BookCreate
     return None
 
 
-async def isbn2book_banq(isbn: int) -> BookCreate | None:
+def bnf_record_isbns(record: Element) -> list[str]:
+    """EAN-13 of the ISBNs of a BnF Dublin Core record"""
+    isbns = []
+    for identifier in record.iterfind(".//dc:identifier", BNF_NAMESPACES):
+        for isbnlike in isbnlib.get_isbnlike(identifier.text or "", level="normal"):
+            ean13 = isbnlib.ean13(isbnlike)
+            if ean13:
+                isbns.append(ean13)
+    return isbns
+
+
+async def isbns2books_bnf(
+    isbns: list[str], client: httpx.AsyncClient | None = None
+) -> dict[str, BookCreate]:
+    """Query bnf SRU api to find the records of several ISBNs at once
+
+    The ISBNs are OR-combined in the CQL query of a single request per
+    `constants.BNF_SRU_BATCH_SIZE` ISBNs, and the records are mapped back
+    to the ISBNs by their dc:identifier. The first record of an ISBN is
+    kept, as `isbn2book_bnf` does. The ISBNs that no record could be mapped
+    to are missing from the result, to be looked up one by one.
+
+    Parameters
+    ----------
+    isbns : list
+        EAN-13 to search
+
+    client : httpx.AsyncClient or None
+        shared HTTP client, a temporary one when None
+
+    Returns
+    -------
+    dict
+        Books found, by EAN-13
+    """
+    found: dict[str, tuple[str, Element]] = {}
+    async with provider_client(client) as client:
+        for start in range(0, len(isbns), constants.BNF_SRU_BATCH_SIZE):
+            chunk = isbns[start : start + constants.BNF_SRU_BATCH_SIZE]
+            query = " or ".join(f'bib.fuzzyISBN all "{isbn}"' for isbn in chunk)
+            position = 1
+            for _ in range(constants.BNF_SRU_MAXIMAL_PAGES):
+                r = await client.get(
+                    "https://catalogue.bnf.fr/api/SRU",
+                    params={
+                        "version": "1.2",
+                        "operation": "searchRetrieve",
+                        "query": query,
+                        "recordSchema": "dublincore",
+                        "maximumRecords": constants.BNF_SRU_PAGE_SIZE,
+                        "startRecord": position,
+                    },
+                    timeout=PROVIDER_TIMEOUTS["bnf"],
+                )
+                if r.status_code != 200:
+                    raise ProviderError(f"BnF: SRU status {r.status_code}")
+                root = ET.fromstring(r.text)
+
+                for record in root.iterfind("srw:records/srw:record", BNF_NAMESPACES):
+                    record_identifier = record.findtext(
+                        "srw:recordIdentifier", "", BNF_NAMESPACES
+                    )
+                    record_data = record.find("srw:recordData", BNF_NAMESPACES)
+                    if record_data is None:
+                        continue
+                    for isbn in bnf_record_isbns(record_data):
+                        if isbn in chunk and isbn not in found:
+                            found[isbn] = (record_identifier, record_data)
+
+                next_position = root.findtext(
+                    "srw:nextRecordPosition", "", BNF_NAMESPACES
+                )
+                if not next_position or all(isbn in found for isbn in chunk):
+                    break
+                position = int(next_position)
+
+        async def book(isbn: str, record_identifier: str, record_data: Element):
+            try:
+                book = dublincore2book(record_data)
+            except babelfish.Error as error:
+                # looked up again on its own
+                print(f"BnF: {type(error).__name__} {error}, isbn {isbn}")
+                return isbn, None
+            book.isbn = isbn
+            try:
+                book.cover = await bnf_cover(client, record_identifier)
+            except (httpx.HTTPError, OSError) as error:
+                print(f"BnF: cover {type(error).__name__}, isbn {isbn}")
+            return isbn, book
+
+        results = await asyncio.gather(
+            *(book(isbn, *record) for isbn, record in found.items())
+        )
+    books = {isbn: book for isbn, book in results if book is not None}
+    print(f"BnF: {len(books)} of {len(isbns)} ISBNs found by batch")
+    return books
+
+
+async def isbn2book_banq(
+    isbn: int, client: httpx.AsyncClient | None = None
+) -> BookCreate | None:
     """Query banq.qc.ca  rss api to find a book record
 
     Parameters
@@ -261,22 +392,25 @@ async def isbn2book_banq(isbn: int) -> BookCreate | None:
     isbn : int
         ISBN to search
 
+    client : httpx.AsyncClient or None
+        shared HTTP client, a temporary one when None
+
     Returns
     -------
     BookCreate or None
         Book if found
     """
-    async with httpx.AsyncClient() as client:
+    async with provider_client(client) as client:
         headers = HeaderGenerator()()
 
         r = await client.get(
             f"https://cap.banq.qc.ca/in/rest/api/rss?q={isbn}&locale=fr",
             headers=headers,
+            timeout=PROVIDER_TIMEOUTS["banq"],
         )
 
         if r.status_code == 302:
-            print("BAnQ doesn't like robots :(")
-            return None
+            raise ProviderError("BAnQ doesn't like robots :(")
 
         try:
             root = ET.fromstring(r.text)
@@ -317,7 +451,9 @@ async def isbn2book_banq(isbn: int) -> BookCreate | None:
     return None
 
 
-async def isbn2book_googlebooks(isbn) -> BookCreate | None:
+async def isbn2book_googlebooks(
+    isbn, client: httpx.AsyncClient | None = None
+) -> BookCreate | None:
     """Query Google book api to find a book record
 
     Parameters
@@ -325,14 +461,18 @@ async def isbn2book_googlebooks(isbn) -> BookCreate | None:
     isbn : int
         ISBN to search
 
+    client : httpx.AsyncClient or None
+        shared HTTP client, a temporary one when None
+
     Returns
     -------
     BookCreate or None
         Book if found
     """
-    async with httpx.AsyncClient() as client:
+    async with provider_client(client) as client:
         r = await client.get(
-            f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}"
+            f"https://www.googleapis.com/books/v1/volumes?q=isbn:{isbn}",
+            timeout=PROVIDER_TIMEOUTS["googlebooks"],
         )
         # print(r.text)
 
@@ -368,17 +508,7 @@ async def isbn2book_googlebooks(isbn) -> BookCreate | None:
     return book
 
 
-def isbn2language(isbn):
-    lang = isbnlib.info(isbn).split()[0]
-    # print(lang)
-    lang2 = [item.alpha2 for item in babelfish.LANGUAGE_MATRIX if item.name == lang]
-    if len(lang2) > 0:
-        return lang2[0]
-
-    return None
-
-
-async def isbn2book_openlibrary(isbn):
+async def isbn2book_openlibrary(isbn, client: httpx.AsyncClient | None = None):
     """Query openlibrary api to find a book record
 
     Parameters
@@ -386,26 +516,26 @@ async def isbn2book_openlibrary(isbn):
     isbn : int
         ISBN to search
 
+    client : httpx.AsyncClient or None
+        shared HTTP client, a temporary one when None
+
     Returns
     -------
     BookCreate or None
         Book if found
     """
-    async with httpx.AsyncClient() as client:
-        try:
-            r = await client.get(
-                f"https://openlibrary.org/isbn/{isbn}.json", follow_redirects=True
-            )
-        except httpx.ReadTimeout:
-            print("Open Library: timeout !!")
-            return None
+    async with provider_client(client) as client:
+        r = await client.get(
+            f"https://openlibrary.org/isbn/{isbn}.json",
+            follow_redirects=True,
+            timeout=PROVIDER_TIMEOUTS["openlibrary"],
+        )
 
         if r.status_code == 404:
             print("Open Library: not found")
             return None
         elif r.status_code != 200:
-            print("Open Library: status", r.status_code, r.text)
-            return None
+            raise ProviderError(f"Open Library: status {r.status_code}")
 
         volume_info = r.json()
 
@@ -419,7 +549,7 @@ async def isbn2book_openlibrary(isbn):
         work_url = f'https://openlibrary.org{volume_info["works"][0]["key"]}.json'
         # print(work_url)
 
-        work_r = await client.get(work_url)
+        work_r = await client.get(work_url, timeout=PROVIDER_TIMEOUTS["openlibrary"])
         work = work_r.json()
         # print(work)
 
@@ -461,15 +591,15 @@ async def isbn2book_openlibrary(isbn):
     return book
 
 
-async def openlibrarycover(isbn):
+async def openlibrarycover(isbn, client: httpx.AsyncClient | None = None):
     # We could also use isbn2book_openlibrary but seems lighter
-    async with httpx.AsyncClient() as client:
+    async with provider_client(client) as client:
         url = f"https://covers.openlibrary.org/b/isbn/{isbn}-L.jpg"
-        try:
-            r = await client.get(url, follow_redirects=True)
-        except httpx.ReadTimeout:
-            print("Open Library: Covers API timeout")
-            return None
+        r = await client.get(
+            url,
+            follow_redirects=True,
+            timeout=PROVIDER_TIMEOUTS["openlibrarycover"],
+        )
 
         if r.status_code != 200:
             print(f"Open Library: Covers API status {r.status_code}, url {r.url}")
@@ -478,6 +608,8 @@ async def openlibrarycover(isbn):
             # print("Default Open Library Cover detected")
             return None
 
+        # kept for the cover store
+        recent_downloads.add(url, r.content)
         return url
 
 
@@ -490,14 +622,17 @@ async def openlibrarycover(isbn):
 # https://developers.google.com/custom-search/v1/reference/rest/v1/cse/list
 
 
-async def googleimagescover(isbn, apikey: str, seachengine: str):
+async def googleimagescover(
+    isbn, apikey: str, seachengine: str, client: httpx.AsyncClient | None = None
+):
     # We could also use isbn2book_openlibrary but seems lighter
-    async with httpx.AsyncClient() as client:
+    async with provider_client(client) as client:
         r = await client.get(
             f"https://www.googleapis.com/customsearch/v1?key={apikey}"
             f"&cx={seachengine}&searchType=image&fields=kind,items(title,link,mime,displayLink,image/height,image/width,image/byteSize)"
             f"&num=10&q={isbn}"
-            f"&gl=fr"  # Geolocalisation France
+            f"&gl=fr",  # Geolocalisation France
+            timeout=PROVIDER_TIMEOUTS["googleimages"],
         )
 
         if r.status_code != 200:
@@ -516,40 +651,206 @@ async def googleimagescover(isbn, apikey: str, seachengine: str):
     return None
 
 
-async def isbn2book(in_isbn: str, settings: Settings) -> BookCreate | None:
+class ProviderLimits:
+    """Bound the number of concurrent requests sent to each provider
+
+    Shared by the lookups of a batch so that resolving many ISBNs at once
+    doesn't flood any single catalogue.
+    """
+
+    def __init__(self, concurrency: int = constants.ISBN_PROVIDER_CONCURRENCY):
+        self.concurrency = concurrency
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def __call__(self, provider: str) -> asyncio.Semaphore:
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(self.concurrency)
+        return self._semaphores[provider]
+
+
+# Deadline of a whole provider lookup, in seconds
+PROVIDER_DEADLINES: dict[str, float] = {
+    "bnf": 6.0,
+    "bnfbatch": 30.0,
+    "googlebooks": 4.0,
+    "openlibrary": 6.0,
+    "sudoc": 6.0,
+    "banq": 4.0,
+    "openlibrarycover": 5.0,
+    "googleimages": 4.0,
+}
+
+# Providers of book records, by priority
+BOOK_PROVIDERS: list[tuple[str, Callable]] = [
+    # TODO : use unimarcXchange for abstract
+    ("bnf", partial(isbn2book_bnf, format="dublincore")),
+    ("googlebooks", isbn2book_googlebooks),
+    ("openlibrary", isbn2book_openlibrary),
+    ("sudoc", isbn2book_sudoc),
+    ("banq", isbn2book_banq),
+]
+
+
+async def _query_provider(
+    limits: ProviderLimits | None,
+    provider: str,
+    lookup: Callable,
+    *args,
+    failures: list[str] | None = None,
+    scheduled_isbn: str | None = None,
+    **kwargs,
+):
+    """Call a provider lookup within its deadline
+
+    A provider that fails, misses its deadline or whose circuit is open is
+    logged, added to `failures`, and counts as not having found the book.
+    The lookup is recorded in the provider health, and in the provider
+    scheduler under `scheduled_isbn` when given. The time its requests wait
+    for the rate limits of their hosts counts neither in its deadline nor in
+    its latency.
+    """
+    async with limits(provider) if limits is not None else nullcontext():
+        if not provider_health.allow(provider):
+            print(f"{provider}: circuit open, skipped")
+        else:
+            start = time.monotonic()
+            pause = None
+            try:
+                async with asyncio.timeout(PROVIDER_DEADLINES[provider]) as deadline:
+                    pause = DeadlinePause(deadline)
+                    token = provider_deadline.set(pause)
+                    try:
+                        result = await lookup(*args, **kwargs)
+                    finally:
+                        provider_deadline.reset(token)
+                error = None
+            except TimeoutError:
+                error = "deadline exceeded"
+            except asyncio.CancelledError:
+                provider_health.record_cancel(provider)
+                raise
+            except Exception as exception:
+                error = f"{type(exception).__name__} {exception}"
+            latency = time.monotonic() - start - (pause.paused if pause else 0.0)
+            provider_health.record(provider, latency, error)
+            if scheduled_isbn is not None:
+                provider_scheduler.record(
+                    scheduled_isbn,
+                    provider,
+                    latency,
+                    found=error is None and result is not None,
+                    failed=error is not None,
+                )
+
+            if error is None:
+                return result
+            print(f"{provider}: {error}")
+    if failures is not None:
+        failures.append(provider)
+    return None
+
+
+async def isbn2book(
+    in_isbn: str,
+    settings: Settings,
+    limits: ProviderLimits | None = None,
+    client: httpx.AsyncClient | None = None,
+    failures: list[str] | None = None,
+) -> BookCreate | None:
+    """Find a book record and its cover
+
+    The providers of `BOOK_PROVIDERS` are queried at once, together with
+    the Open Library covers. Their priority is learned per ISBN range by the
+    provider scheduler, which also defers the providers that rarely find
+    the range until the others found nothing. The record of the first
+    provider by priority that found the book is kept: the answers of lower
+    priority providers wait for the higher priority ones, which are
+    cancelled as soon as a record is chosen. Google Images, whose quota is
+    limited, is only queried when no other cover was found.
+
+    Parameters
+    ----------
+    in_isbn : str
+        ISBN-10 or ISBN-13 to search
+    settings : Settings
+        Google API keys
+    limits : ProviderLimits or None
+        concurrency limits per provider
+    client : httpx.AsyncClient or None
+        shared HTTP client, a temporary one per provider when None
+    failures : list or None
+        names of the record providers that failed are appended to it,
+        a book not found with failures may exist
+
+    Returns
+    -------
+    BookCreate or None
+        Book if found
+    """
     isbn = isbnlib.ean13(in_isbn)  # "978-2013944762"
     if isbn == "":
         print("Invalid ISBN format")
         return None
 
-    openlibrarycovertested = False
-
-    # TODO : use unimarcXchange for abstract
-    book = await isbn2book_bnf(isbn, "dublincore")
+    def start(providers):
+        return [
+            asyncio.create_task(
+                _query_provider(
+                    limits,
+                    name,
+                    lookup,
+                    isbn,
+                    client=client,
+                    failures=failures,
+                    scheduled_isbn=isbn,
+                )
+            )
+            for name, lookup in providers
+        ]
+
+    providers, deferred_providers = provider_scheduler.order(isbn, BOOK_PROVIDERS)
+    lookups = start(providers)
+    cover_lookup = asyncio.create_task(
+        _query_provider(
+            limits, "openlibrarycover", openlibrarycover, isbn, client=client
+        )
+    )
+    try:
+        book = None
+        for lookup in lookups:
+            book = await lookup
+            if book is not None:
+                break
 
-    if book is None:
-        book = await isbn2book_googlebooks(isbn)
+        if book is None and deferred_providers:
+            lookups += start(deferred_providers)
+            for lookup in lookups[len(providers) :]:
+                book = await lookup
+                if book is not None:
+                    break
 
         if book is None:
-            book = await isbn2book_openlibrary(isbn)
-            openlibrarycovertested = True
-
-            if book is None:
-                book = await isbn2book_sudoc(isbn)
-
-                if book is None:
-                    book = await isbn2book_banq(isbn)
+            return None
 
-    if book is not None:
         if book.isbn is None:
             book.isbn = isbn
 
-        if (book.cover is None) and not openlibrarycovertested:
-            book.cover = await openlibrarycover(isbn)
+        if book.cover is None:
+            book.cover = await cover_lookup
 
         if book.cover is None:
-            book.cover = await googleimagescover(
-                isbn, settings.google_api_key, settings.google_custom_search_engine
+            book.cover = await _query_provider(
+                limits,
+                "googleimages",
+                googleimagescover,
+                isbn,
+                settings.google_api_key,
+                settings.google_custom_search_engine,
+                client=client,
             )
+    finally:
+        # lower priority lookups still running
+        for lookup in [*lookups, cover_lookup]:
+            lookup.cancel()
 
     return book
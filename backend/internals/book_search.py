@@ -0,0 +1,99 @@
+"""Full-text search over the book catalog
+
+Books are indexed in an SQLite FTS5 external content table, kept in sync
+with `booktable` by triggers. Searches use the FTS index and are ranked
+with bm25.
+"""
+
+import re
+
+from sqlalchemy import column, event, literal_column, table
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import false, func
+from sqlmodel import SQLModel, select
+
+from backend.models import BookTable
+from ..internals import constants
+
+FTS_TABLE = "booktable_fts"
+
+# Indexed columns and their bm25 weight
+FTS_COLUMNS = {
+    "title": 10.0,
+    "author": 5.0,
+    "abstract": 1.0,
+    "publisher": 1.0,
+    "category_topics": 2.0,
+}
+
+_columns = ", ".join(FTS_COLUMNS)
+_new_values = ", ".join(f"new.{name}" for name in FTS_COLUMNS)
+_old_values = ", ".join(f"old.{name}" for name in FTS_COLUMNS)
+_book_table = BookTable.__tablename__
+
+FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_columns},
+        content='{_book_table}',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+    AFTER INSERT ON {_book_table} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+    AFTER DELETE ON {_book_table} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns})
+        VALUES ('delete', old.id, {_old_values});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF {_columns} ON {_book_table} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns})
+        VALUES ('delete', old.id, {_old_values});
+        INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+    END""",
+]
+
+
+@event.listens_for(SQLModel.metadata, "after_create")
+def create_book_search_index(target, connection: Connection, **kw) -> None:
+    """Create the FTS index and its triggers, index existing books if new"""
+    if connection.dialect.name != "sqlite":
+        return
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)
+    ).first()
+    for ddl in FTS_DDL:
+        connection.exec_driver_sql(ddl)
+    if exists is None:
+        connection.exec_driver_sql(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+        )
+
+
+def build_match_expression(query: str) -> str:
+    """Convert a user query to an FTS5 MATCH expression
+
+    Every word of the query must be found, the last letters of a word may be
+    missing: "harr pott" finds "Harry Potter". FTS5 operators and quotes in
+    the query are ignored.
+    """
+    terms = re.findall(r"\w+", query)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_books_statement(query: str) -> constants.STATEMENT_TYPE:
+    """Statement selecting the books matching a query, best match first"""
+    match_expression = build_match_expression(query)
+    if not match_expression:
+        return select(BookTable).where(false())
+
+    fts_table = table(FTS_TABLE, column("rowid"))
+    fts = literal_column(FTS_TABLE)
+    return (
+        select(BookTable)
+        .join(fts_table, fts_table.c.rowid == BookTable.id)
+        .where(fts.op("MATCH")(match_expression))
+        .order_by(func.bm25(fts, *FTS_COLUMNS.values()))
+    )
@@ -0,0 +1,215 @@
+"""Bulk import of table rows from NDJSON or CSV files
+
+Rows are validated with the create model of the table on the thread pool,
+then inserted by the session runner of the route, with the other writes,
+with one `executemany` INSERT per chunk of `constants.BULK_IMPORT_CHUNK_SIZE`
+rows. Invalid rows, and rows refused by the database, are reported without
+aborting the import.
+"""
+
+from itertools import batched
+from typing import Iterator, Optional, Union
+
+import csv
+import json
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel
+from starlette.concurrency import run_in_threadpool
+
+from backend.database import SessionRunner
+from backend.models import BulkImportError, BulkImportReport
+from ..internals import constants
+from ..internals.table_management import fill_normalized_columns, invalidate_row_count
+
+NDJSON_MEDIA_TYPES = {"application/x-ndjson", "application/jsonl"}
+CSV_MEDIA_TYPES = {"text/csv"}
+
+# (row number, row values or the reason why the row can't be read)
+ParsedRow = tuple[int, Union[dict, str]]
+
+
+def parse_rows(body: bytes, content_type: Optional[str]) -> Iterator[ParsedRow]:
+    """Read the rows of an NDJSON or CSV file
+
+    Empty CSV cells are left out, so that the default value of the field is
+    used. The body is decoded with the charset of the content type, UTF-8 by
+    default.
+
+    Raises
+    ----------
+    HTTPException 415 for other content types or an unknown charset,
+    HTTPException 400 when the body can't be decoded
+    """
+    media_type, _, parameters = (content_type or "").partition(";")
+    media_type = media_type.strip().lower()
+    charset = "utf-8-sig"
+    for parameter in parameters.split(";"):
+        name, _, value = parameter.partition("=")
+        if name.strip().lower() == "charset" and value.strip():
+            charset = value.strip().strip('"')
+            if charset.lower().replace("_", "-") in ("utf-8", "utf8"):
+                # also drops a byte order mark
+                charset = "utf-8-sig"
+    try:
+        text = body.decode(charset)
+    except LookupError:
+        raise HTTPException(status_code=415, detail=f"Unknown charset {charset}")
+    except UnicodeDecodeError as error:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid {charset} body at byte {error.start},"
+            " set the charset of the content type",
+        )
+
+    if media_type in NDJSON_MEDIA_TYPES:
+        for number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError as error:
+                yield number, f"Invalid JSON: {error.msg}"
+                continue
+            if not isinstance(row, dict):
+                yield number, "Invalid JSON: expected an object"
+                continue
+            yield number, row
+    elif media_type in CSV_MEDIA_TYPES:
+        reader = csv.DictReader(text.splitlines())
+        for number, row in enumerate(reader, start=1):
+            if None in row:
+                # cells beyond the header, under the None key
+                yield number, f"{len(row[None])} more cells than columns"
+                continue
+            yield number, {key: value for key, value in row.items() if value != ""}
+    else:
+        raise HTTPException(
+            status_code=415,
+            detail="Unsupported content type, expected application/x-ndjson or text/csv",
+        )
+
+
+def _validation_detail(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in item['loc'])}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+def _insert_chunk(
+    session: Session,
+    table: type[SQLModel],
+    chunk: list[tuple[int, dict]],
+    errors: list[BulkImportError],
+) -> int:
+    """Insert a chunk in one savepoint, row by row if the database refuses it"""
+    try:
+        with session.begin_nested():
+            session.exec(insert(table), params=[values for _, values in chunk])
+        return len(chunk)
+    except IntegrityError:
+        pass
+
+    inserted = 0
+    for number, values in chunk:
+        try:
+            with session.begin_nested():
+                session.exec(insert(table), params=[values])
+            inserted += 1
+        except IntegrityError as error:
+            errors.append(BulkImportError(row=number, detail=str(error.orig)))
+    return inserted
+
+
+def validate_rows(
+    table: type[SQLModel],
+    create_model: type[SQLModel],
+    rows: Iterator[ParsedRow],
+) -> tuple[list[tuple[int, dict]], BulkImportReport]:
+    """Validate rows with the create model of their table
+
+    Returns
+    ----------
+    values of the valid rows with their numbers, and the report of the
+    invalid rows and of the columns that aren't fields of the create model
+    """
+    valid = []
+    errors: list[BulkImportError] = []
+    ignored_columns: dict[str, None] = {}
+
+    for number, row in rows:
+        if isinstance(row, str):
+            errors.append(BulkImportError(row=number, detail=row))
+            continue
+        for column in row:
+            if column not in create_model.model_fields:
+                ignored_columns[column] = None
+        try:
+            values = create_model.model_validate(row).model_dump()
+        except ValidationError as error:
+            errors.append(BulkImportError(row=number, detail=_validation_detail(error)))
+            continue
+        valid.append((number, fill_normalized_columns(table, values)))
+
+    return valid, BulkImportReport(
+        inserted=0, errors=errors, ignored_columns=list(ignored_columns)
+    )
+
+
+def insert_rows(
+    session: Session,
+    table: type[SQLModel],
+    rows: list[tuple[int, dict]],
+    errors: list[BulkImportError],
+    chunk_size: int = constants.BULK_IMPORT_CHUNK_SIZE,
+) -> int:
+    """Insert validated rows in chunks, committed one by one
+
+    The rows refused by the database are appended to errors.
+
+    Returns
+    ----------
+    number of rows inserted
+    """
+    inserted = 0
+    for chunk in batched(rows, chunk_size):
+        inserted += _insert_chunk(session, table, list(chunk), errors)
+        session.commit()
+
+    if inserted:
+        invalidate_row_count(session, table)
+    return inserted
+
+
+async def import_rows(
+    runner: SessionRunner,
+    table: type[SQLModel],
+    create_model: type[SQLModel],
+    rows: Iterator[ParsedRow],
+) -> BulkImportReport:
+    """Validate rows, then insert them with the writes of the runner
+
+    Parameters
+    ----------
+    runner:
+        session runner of the write routes
+    table:
+        ex: BookTable
+    create_model:
+        model validating each row, ex: BookCreate
+    rows:
+        result of parse_rows
+
+    Returns
+    ----------
+    BulkImportReport
+    """
+    valid, report = await run_in_threadpool(validate_rows, table, create_model, rows)
+    if valid:
+        report.inserted = await runner.write(insert_rows, table, valid, report.errors)
+    report.errors.sort(key=lambda error: error.row)
+    return report
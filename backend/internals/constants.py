@@ -23,3 +23,60 @@ LIMIT_MAXIMAL_VALUE = 100
 
 DATE_DEFAULT_START_VALUE = "2016-09-01"
 DATE_DEFAULT_END_VALUE = f"{date.today()}"
+
+# Constants for the database writes
+
+GROUP_COMMIT_MAXIMAL_SIZE = 64  # writes of the routes committed together
+
+# Constants for the LiteFS replicas
+
+LITEFS_CATCH_UP_TIMEOUT = 2.0  # seconds a replica waits for a client's last write
+LITEFS_CATCH_UP_INTERVAL = 0.01  # seconds between the reads of the replica position
+LITEFS_TXID_COOKIE_MAX_AGE = 10  # seconds a client waits for its writes on replicas
+LITEFS_PROXY_TIMEOUT = 30.0  # seconds of a write proxied to the primary
+# seconds the reads of a client go to the primary after a streamed write
+LITEFS_STREAMED_WRITE_MAX_AGE = 600
+
+# Constants for exports
+
+EXPORT_CHUNK_SIZE = 500
+
+# Constants for bulk imports
+
+BULK_IMPORT_CHUNK_SIZE = 1000
+
+# Constants for ISBN lookups
+
+ISBN_PROVIDER_CONCURRENCY = 4  # concurrent requests per provider in a batch
+ISBN_BATCH_INSERT_SIZE = 20  # books inserted per transaction in a batch
+ISBN_BATCH_MAXIMAL_SIZE = 1000  # ISBNs accepted by one batch request
+BNF_SRU_BATCH_SIZE = 50  # ISBNs OR-combined in one BnF SRU query
+BNF_SRU_PAGE_SIZE = 100  # records per BnF SRU response
+BNF_SRU_MAXIMAL_PAGES = 3  # responses read per BnF SRU query
+
+# Constants for the enrichment jobs
+
+ENRICHMENT_WORKERS = 4  # jobs run concurrently
+ENRICHMENT_MAXIMAL_ATTEMPTS = 3  # lookups of a job while its providers fail
+ENRICHMENT_RETRY_DELAY = 60.0  # seconds before a job whose providers failed is retried
+ENRICHMENT_MAXIMAL_WAIT = 30.0  # seconds a client can wait for the end of a job
+
+# Constants for the cover store
+
+COVER_THUMBNAIL_SIZES = (128, 256, 512)  # bounding box of the thumbnails, in pixels
+COVER_MAXIMAL_BYTES = 10 * 2**20  # larger covers are not downloaded
+COVER_RECENT_DOWNLOADS = 64  # covers downloaded by the providers kept in memory
+# hosts of the provider covers, the only ones downloaded on a cover request
+COVER_RESTORE_HOSTS = ("catalogue.bnf.fr", "books.google.com", "covers.openlibrary.org")
+
+# Constants for the provider health
+
+CIRCUIT_FAILURE_THRESHOLD = 5  # failures in a row opening the circuit of a provider
+CIRCUIT_RESET_TIMEOUT = 30.0  # seconds before a provider is tried again
+PROVIDER_STATS_WINDOW = 100  # last lookups of the error rates and latencies
+
+# Constants for the provider scheduler
+
+PROVIDER_SCHEDULER_MIN_LOOKUPS = 20  # lookups of an ISBN range before it is trusted
+PROVIDER_SCHEDULER_DEFER_HIT_RATE = 0.05  # providers below are queried last
+PROVIDER_SCHEDULER_SAVE_INTERVAL = 300.0  # seconds between saves of the statistics
@@ -0,0 +1,237 @@
+"""Local store of the book covers
+
+Each cover is downloaded once and stored under the SHA-256 of its content,
+as WebP thumbnails of the sizes of `constants.COVER_THUMBNAIL_SIZES`:
+
+    <directory>/<hash[:2]>/<hash>-<size>.webp
+
+The thumbnails are made by Pillow in a pool of worker processes, and served
+by the covers router at `/covers/<hash>-<size>.webp`. Their content never
+changes, so they can be cached forever by the browsers. The thumbnails
+missing from the directory, e.g. on a new node or a LiteFS replica, are made
+again from the cover URL of their book when they are requested, if it is
+from one of the provider hosts.
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+
+import httpx
+from fastapi import Request
+from PIL import Image
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from ..internals import constants
+from ..internals.http_client import PROVIDER_TIMEOUTS, provider_client
+
+
+class CoverStoreSettings(BaseSettings):
+    """Settings of the cover store, read from COVER_STORE_* variables"""
+
+    directory: Path = Path("covers")
+    workers: int = 2  # processes making the thumbnails
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_prefix="cover_store_", extra="ignore"
+    )
+
+
+@lru_cache
+def get_cover_store_settings():
+    return CoverStoreSettings()
+
+
+class RecentDownloads:
+    """Content of the last covers downloaded by the providers, by URL
+
+    The providers that download a cover to check it, such as BnF for its
+    placeholder, leave it here so that the store doesn't download it again.
+    """
+
+    def __init__(self, max_entries: int = constants.COVER_RECENT_DOWNLOADS):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._contents: OrderedDict[str, bytes] = OrderedDict()
+
+    def add(self, url: str, content: bytes) -> None:
+        with self._lock:
+            self._contents[url] = content
+            self._contents.move_to_end(url)
+            while len(self._contents) > self._max_entries:
+                self._contents.popitem(last=False)
+
+    def pop(self, url: str) -> Optional[bytes]:
+        with self._lock:
+            return self._contents.pop(url, None)
+
+
+recent_downloads = RecentDownloads()
+
+
+def thumbnail_path(directory: Path, digest: str, size: int) -> Path:
+    return directory / digest[:2] / f"{digest}-{size}.webp"
+
+
+def make_thumbnails(content: bytes, directory: Path, digest: str) -> None:
+    """Write the WebP thumbnails of an image, run in the worker processes
+
+    Raises
+    ----------
+    PIL.UnidentifiedImageError or OSError when the content isn't an image
+    """
+    with Image.open(BytesIO(content)) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+
+        for size in constants.COVER_THUMBNAIL_SIZES:
+            path = thumbnail_path(directory, digest, size)
+            if path.exists():
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size), Image.Resampling.LANCZOS)
+            # write then rename, a thumbnail is never served half written
+            temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+            thumbnail.save(temporary_path, "WEBP", quality=80, method=4)
+            os.replace(temporary_path, path)
+
+
+class CoverStore:
+    """Download covers and store their thumbnails
+
+    Parameters
+    ----------
+    directory:
+        where the thumbnails are written
+    executor:
+        pool running `make_thumbnails`
+    """
+
+    def __init__(self, directory: Path, executor: Executor):
+        self.directory = directory
+        self.executor = executor
+
+    async def _download(
+        self, url: str, client: Optional[httpx.AsyncClient]
+    ) -> Optional[bytes]:
+        content = recent_downloads.pop(url)
+        if content is not None:
+            return content
+
+        async with provider_client(client) as client:
+            try:
+                async with client.stream(
+                    "GET",
+                    url,
+                    follow_redirects=True,
+                    timeout=PROVIDER_TIMEOUTS["coverstore"],
+                ) as r:
+                    if r.status_code != 200:
+                        print(f"Cover store: status {r.status_code}, url {url}")
+                        return None
+                    content = bytearray()
+                    async for chunk in r.aiter_bytes():
+                        content += chunk
+                        if len(content) > constants.COVER_MAXIMAL_BYTES:
+                            print(f"Cover store: cover too large, url {url}")
+                            return None
+            except httpx.HTTPError as error:
+                print(f"Cover store: {type(error).__name__}, url {url}")
+                return None
+        return bytes(content)
+
+    async def store(
+        self, url: str, client: Optional[httpx.AsyncClient] = None
+    ) -> Optional[str]:
+        """Download a cover and make its thumbnails
+
+        Returns
+        ----------
+        hash of the cover, None when it can't be downloaded or isn't an image
+        """
+        content = await self._download(url, client)
+        if not content:
+            return None
+
+        digest = hashlib.sha256(content).hexdigest()
+        if not await self._make_thumbnails(content, digest, url):
+            return None
+        return digest
+
+    async def restore(
+        self, digest: str, url: str, client: Optional[httpx.AsyncClient] = None
+    ) -> bool:
+        """Make again the missing thumbnails of a cover stored from `url`
+
+        Only the covers of the provider hosts are downloaded, `url` is read
+        from a book, e.g. written by a client.
+
+        Returns
+        ----------
+        False when the cover isn't from a provider host, can't be downloaded
+        or its content changed
+        """
+        try:
+            host = httpx.URL(url).host
+        except httpx.InvalidURL:
+            return False
+        if host not in constants.COVER_RESTORE_HOSTS:
+            return False
+
+        content = await self._download(url, client)
+        if not content or hashlib.sha256(content).hexdigest() != digest:
+            return False
+        return await self._make_thumbnails(content, digest, url)
+
+    async def _make_thumbnails(self, content: bytes, digest: str, url: str) -> bool:
+        if all(
+            thumbnail_path(self.directory, digest, size).exists()
+            for size in constants.COVER_THUMBNAIL_SIZES
+        ):
+            return True
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                self.executor, make_thumbnails, content, self.directory, digest
+            )
+        except (OSError, Image.DecompressionBombError) as error:
+            print(f"Cover store: {type(error).__name__} {error}, url {url}")
+            return False
+        return True
+
+    def path(self, digest: str, size: int) -> Path:
+        return thumbnail_path(self.directory, digest, size)
+
+
+def create_cover_store(settings: CoverStoreSettings) -> CoverStore:
+    """Create a cover store, to close with `close_cover_store`"""
+    executor = ProcessPoolExecutor(
+        max_workers=settings.workers, mp_context=multiprocessing.get_context("spawn")
+    )
+    return CoverStore(settings.directory, executor)
+
+
+def close_cover_store(cover_store: CoverStore) -> None:
+    cover_store.executor.shutdown(cancel_futures=True)
+
+
+def get_cover_store(request: Request) -> Optional[CoverStore]:
+    """Get the cover store for FastAPI Dependency
+
+    None when the application was started without its lifespan,
+    the covers are then kept as remote URLs only.
+    """
+    return getattr(request.app.state, "cover_store", None)
@@ -0,0 +1,286 @@
+"""Background enrichment of the books created from an ISBN
+
+`create_job` inserts a book holding only its ISBN, with a job in the
+`EnrichmentJobTable`, so that the request creating it returns at once. The
+`EnrichmentQueue` started with the application runs the jobs with
+`constants.ENRICHMENT_WORKERS` asyncio tasks: the book is looked up through
+the ISBN cache, then its row is filled in with the record and cover found.
+
+A job whose providers failed without finding the book is retried after
+`constants.ENRICHMENT_RETRY_DELAY` seconds, up to
+`constants.ENRICHMENT_MAXIMAL_ATTEMPTS` lookups. The jobs are persisted, the
+unfinished ones are queued again when the application starts.
+"""
+
+from datetime import datetime, timezone
+from typing import Optional
+
+import asyncio
+
+import httpx
+import isbnlib
+from fastapi import Request
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, col, select
+from starlette.concurrency import run_in_threadpool
+
+from backend.config import Settings, get_settings
+from backend.models import BookTable, EnrichmentJobTable
+from ..internals import constants
+from ..internals.book_notice import ProviderLimits
+from ..internals.cover_store import CoverStore
+from ..internals.isbn_cache import (
+    IsbnCacheSettings,
+    cached_isbn2book,
+    get_isbn_cache_settings,
+)
+from ..internals.table_management import invalidate_row_count
+
+FINISHED_STATUSES = ("done", "not_found", "failed")
+
+
+def _now() -> datetime:
+    # naive UTC, as read back from SQLite
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def create_job(session: Session, in_isbn: str) -> Optional[EnrichmentJobTable]:
+    """Insert a book holding only its ISBN and the job enriching it
+
+    Returns
+    ----------
+    the job, None when the ISBN is invalid
+    """
+    isbn = isbnlib.ean13(in_isbn)
+    if not isbn:
+        return None
+
+    # the ISBN stands for the title until the record is found
+    book = BookTable(title=isbn, author="", isbn=int(isbn))
+    session.add(book)
+    session.flush()
+    now = _now()
+    job = EnrichmentJobTable(
+        isbn=isbn, book_id=book.id, created_date=now, updated_date=now
+    )
+    session.add(job)
+    session.commit()
+    session.refresh(job)
+    invalidate_row_count(session, BookTable)
+    return job
+
+
+def _start(engine: Engine, job_id: int) -> Optional[str]:
+    with Session(engine) as session:
+        job = session.get(EnrichmentJobTable, job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return None
+        job.status = "running"
+        job.attempts += 1
+        job.updated_date = _now()
+        session.add(job)
+        session.commit()
+        return job.isbn
+
+
+def _status(engine: Engine, job_id: int) -> Optional[str]:
+    with Session(engine) as session:
+        job = session.get(EnrichmentJobTable, job_id)
+        return job.status if job is not None else None
+
+
+def _finish(engine: Engine, job_id: int, book, error: Optional[str]) -> str:
+    with Session(engine) as session:
+        job = session.get(EnrichmentJobTable, job_id)
+        db_book = session.get(BookTable, job.book_id)
+        if db_book is None:
+            job.status = "failed"
+            error = "Book deleted"
+        elif book is not None:
+            db_book.sqlmodel_update(book.model_dump(exclude_unset=True))
+            session.add(db_book)
+            job.status = "done"
+        elif error is None:
+            job.status = "not_found"
+        elif job.attempts < constants.ENRICHMENT_MAXIMAL_ATTEMPTS:
+            job.status = "pending"
+        else:
+            job.status = "failed"
+        job.error = error
+        job.updated_date = _now()
+        session.add(job)
+        session.commit()
+        return job.status
+
+
+async def run_job(
+    engine: Engine,
+    job_id: int,
+    settings: Settings,
+    cache_settings: IsbnCacheSettings,
+    limits: Optional[ProviderLimits] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    cover_store: Optional[CoverStore] = None,
+) -> Optional[str]:
+    """Look up the book of a job and fill in its row
+
+    Returns
+    ----------
+    status of the job, "pending" when it should be retried,
+    None when it was already finished
+    """
+    isbn = await run_in_threadpool(_start, engine, job_id)
+    if isbn is None:
+        return None
+
+    failures: list[str] = []
+    error = None
+    try:
+        book = await cached_isbn2book(
+            engine,
+            isbn,
+            settings,
+            cache_settings,
+            limits,
+            client,
+            cover_store,
+            failures=failures,
+        )
+    except Exception as exception:
+        print(f"Enrichment: {type(exception).__name__} {exception}, isbn {isbn}")
+        book = None
+        error = f"{type(exception).__name__} {exception}"
+    if book is None and failures and error is None:
+        error = f"Providers failed: {', '.join(failures)}"
+    return await run_in_threadpool(_finish, engine, job_id, book, error)
+
+
+class EnrichmentQueue:
+    """Pool of asyncio tasks running the enrichment jobs
+
+    Parameters
+    ----------
+    engine:
+        database engine of the books and jobs
+    client:
+        shared HTTP client
+    cover_store:
+        store of the cover thumbnails, the covers are only linked when None
+    workers:
+        jobs run concurrently
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        client: Optional[httpx.AsyncClient] = None,
+        cover_store: Optional[CoverStore] = None,
+        workers: int = constants.ENRICHMENT_WORKERS,
+    ):
+        self.engine = engine
+        self.client = client
+        self.cover_store = cover_store
+        self.workers = workers
+        self.limits = ProviderLimits()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._finished: dict[int, asyncio.Event] = {}
+        self._waiters: dict[int, int] = {}
+
+    def start(self) -> None:
+        """Queue the unfinished jobs and start the workers"""
+        with Session(self.engine) as session:
+            job_ids = session.exec(
+                select(EnrichmentJobTable.id)
+                .where(col(EnrichmentJobTable.status).in_(["pending", "running"]))
+                .order_by(EnrichmentJobTable.id)
+            ).all()
+        for job_id in job_ids:
+            # settings read when the job is run
+            self.submit(job_id)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stop the workers, the jobs running are run again on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(
+        self,
+        job_id: int,
+        settings: Optional[Settings] = None,
+        cache_settings: Optional[IsbnCacheSettings] = None,
+    ) -> None:
+        """Queue a job, run with the default settings when None"""
+        self._queue.put_nowait((job_id, settings, cache_settings))
+
+    async def wait(self, job_id: int, timeout: float) -> None:
+        """Wait at most `timeout` seconds for the end of a job
+
+        Returns at once when the queue isn't started, e.g. on a LiteFS
+        replica, whose jobs are run by the primary.
+        """
+        if not self._tasks:
+            return
+        finished = self._finished.setdefault(job_id, asyncio.Event())
+        self._waiters[job_id] = self._waiters.get(job_id, 0) + 1
+        try:
+            # the job may have finished before the event was registered
+            if (
+                await run_in_threadpool(_status, self.engine, job_id)
+                in FINISHED_STATUSES
+            ):
+                finished.set()
+                return
+            async with asyncio.timeout(timeout):
+                await finished.wait()
+        except TimeoutError:
+            pass
+        finally:
+            self._waiters[job_id] -= 1
+            # the last waiter drops the event the job didn't set
+            if not self._waiters[job_id]:
+                del self._waiters[job_id]
+                if self._finished.get(job_id) is finished:
+                    del self._finished[job_id]
+
+    async def _work(self) -> None:
+        while True:
+            job_id, settings, cache_settings = await self._queue.get()
+            try:
+                status = await run_job(
+                    self.engine,
+                    job_id,
+                    settings or get_settings(),
+                    cache_settings or get_isbn_cache_settings(),
+                    self.limits,
+                    self.client,
+                    self.cover_store,
+                )
+            except Exception as exception:
+                # e.g. missing settings, the job stays queued in the table
+                print(f"Enrichment: job {job_id} {type(exception).__name__}")
+                status = None
+            if status == "pending":
+                asyncio.get_running_loop().call_later(
+                    constants.ENRICHMENT_RETRY_DELAY,
+                    self.submit,
+                    job_id,
+                    settings,
+                    cache_settings,
+                )
+            elif status is not None:
+                finished = self._finished.pop(job_id, None)
+                if finished is not None:
+                    finished.set()
+
+
+def get_enrichment_queue(request: Request) -> Optional[EnrichmentQueue]:
+    """Get the enrichment queue for FastAPI Dependency
+
+    None when the application was started without its lifespan,
+    the jobs then run once the response is sent.
+    """
+    return getattr(request.app.state, "enrichment_queue", None)
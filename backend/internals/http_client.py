@@ -0,0 +1,234 @@
+"""Shared HTTP client of the book metadata providers
+
+One `httpx.AsyncClient` is opened for the lifetime of the application, so
+that the lookups reuse the kept-alive connections to the provider hosts
+instead of paying a TCP and TLS handshake for every request. Connections
+are bounded in total and per host, and each provider has its own timeouts.
+
+The deadline of a provider lookup is paused while its requests wait for
+the limits of their host, so that our own throttling isn't taken for a
+slow provider.
+"""
+
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import AsyncIterator, Callable, Iterator, Optional
+
+import asyncio
+
+import httpx
+from fastapi import Request
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+from ..internals.provider_health import ProviderHealth, provider_health
+
+# Timeouts of the requests sent to each provider, in seconds
+PROVIDER_TIMEOUTS: dict[str, httpx.Timeout] = {
+    "bnf": httpx.Timeout(10.0, connect=5.0),
+    "sudoc": httpx.Timeout(10.0, connect=5.0),
+    "googlebooks": httpx.Timeout(5.0, connect=5.0),
+    "openlibrary": httpx.Timeout(10.0, connect=5.0),
+    "openlibrarycover": httpx.Timeout(10.0, connect=5.0),
+    "banq": httpx.Timeout(5.0, connect=5.0),
+    "googleimages": httpx.Timeout(5.0, connect=5.0),
+    "coverstore": httpx.Timeout(10.0, connect=5.0),
+}
+
+
+class HttpClientSettings(BaseSettings):
+    """Settings of the shared HTTP client, read from HTTP_CLIENT_* variables"""
+
+    http2: bool = False  # requires the h2 package: pip install httpx[http2]
+    max_connections: int = 100
+    max_connections_per_host: int = 10
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_prefix="http_client_", extra="ignore"
+    )
+
+
+@lru_cache
+def get_http_client_settings():
+    return HttpClientSettings()
+
+
+class DeadlinePause:
+    """Pause the deadline of a provider lookup while its requests are throttled
+
+    Parameters
+    ----------
+    deadline:
+        asyncio.timeout of the lookup
+    """
+
+    def __init__(self, deadline: asyncio.Timeout):
+        self.deadline = deadline
+        self.paused = 0.0  # seconds, to subtract from the lookup latency
+        self._waiting = 0
+        self._paused_at = 0.0
+        self._remaining: Optional[float] = None
+
+    @contextmanager
+    def pause(self) -> Iterator[None]:
+        loop = asyncio.get_running_loop()
+        if self._waiting == 0:
+            self._paused_at = loop.time()
+            when = self.deadline.when()
+            self._remaining = None
+            if when is not None and not self.deadline.expired():
+                self._remaining = when - self._paused_at
+                self.deadline.reschedule(None)
+        self._waiting += 1
+        try:
+            yield
+        finally:
+            self._waiting -= 1
+            if self._waiting == 0:
+                now = loop.time()
+                self.paused += now - self._paused_at
+                if self._remaining is not None and not self.deadline.expired():
+                    try:
+                        self.deadline.reschedule(now + self._remaining)
+                    except RuntimeError:
+                        # the lookup ended while a request was waiting
+                        pass
+
+
+# Deadline of the provider lookup running in the current context
+provider_deadline: ContextVar[Optional[DeadlinePause]] = ContextVar(
+    "provider_deadline", default=None
+)
+
+
+def _throttled():
+    deadline = provider_deadline.get()
+    return deadline.pause() if deadline is not None else nullcontext()
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response stream calling `release` once the response is closed"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._release is not None:
+                self._release()
+                self._release = None
+
+
+class HostLimitedTransport(httpx.AsyncBaseTransport):
+    """Transport bounding the number of requests in flight to each host
+
+    The connection pool of httpx only bounds the total number of
+    connections, a slow provider could then hold all of them. With a
+    `health`, the requests also wait for the token bucket of their host.
+    These waits pause the `provider_deadline` of the lookup.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        max_per_host: int,
+        health: Optional[ProviderHealth] = None,
+    ):
+        self._transport = transport
+        self._max_per_host = max_per_host
+        self._health = health
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self._max_per_host)
+        semaphore = self._semaphores[host]
+
+        with _throttled():
+            await semaphore.acquire()
+        try:
+            if self._health is not None:
+                with _throttled():
+                    await self._health.acquire(host)
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            semaphore.release()
+            raise
+        if self._health is not None:
+            self._health.record_response(host, response.status_code)
+        if response.is_closed:
+            # content already read by the transport
+            semaphore.release()
+        else:
+            response.stream = _ReleasingStream(response.stream, semaphore.release)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def create_http_client(
+    settings: Optional[HttpClientSettings] = None, **transport_options
+) -> httpx.AsyncClient:
+    """Create a pooled HTTP client, to close with `aclose`
+
+    Parameters
+    ----------
+    settings:
+        default settings when None
+    transport_options:
+        extra arguments of httpx.AsyncHTTPTransport, e.g. verify
+    """
+    if settings is None:
+        settings = HttpClientSettings()
+
+    http2 = settings.http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            print("HTTP client: h2 is not installed, HTTP/2 disabled")
+            http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.max_connections,
+        max_keepalive_connections=settings.max_keepalive_connections,
+        keepalive_expiry=settings.keepalive_expiry,
+    )
+    transport = HostLimitedTransport(
+        httpx.AsyncHTTPTransport(http2=http2, limits=limits, **transport_options),
+        settings.max_connections_per_host,
+        provider_health,
+    )
+    return httpx.AsyncClient(transport=transport)
+
+
+@asynccontextmanager
+async def provider_client(
+    client: Optional[httpx.AsyncClient],
+) -> AsyncIterator[httpx.AsyncClient]:
+    """Use the given client, or a temporary one when None"""
+    if client is not None:
+        yield client
+    else:
+        async with create_http_client() as temporary_client:
+            yield temporary_client
+
+
+def get_http_client(request: Request) -> Optional[httpx.AsyncClient]:
+    """Get the shared HTTP client for FastAPI Dependency
+
+    None when the application was started without its lifespan,
+    the providers then open a temporary client.
+    """
+    return getattr(request.app.state, "http_client", None)
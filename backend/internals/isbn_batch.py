@@ -0,0 +1,177 @@
+"""Concurrent creation of books from a list of ISBNs
+
+The ISBNs of a batch are normalized to EAN-13 and deduplicated, then looked
+up concurrently. The ISBNs are first searched by chunks of
+`constants.BNF_SRU_BATCH_SIZE` in single BnF requests, and only those that
+BnF didn't find are looked up one by one through all the providers. The
+requests sent to each provider are bounded by a `ProviderLimits` shared by
+the whole batch. Resolved books are inserted with
+one transaction per `constants.ISBN_BATCH_INSERT_SIZE` books, and a progress
+event is yielded for every ISBN as soon as its outcome is known.
+"""
+
+from typing import AsyncIterator, Iterable, Optional
+
+import asyncio
+import json
+
+import httpx
+import isbnlib
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
+
+from backend.config import Settings
+from backend.models import BookRecord, BookTable
+from ..internals import constants
+from ..internals.book_notice import ProviderLimits
+from ..internals.cover_store import CoverStore
+from ..internals.isbn_cache import IsbnCacheSettings, cached_isbn2book, prefetch_bnf
+from ..internals.table_management import invalidate_row_count
+
+
+def _insert_books(engine: Engine, books: list[tuple[str, BookRecord]]) -> list[dict]:
+    with Session(engine, expire_on_commit=False) as session:
+        db_books = [BookTable.model_validate(book) for _, book in books]
+        session.add_all(db_books)
+        session.commit()
+        invalidate_row_count(session, BookTable)
+    return [
+        {"isbn": isbn, "status": "created", "id": db_book.id}
+        for (isbn, _), db_book in zip(books, db_books)
+    ]
+
+
+async def _lookup(
+    engine: Engine,
+    isbn: str,
+    settings: Settings,
+    cache_settings: IsbnCacheSettings,
+    limits: ProviderLimits,
+    client: Optional[httpx.AsyncClient],
+    cover_store: Optional[CoverStore],
+    prefetch: asyncio.Task,
+) -> tuple[str, Optional[BookRecord], Optional[str]]:
+    try:
+        # the books found by the batch BnF lookup are then read from the
+        # cache, waited without being cancelled with this lookup
+        await asyncio.wait([prefetch])
+        book = await cached_isbn2book(
+            engine, isbn, settings, cache_settings, limits, client, cover_store
+        )
+        return isbn, book, None
+    except Exception as error:
+        return isbn, None, f"{type(error).__name__}: {error}"
+
+
+async def ingest_isbns(
+    engine: Engine,
+    isbns: Iterable[str],
+    settings: Settings,
+    cache_settings: IsbnCacheSettings,
+    limits: Optional[ProviderLimits] = None,
+    batch_size: int = constants.ISBN_BATCH_INSERT_SIZE,
+    client: Optional[httpx.AsyncClient] = None,
+    cover_store: Optional[CoverStore] = None,
+) -> AsyncIterator[dict]:
+    """Look up and create the books of a list of ISBNs
+
+    Parameters
+    ----------
+    engine:
+        database engine, the books are inserted in their own sessions
+    isbns:
+        ISBN-10 or ISBN-13, with or without dashes
+    cache_settings:
+        settings of the cache of the books found by ISBN
+    limits:
+        concurrency limits per provider, a new one by default
+    client:
+        shared HTTP client of the providers
+    cover_store:
+        store of the cover thumbnails
+
+    Yields
+    ----------
+    progress events, one per ISBN with its status
+    (created, not_found, invalid, duplicate or error), then a summary
+    """
+    if limits is None:
+        limits = ProviderLimits()
+    summary = {
+        status: 0
+        for status in ("created", "not_found", "invalid", "duplicate", "error")
+    }
+
+    def count(event: dict) -> dict:
+        summary[event["status"]] += 1
+        return event
+
+    unique_isbns: dict[str, None] = {}
+    for isbn in isbns:
+        ean13 = isbnlib.ean13(isbn)
+        if not ean13:
+            yield count({"isbn": isbn, "status": "invalid"})
+        elif ean13 in unique_isbns:
+            yield count({"isbn": ean13, "status": "duplicate"})
+        else:
+            unique_isbns[ean13] = None
+
+    ordered_isbns = list(unique_isbns)
+    chunks = [
+        ordered_isbns[start : start + constants.BNF_SRU_BATCH_SIZE]
+        for start in range(0, len(ordered_isbns), constants.BNF_SRU_BATCH_SIZE)
+    ]
+    prefetches = [
+        asyncio.create_task(
+            prefetch_bnf(engine, chunk, cache_settings, limits, client, cover_store)
+        )
+        for chunk in chunks
+    ]
+    tasks = [
+        asyncio.create_task(
+            _lookup(
+                engine,
+                isbn,
+                settings,
+                cache_settings,
+                limits,
+                client,
+                cover_store,
+                prefetch,
+            )
+        )
+        for chunk, prefetch in zip(chunks, prefetches)
+        for isbn in chunk
+    ]
+    pending: list[tuple[str, BookRecord]] = []
+    try:
+        for lookup in asyncio.as_completed(tasks):
+            isbn, book, error = await lookup
+            if error is not None:
+                yield count({"isbn": isbn, "status": "error", "detail": error})
+            elif book is None:
+                yield count({"isbn": isbn, "status": "not_found"})
+            else:
+                pending.append((isbn, book))
+
+            if len(pending) >= batch_size:
+                for event in await run_in_threadpool(_insert_books, engine, pending):
+                    yield count(event)
+                pending = []
+
+        if pending:
+            for event in await run_in_threadpool(_insert_books, engine, pending):
+                yield count(event)
+    finally:
+        # the client went away: stop the lookups that are still running
+        for task in [*prefetches, *tasks]:
+            task.cancel()
+
+    yield {"status": "done", **summary}
+
+
+async def ndjson_events(events: AsyncIterator[dict]) -> AsyncIterator[str]:
+    """Serialize progress events as NDJSON lines"""
+    async for event in events:
+        yield json.dumps(event) + "\n"
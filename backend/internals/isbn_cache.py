@@ -0,0 +1,318 @@
+"""Local cache of the book records found by ISBN
+
+The records returned by `isbn2book`, with their cover URL, are kept in the
+`isbncachetable` table under their EAN-13, so that scanning the same ISBN
+again doesn't query the remote catalogues. ISBNs that no provider found are
+cached too, for a shorter time, unless a provider failed during the lookup.
+The least recently used entries are dropped beyond `max_entries`: the
+cache hits are recorded in memory and written with the next cache write,
+the only one that reads the usage dates.
+
+`prefetch_bnf` fills the cache with the books that a single BnF request
+finds for several ISBNs, before they are looked up one by one.
+"""
+
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+
+import asyncio
+import threading
+
+import httpx
+import isbnlib
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy import and_, delete, func, or_, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from backend.config import Settings
+from backend.models import BookCreate, BookRecord, IsbnCacheTable
+from ..internals.book_notice import (
+    ProviderLimits,
+    _query_provider,
+    isbn2book,
+    isbns2books_bnf,
+)
+from ..internals.cover_store import CoverStore
+from ..internals.table_management import database_key
+
+
+class IsbnCacheSettings(BaseSettings):
+    """Settings of the ISBN cache, read from ISBN_CACHE_* variables"""
+
+    ttl: timedelta = timedelta(days=30)  # of the books found
+    negative_ttl: timedelta = timedelta(days=1)  # of the ISBNs not found
+    max_entries: int = 10_000
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_prefix="isbn_cache_", extra="ignore"
+    )
+
+
+@lru_cache
+def get_isbn_cache_settings():
+    return IsbnCacheSettings()
+
+
+def _now() -> datetime:
+    # naive UTC, as read back from SQLite
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Last cache hit of the EAN-13s, by database, not written yet
+_used_dates: dict[object, dict[str, datetime]] = {}
+_used_dates_lock = threading.Lock()
+
+
+def _record_use(session: Session, isbn: str, now: datetime) -> None:
+    with _used_dates_lock:
+        _used_dates.setdefault(database_key(session.get_bind()), {})[isbn] = now
+
+
+def _write_uses(session: Session) -> None:
+    with _used_dates_lock:
+        used_dates = _used_dates.pop(database_key(session.get_bind()), {})
+    for isbn, used_date in used_dates.items():
+        session.exec(
+            update(IsbnCacheTable)
+            .where(IsbnCacheTable.isbn == isbn)
+            .values(last_used_date=func.max(IsbnCacheTable.last_used_date, used_date))
+        )
+
+
+def read_cache(
+    session: Session, isbn: str, cache_settings: IsbnCacheSettings
+) -> Optional[IsbnCacheTable]:
+    """Get the unexpired cache entry of an EAN-13 and record its use
+
+    Returns
+    ----------
+    IsbnCacheTable, whose book is None for an ISBN not found,
+    or None when the ISBN isn't cached
+    """
+    entry = session.get(IsbnCacheTable, isbn)
+    if entry is None:
+        return None
+
+    now = _now()
+    ttl = cache_settings.ttl if entry.book is not None else cache_settings.negative_ttl
+    if entry.cached_date + ttl <= now:
+        return None
+
+    _record_use(session, isbn, now)
+    return entry
+
+
+def write_cache(
+    session: Session,
+    isbn: str,
+    book: Optional[BookRecord],
+    cache_settings: IsbnCacheSettings,
+) -> None:
+    """Cache the result of the lookup of an EAN-13, None when not found"""
+    now = _now()
+    values = {
+        "isbn": isbn,
+        "book": book.model_dump_json() if book is not None else None,
+        "cached_date": now,
+        "last_used_date": now,
+    }
+    session.exec(
+        insert(IsbnCacheTable)
+        .values(values)
+        .on_conflict_do_update(index_elements=["isbn"], set_=values)
+    )
+
+    # Drop the least recently used entries
+    _write_uses(session)
+    least_recently_used = (
+        select(IsbnCacheTable.isbn)
+        .order_by(IsbnCacheTable.last_used_date.desc())
+        .offset(cache_settings.max_entries)
+    )
+    session.exec(
+        delete(IsbnCacheTable).where(IsbnCacheTable.isbn.in_(least_recently_used))
+    )
+    session.commit()
+
+
+def purge_cache(
+    session: Session, cache_settings: IsbnCacheSettings, expired_only: bool = False
+) -> int:
+    """Delete the cache entries, or only the expired ones
+
+    Returns
+    ----------
+    number of entries deleted
+    """
+    statement = delete(IsbnCacheTable)
+    if expired_only:
+        now = _now()
+        statement = statement.where(
+            or_(
+                and_(
+                    IsbnCacheTable.book.is_not(None),
+                    IsbnCacheTable.cached_date <= now - cache_settings.ttl,
+                ),
+                and_(
+                    IsbnCacheTable.book.is_(None),
+                    IsbnCacheTable.cached_date <= now - cache_settings.negative_ttl,
+                ),
+            )
+        )
+    deleted = session.exec(statement).rowcount
+    session.commit()
+    return deleted
+
+
+def _read(engine: Engine, isbn: str, cache_settings: IsbnCacheSettings):
+    with Session(engine) as session:
+        entry = read_cache(session, isbn, cache_settings)
+        if entry is None:
+            return False, None
+        if entry.book is None:
+            return True, None
+        return True, BookRecord.model_validate_json(entry.book)
+
+
+def _uncached(
+    engine: Engine, isbns: list[str], cache_settings: IsbnCacheSettings
+) -> list[str]:
+    with Session(engine) as session:
+        return [
+            isbn for isbn in isbns if read_cache(session, isbn, cache_settings) is None
+        ]
+
+
+def _write(engine: Engine, isbn: str, book, cache_settings: IsbnCacheSettings):
+    with Session(engine) as session:
+        write_cache(session, isbn, book, cache_settings)
+
+
+def _write_all(
+    engine: Engine, books: dict[str, BookRecord], cache_settings: IsbnCacheSettings
+):
+    with Session(engine) as session:
+        for isbn, book in books.items():
+            write_cache(session, isbn, book, cache_settings)
+
+
+async def _record(
+    book: BookCreate,
+    client: Optional[httpx.AsyncClient],
+    cover_store: Optional[CoverStore],
+) -> BookRecord:
+    """Record of a book found by the providers, with its cover stored"""
+    record = BookRecord.model_validate(book.model_dump(exclude_unset=True))
+    if record.cover is not None and cover_store is not None:
+        record.cover_hash = await cover_store.store(record.cover, client)
+    return record
+
+
+async def cached_isbn2book(
+    engine: Engine,
+    in_isbn: str,
+    settings: Settings,
+    cache_settings: IsbnCacheSettings,
+    limits: Optional[ProviderLimits] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    cover_store: Optional[CoverStore] = None,
+    failures: Optional[list[str]] = None,
+) -> Optional[BookRecord]:
+    """`isbn2book` through the ISBN cache
+
+    The cover of a book found is added to the cover store before the book
+    is cached, so that it is downloaded only once.
+
+    Parameters
+    ----------
+    engine:
+        database engine of the cache table
+    in_isbn:
+        ISBN-10 or ISBN-13 to search
+    settings:
+        Google API keys
+    cache_settings:
+        time to live and size of the cache
+    limits:
+        concurrency limits per provider
+    client:
+        shared HTTP client
+    cover_store:
+        store of the cover thumbnails, the covers are only linked when None
+    failures:
+        names of the record providers that failed are appended to it,
+        a book not found with failures may exist
+
+    Returns
+    ----------
+    BookRecord or None
+    """
+    isbn = isbnlib.ean13(in_isbn)
+    if not isbn:
+        print("Invalid ISBN format")
+        return None
+
+    cached, book = await run_in_threadpool(_read, engine, isbn, cache_settings)
+    if cached:
+        return book
+
+    if failures is None:
+        failures = []
+    book = await isbn2book(isbn, settings, limits, client, failures=failures)
+    if book is not None:
+        book = await _record(book, client, cover_store)
+    if book is not None or not failures:
+        await run_in_threadpool(_write, engine, isbn, book, cache_settings)
+    return book
+
+
+async def prefetch_bnf(
+    engine: Engine,
+    isbns: list[str],
+    cache_settings: IsbnCacheSettings,
+    limits: Optional[ProviderLimits] = None,
+    client: Optional[httpx.AsyncClient] = None,
+    cover_store: Optional[CoverStore] = None,
+) -> list[str]:
+    """Cache the books found by a batch BnF lookup of several ISBNs
+
+    Parameters
+    ----------
+    engine:
+        database engine of the cache table
+    isbns:
+        EAN-13 to search, those already cached are skipped
+    cache_settings:
+        time to live and size of the cache
+    limits:
+        concurrency limits per provider
+    client:
+        shared HTTP client
+    cover_store:
+        store of the cover thumbnails, the covers are only linked when None
+
+    Returns
+    ----------
+    EAN-13 of the books found and cached
+    """
+    uncached = await run_in_threadpool(_uncached, engine, isbns, cache_settings)
+    if len(uncached) < 2:
+        return []
+
+    books = await _query_provider(
+        limits, "bnfbatch", isbns2books_bnf, uncached, client=client
+    )
+    if not books:
+        return []
+
+    records = await asyncio.gather(
+        *(_record(book, client, cover_store) for book in books.values())
+    )
+    await run_in_threadpool(
+        _write_all, engine, dict(zip(books, records)), cache_settings
+    )
+    return list(books)
@@ -0,0 +1,76 @@
+"""Language of a book inferred from the registration group of its ISBN
+
+`isbnlib.info` names the registration group of an ISBN after a language,
+"978-2" is "French language", or after a country. The language of a group
+is looked up once, the first time one of its ISBNs is met, and kept in a
+table of the group prefixes, so that the next ISBNs of the group only read
+the few prefixes of their EAN-13 instead of calling `isbnlib`.
+"""
+
+from functools import cache
+from typing import Optional
+
+import babelfish
+import isbnlib
+
+# Digits of the longest registration group, after the EAN prefix
+GROUP_MAXIMAL_LENGTH = 5
+
+# Alpha-2 code of the language of the registration groups met so far, by
+# the EAN-13 digits of the group, e.g. "9782" for "978-2"
+group_languages: dict[str, Optional[str]] = {}
+
+
+@cache
+def language_index() -> dict[str, str]:
+    """Alpha-2 code of the languages of babelfish, by name
+
+    The first language of a name wins, as with the former scan.
+    """
+    index: dict[str, str] = {}
+    for language in babelfish.LANGUAGE_MATRIX:
+        index.setdefault(language.name, language.alpha2)
+    return index
+
+
+def registration_group(ean: str) -> str:
+    """EAN-13 digits of the registration group of an ISBN
+
+    The group is read from the hyphenation of `isbnlib.mask`, which is empty
+    for an ISBN out of the issued groups.
+    """
+    return "".join(isbnlib.mask(ean).split("-")[:2])
+
+
+def isbn2language(isbn: str) -> Optional[str]:
+    """Alpha-2 code of the language of an ISBN
+
+    Parameters
+    ----------
+    isbn : str
+        ISBN-10 or ISBN-13
+
+    Returns
+    -------
+    str or None
+        None when the group of the ISBN isn't named after a language
+
+    Raises
+    ------
+    isbnlib.NotValidISBNError when the ISBN isn't valid
+    """
+    ean = isbnlib.EAN13(isbn)
+    if not ean:
+        raise isbnlib.NotValidISBNError(isbn)
+
+    # the registration groups are prefix free
+    for length in range(4, 4 + GROUP_MAXIMAL_LENGTH):
+        if ean[:length] in group_languages:
+            return group_languages[ean[:length]]
+
+    words = isbnlib.info(ean).split()
+    language = language_index().get(words[0]) if words else None
+    group = registration_group(ean)
+    if group:
+        group_languages[group] = language
+    return language
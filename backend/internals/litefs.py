@@ -0,0 +1,247 @@
+"""Routing of the requests between the LiteFS primary and its replicas
+
+LiteFS replicates the database of the primary node to read-only replicas.
+On a replica, its mount directory holds a `.primary` file naming the
+primary, and `<database>-pos` holds the position of the replicated
+database: the ID of its last transaction and a checksum.
+
+The `LiteFSMiddleware` lets the replicas serve the reads:
+
+- a write request reaching a replica is answered with a `fly-replay`
+  header, the Fly proxy then replays it on the primary; or it is proxied
+  to the primary, e.g. in tests or outside Fly
+- a write answered by the primary sets a `__txid` cookie with the
+  position of the database after it; a replica receiving a read with this
+  cookie waits at most `constants.LITEFS_CATCH_UP_TIMEOUT` seconds to reach
+  that transaction, so that a client reads its own writes
+- a streamed write, e.g. `POST /books/isbn/batch`, goes on writing after
+  its headers are sent: its cookie sends the reads of the client to the
+  primary, which sets the position of the database once no streamed write
+  is running anymore
+
+The database file is the `DATABASE_NAME` file of the mount directory.
+"""
+
+from enum import Enum
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import asyncio
+import time
+
+import httpx
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from backend.database import get_database_settings
+from ..internals import constants
+
+TXID_COOKIE = "__txid"  # as the LiteFS proxy
+# __txid of the clients whose reads are answered by the primary
+PRIMARY_TXID = "primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# not forwarded by the proxy
+HOP_BY_HOP_HEADERS = (
+    "connection",
+    "content-encoding",
+    "content-length",
+    "host",
+    "keep-alive",
+    "transfer-encoding",
+)
+
+
+class WriteForwarding(str, Enum):
+    replay = "replay"  # fly-replay header, replayed by the Fly proxy
+    proxy = "proxy"  # proxied to primary_url
+
+
+class LiteFSSettings(BaseSettings):
+    """Settings of the LiteFS routing, read from LITEFS_* variables"""
+
+    enabled: bool = False
+    mount_dir: Path = Path("/litefs")  # fuse.dir of litefs.yml
+    forwarding: WriteForwarding = WriteForwarding.replay
+    # URL of the primary for the proxy, "{primary}" is replaced by its name
+    primary_url: str = "http://{primary}:8000"
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_prefix="litefs_", extra="ignore"
+    )
+
+
+@lru_cache
+def get_litefs_settings():
+    return LiteFSSettings()
+
+
+def read_primary(settings: LiteFSSettings) -> Optional[str]:
+    """Name of the primary node, None on the primary itself"""
+    try:
+        return (settings.mount_dir / ".primary").read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def is_primary(settings: LiteFSSettings) -> bool:
+    """Whether the database can be written from this node"""
+    return not settings.enabled or read_primary(settings) is None
+
+
+def read_txid(settings: LiteFSSettings) -> int:
+    """ID of the last transaction of the database on this node, 0 when unknown"""
+    database = Path(get_database_settings().name).name
+    try:
+        position = (settings.mount_dir / f"{database}-pos").read_text()
+        return int(position.split("/")[0], 16)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+async def wait_for_txid(settings: LiteFSSettings, txid: int) -> bool:
+    """Wait for the replication of a transaction
+
+    Returns
+    ----------
+    False when it wasn't replicated within constants.LITEFS_CATCH_UP_TIMEOUT
+    """
+    deadline = time.monotonic() + constants.LITEFS_CATCH_UP_TIMEOUT
+    while read_txid(settings) < txid:
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(constants.LITEFS_CATCH_UP_INTERVAL)
+    return True
+
+
+class StreamedWriteResponse(StreamingResponse):
+    """Streamed response of a write, counted in the streamed writes of the
+    middleware until it is sent or its client disconnects
+
+    Parameters
+    ----------
+    response:
+        response of the write, its body is not read yet
+    middleware
+    """
+
+    def __init__(self, response: Response, middleware: "LiteFSMiddleware"):
+        super().__init__(
+            response.body_iterator,
+            status_code=response.status_code,
+            background=response.background,
+        )
+        self.raw_headers = response.raw_headers
+        self.middleware = middleware
+        middleware.streamed_writes += 1
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.middleware.streamed_writes -= 1
+
+
+class LiteFSMiddleware(BaseHTTPMiddleware):
+    """Forward the writes to the primary and wait for them on the replicas
+
+    Parameters
+    ----------
+    app
+    settings:
+        the requests are passed through when not enabled
+    client:
+        HTTP client of the proxied writes, created when needed
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        settings: LiteFSSettings,
+        client: Optional[httpx.AsyncClient] = None,
+    ):
+        super().__init__(app)
+        self.settings = settings
+        self.client = client
+        self.streamed_writes = 0  # running on the primary
+
+    async def dispatch(
+        self, request: Request, call_next: RequestResponseEndpoint
+    ) -> Response:
+        if not self.settings.enabled:
+            return await call_next(request)
+
+        primary = read_primary(self.settings)
+        if request.method in SAFE_METHODS:
+            txid = request.cookies.get(TXID_COOKIE)
+            if primary is not None and txid == PRIMARY_TXID:
+                return await self.forward(request, primary)
+            if primary is not None and txid is not None:
+                try:
+                    await wait_for_txid(self.settings, int(txid, 16))
+                except ValueError:
+                    pass
+            response = await call_next(request)
+            if primary is None and txid == PRIMARY_TXID and not self.streamed_writes:
+                self.set_txid_cookie(response)
+            return response
+
+        if primary is not None:
+            return await self.forward(request, primary)
+
+        response = await call_next(request)
+        # without body, or sent at once after its writes
+        if response.status_code in (204, 304) or "content-length" in response.headers:
+            self.set_txid_cookie(response)
+        else:
+            # streamed, written until the end of its body
+            response = StreamedWriteResponse(response, self)
+            response.set_cookie(
+                TXID_COOKIE,
+                PRIMARY_TXID,
+                max_age=constants.LITEFS_STREAMED_WRITE_MAX_AGE,
+                httponly=True,
+            )
+        return response
+
+    def set_txid_cookie(self, response: Response) -> None:
+        """Cookie of the position of the database after the writes of a client"""
+        response.set_cookie(
+            TXID_COOKIE,
+            f"{read_txid(self.settings):016x}",
+            max_age=constants.LITEFS_TXID_COOKIE_MAX_AGE,
+            httponly=True,
+        )
+
+    async def forward(self, request: Request, primary: str) -> Response:
+        """Write request answered by the primary"""
+        if self.settings.forwarding == WriteForwarding.replay:
+            return JSONResponse(
+                {"detail": f"Replayed on the primary {primary}"},
+                status_code=409,
+                headers={"fly-replay": f"instance={primary}"},
+            )
+
+        if self.client is None:
+            self.client = httpx.AsyncClient(timeout=constants.LITEFS_PROXY_TIMEOUT)
+        url = self.settings.primary_url.format(primary=primary)
+        response = await self.client.request(
+            request.method,
+            url + request.url.path,
+            params=request.query_params,
+            headers=[
+                (name, value)
+                for name, value in request.headers.items()
+                if name not in HOP_BY_HOP_HEADERS
+            ],
+            content=await request.body(),
+        )
+        proxied = Response(response.content, status_code=response.status_code)
+        # repeated headers kept, e.g. the set-cookie of the __txid
+        for name, value in response.headers.multi_items():
+            if name not in HOP_BY_HOP_HEADERS:
+                proxied.headers.append(name, value)
+        return proxied
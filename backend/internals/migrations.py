@@ -0,0 +1,172 @@
+"""Versioned migrations of the database schema
+
+The version of the schema of a database is stored in its header, in
+`PRAGMA user_version`: the number of `MIGRATIONS` applied to it. At
+startup, `migrate` reads it, a single query when the schema is up to date,
+and applies the missing migrations, each in its own transaction with the
+version it leads to.
+
+The first migrations catch up the tables created before the migrations,
+then create the missing tables of the models, so that a new database
+starts with the current schema. The later migrations are run on the new
+databases too: they must be idempotent, e.g. with
+`CREATE INDEX IF NOT EXISTS`. An index is built while readers of the WAL
+journal go on reading, the writers wait for its transaction.
+
+To change the schema, append a migration, never edit an applied one. The
+databases past the first migration only get the new columns of the models
+through the migrations appended for them.
+"""
+
+from typing import Callable
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Connection, Engine
+from sqlmodel import SQLModel
+
+from ..internals import book_search  # noqa: F401, creates the FTS index
+from ..internals.table_management import normalize_string
+
+
+# Columns and indexes added to the tables of the models before the
+# migrations, as they were then
+_ADDED_COLUMNS = [
+    ("booktable", "title_normalized VARCHAR"),
+    ("booktable", "author_normalized VARCHAR"),
+    ("booktable", "cover_hash VARCHAR"),
+    ("membertable", "firstname_normalized VARCHAR"),
+    ("membertable", "surname_normalized VARCHAR"),
+]
+_ADDED_INDEXES = [
+    ("booktable", "ix_booktable_title_normalized", "title_normalized"),
+    ("booktable", "ix_booktable_author_normalized", "author_normalized"),
+    ("booktable", "ix_booktable_cover_hash", "cover_hash"),
+    (
+        "booktable",
+        "ix_booktable_archived_available_title",
+        "archived, available, title",
+    ),
+    (
+        "booktable",
+        "ix_booktable_category_type_category_age",
+        "category_type, category_age",
+    ),
+    ("membertable", "ix_membertable_firstname_normalized", "firstname_normalized"),
+    ("membertable", "ix_membertable_surname_normalized", "surname_normalized"),
+    ("membertable", "ix_membertable_family_id", "family_id"),
+    ("circulationtable", "ix_circulationtable_borrowed_date", "borrowed_date"),
+    ("circulationtable", "ix_circulationtable_book_id", "book_id"),
+    ("circulationtable", "ix_circulationtable_member_id", "member_id"),
+]
+_NORMALIZED_COLUMNS = {
+    "booktable": {"title": "title_normalized", "author": "author_normalized"},
+    "membertable": {
+        "firstname": "firstname_normalized",
+        "surname": "surname_normalized",
+    },
+}
+
+
+def add_missing_columns(connection: Connection) -> None:
+    """Columns and indexes missing from the tables created before the
+    migrations, the normalized search columns are filled in
+
+    Only adds those of `_ADDED_COLUMNS` and `_ADDED_INDEXES`, a column
+    added to a model later needs its own migration.
+    """
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    for table, column in _ADDED_COLUMNS:
+        if table not in existing:
+            continue
+        names = {info["name"] for info in inspector.get_columns(table)}
+        if column.split()[0] not in names:
+            connection.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column}")
+    for table, name, columns in _ADDED_INDEXES:
+        if table in existing:
+            connection.exec_driver_sql(
+                f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"
+            )
+
+    for table, columns in _NORMALIZED_COLUMNS.items():
+        if table not in existing:
+            continue
+        rows = connection.exec_driver_sql(
+            f"SELECT id, {', '.join(columns)} FROM {table}"
+            f" WHERE {' OR '.join(f'{name} IS NULL' for name in columns.values())}"
+        ).all()
+        assignments = ", ".join(f"{name} = ?" for name in columns.values())
+        for row_id, *values in rows:
+            normalized = [
+                normalize_string(value) if value is not None else None
+                for value in values
+            ]
+            connection.exec_driver_sql(
+                f"UPDATE {table} SET {assignments} WHERE id = ?",
+                (*normalized, row_id),
+            )
+
+
+def create_tables(connection: Connection) -> None:
+    """Tables of the models, with their indexes and the FTS index of the books"""
+    SQLModel.metadata.create_all(connection)
+
+
+def index_unfinished_enrichment_jobs(connection: Connection) -> None:
+    """Partial index of the jobs queued again at startup"""
+    connection.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_enrichmentjobtable_unfinished"
+        " ON enrichmentjobtable (id) WHERE status IN ('pending', 'running')"
+    )
+
+
+# Version n of the schema is reached by the n first migrations
+MIGRATIONS: list[Callable[[Connection], None]] = [
+    add_missing_columns,
+    create_tables,
+    index_unfinished_enrichment_jobs,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version(connection: Connection) -> int:
+    """Version of the schema of a database, 0 before its first migration"""
+    return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine: Engine) -> list[str]:
+    """Apply the migrations missing from a database
+
+    Returns
+    ----------
+    names of the migrations applied
+    """
+    with engine.connect() as connection:
+        version = schema_version(connection)
+    if version == SCHEMA_VERSION:
+        return []
+    if version > SCHEMA_VERSION:
+        # e.g. a release rolled back, its migrations are kept
+        print(f"Migrations: schema version {version} after {SCHEMA_VERSION}")
+        return []
+
+    applied = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        while True:
+            # write lock taken before reading the version, against the
+            # migrations of another process
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+            try:
+                version = schema_version(connection)
+                if version >= SCHEMA_VERSION:
+                    connection.exec_driver_sql("COMMIT")
+                    return applied
+                migration = MIGRATIONS[version]
+                migration(connection)
+                connection.exec_driver_sql(f"PRAGMA user_version = {version + 1}")
+                connection.exec_driver_sql("COMMIT")
+            except Exception:
+                connection.exec_driver_sql("ROLLBACK")
+                raise
+            applied.append(migration.__name__)
+            print(f"Migrations: {migration.__name__}, schema version {version + 1}")
@@ -0,0 +1,230 @@
+"""Health of the book metadata providers
+
+Every provider lookup is recorded with its latency and outcome. After
+`constants.CIRCUIT_FAILURE_THRESHOLD` failures in a row the circuit breaker
+of the provider opens: the provider is skipped by `isbn2book` until
+`constants.CIRCUIT_RESET_TIMEOUT` seconds have passed, then a single trial
+lookup decides whether it is closed again.
+
+The requests sent to each host also take a token from the token bucket of
+the host. The rate of a bucket is halved when the host answers 429 or 503,
+and recovers slowly while it answers normally, so that a bulk scan session
+doesn't get the application blocked.
+"""
+
+from collections import deque
+from typing import Optional
+
+import asyncio
+import statistics
+import time
+
+from backend.models import HostRatePublic, ProviderHealthPublic, ProvidersHealth
+from ..internals import constants
+
+# Requests per second allowed by default to each host, and to some hosts
+DEFAULT_HOST_RATE = 5.0
+HOST_RATES: dict[str, float] = {
+    "openlibrary.org": 2.0,
+    "covers.openlibrary.org": 2.0,
+    "cap.banq.qc.ca": 1.0,
+}
+
+
+class CircuitBreaker:
+    """Closed, open or half open state of a provider"""
+
+    def __init__(
+        self,
+        failure_threshold: int = constants.CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout: float = constants.CIRCUIT_RESET_TIMEOUT,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        """Whether a lookup can be sent, only one at a time when half open"""
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_running:
+            self.trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.trial_running or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+        self.trial_running = False
+
+    def record_cancel(self) -> None:
+        # the trial lookup was cancelled before it answered
+        self.trial_running = False
+
+
+class ProviderStats:
+    """Latency and outcome of the last lookups of a provider"""
+
+    def __init__(self, window: int = constants.PROVIDER_STATS_WINDOW):
+        self.lookups = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_error: Optional[str] = None
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.outcomes: deque[bool] = deque(maxlen=window)  # True when failed
+
+    def record(self, latency: float, error: Optional[str] = None) -> None:
+        self.lookups += 1
+        self.latencies.append(latency)
+        self.outcomes.append(error is not None)
+        if error is not None:
+            self.failures += 1
+            self.last_error = error
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(self.outcomes) / len(self.outcomes)
+
+    def latency_ms(self, quantile: int) -> Optional[float]:
+        """Latency percentile of the last lookups, in milliseconds"""
+        if len(self.latencies) < 2:
+            return self.latencies[0] * 1000 if self.latencies else None
+        return statistics.quantiles(self.latencies, n=100)[quantile - 1] * 1000
+
+
+class TokenBucket:
+    """Adaptive token bucket bounding the request rate to a host"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.maximal_rate = rate
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        """Wait for a token"""
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def slow_down(self) -> None:
+        """The host asked to slow down: halve the rate"""
+        self.rate = max(self.maximal_rate / 16, self.rate / 2)
+        self.tokens = min(self.tokens, 0.0)
+
+    def speed_up(self) -> None:
+        """The host answered normally: recover a part of the rate"""
+        self.rate = min(self.maximal_rate, self.rate + self.maximal_rate / 20)
+
+
+class ProviderHealth:
+    """Circuit breakers and statistics of the providers, token buckets of the hosts"""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.stats: dict[str, ProviderStats] = {}
+        self.buckets: dict[str, TokenBucket] = {}
+
+    def breaker(self, provider: str) -> CircuitBreaker:
+        if provider not in self.breakers:
+            self.breakers[provider] = CircuitBreaker()
+        return self.breakers[provider]
+
+    def provider_stats(self, provider: str) -> ProviderStats:
+        if provider not in self.stats:
+            self.stats[provider] = ProviderStats()
+        return self.stats[provider]
+
+    def allow(self, provider: str) -> bool:
+        """Whether the circuit of a provider lets a lookup through"""
+        if self.breaker(provider).allow():
+            return True
+        self.provider_stats(provider).skipped += 1
+        return False
+
+    def record(self, provider: str, latency: float, error: Optional[str]) -> None:
+        """Record a lookup, `error` is None when the provider answered"""
+        self.provider_stats(provider).record(latency, error)
+        if error is None:
+            self.breaker(provider).record_success()
+        else:
+            self.breaker(provider).record_failure()
+
+    def record_cancel(self, provider: str) -> None:
+        self.breaker(provider).record_cancel()
+
+    def bucket(self, host: str) -> TokenBucket:
+        if host not in self.buckets:
+            self.buckets[host] = TokenBucket(HOST_RATES.get(host, DEFAULT_HOST_RATE))
+        return self.buckets[host]
+
+    async def acquire(self, host: str) -> None:
+        """Wait until a request can be sent to a host"""
+        await self.bucket(host).acquire()
+
+    def record_response(self, host: str, status_code: int) -> None:
+        if status_code in (429, 503):
+            self.bucket(host).slow_down()
+        else:
+            self.bucket(host).speed_up()
+
+    def snapshot(self) -> ProvidersHealth:
+        providers = [
+            ProviderHealthPublic(
+                provider=provider,
+                state=self.breaker(provider).state,
+                lookups=stats.lookups,
+                failures=stats.failures,
+                skipped=stats.skipped,
+                error_rate=stats.error_rate,
+                latency_p50_ms=stats.latency_ms(50),
+                latency_p95_ms=stats.latency_ms(95),
+                last_error=stats.last_error,
+            )
+            for provider, stats in sorted(self.stats.items())
+        ]
+        hosts = [
+            HostRatePublic(
+                host=host,
+                rate=bucket.rate,
+                maximal_rate=bucket.maximal_rate,
+                tokens=bucket.tokens,
+            )
+            for host, bucket in sorted(self.buckets.items())
+        ]
+        return ProvidersHealth(providers=providers, hosts=hosts)
+
+
+provider_health = ProviderHealth()
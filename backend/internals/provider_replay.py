@@ -0,0 +1,194 @@
+"""Replay of recorded metadata provider responses
+
+`RecordingTransport` keeps the responses of the provider hosts in a
+`Recording`, saved as JSON. `ReplayTransport` answers the requests of an
+`httpx.AsyncClient` with the recorded responses, so that the lookups of
+`book_notice` run offline and reproducibly, in the unit tests and the
+benchmarks. Each host can be given a simulated latency and a rate of
+injected failures: connection errors, timeouts or 503 answers.
+
+Responses are matched by method and URL. A request that wasn't recorded
+is answered 404 and kept in `ReplayTransport.unrecorded`.
+"""
+
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+import asyncio
+import base64
+import json
+import random
+
+import httpx
+
+# Headers of the recorded responses replayed, the body is stored decoded
+RECORDED_HEADERS = ["content-type", "location"]
+FAILURES = ["error", "timeout", "status"]
+
+
+class Recording:
+    """Recorded responses, by method and URL"""
+
+    def __init__(self, responses: Optional[list[dict]] = None):
+        self.responses: dict[str, dict] = {}
+        for response in responses or []:
+            self.responses[self.key(response["method"], response["url"])] = response
+
+    @staticmethod
+    def key(method: str, url: str) -> str:
+        return f"{method} {url}"
+
+    @classmethod
+    def load(cls, path: Path) -> "Recording":
+        return cls(json.loads(Path(path).read_text()))
+
+    def save(self, path: Path) -> None:
+        Path(path).write_text(
+            json.dumps(list(self.responses.values()), indent=1, ensure_ascii=False)
+            + "\n"
+        )
+
+    def add(self, request: httpx.Request, response: httpx.Response) -> None:
+        """Record a response, whose content must have been read"""
+        recorded = {
+            "method": request.method,
+            "url": str(request.url),
+            "status": response.status_code,
+            "headers": {
+                name: response.headers[name]
+                for name in RECORDED_HEADERS
+                if name in response.headers
+            },
+        }
+        try:
+            recorded["text"] = response.content.decode()
+        except UnicodeDecodeError:
+            recorded["base64"] = base64.b64encode(response.content).decode()
+        self.responses[self.key(request.method, str(request.url))] = recorded
+
+    def response(self, request: httpx.Request) -> Optional[httpx.Response]:
+        """Recorded response of a request, None when it wasn't recorded"""
+        recorded = self.responses.get(self.key(request.method, str(request.url)))
+        if recorded is None:
+            return None
+        if "text" in recorded:
+            content = recorded["text"].encode()
+        else:
+            content = base64.b64decode(recorded["base64"])
+        return httpx.Response(
+            recorded["status"], headers=recorded["headers"], content=content
+        )
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Transport adding the responses of another transport to a recording"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, recording: Recording):
+        self._transport = transport
+        self.recording = recording
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await self._transport.handle_async_request(request)
+        content = b"".join([chunk async for chunk in response.stream])
+        await response.aclose()
+        response = httpx.Response(
+            response.status_code,
+            headers=[
+                (name, value)
+                for name, value in response.headers.multi_items()
+                if name.lower() not in ("content-encoding", "transfer-encoding")
+            ],
+            content=content,
+        )
+        self.recording.add(request, response)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class HostBehaviour:
+    """Simulated latency and failures of a host
+
+    Parameters
+    ----------
+    latency:
+        seconds before the host answers
+    jitter:
+        random extra seconds, up to `jitter`, added to the latency
+    failure_rate:
+        share of the requests failing
+    failure:
+        "error" for a connection error, "timeout" for a read timeout after
+        the latency, "status" for a 503 answer
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        failure: str = "error",
+    ):
+        if failure not in FAILURES:
+            raise ValueError(f"failure must be one of {FAILURES}")
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.failure = failure
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Transport answering with recorded responses
+
+    Parameters
+    ----------
+    recording:
+        responses to replay
+    hosts:
+        behaviour of some hosts
+    default:
+        behaviour of the other hosts, answering at once when None
+    seed:
+        seed of the latency jitter and failures
+    """
+
+    def __init__(
+        self,
+        recording: Recording,
+        hosts: Optional[dict[str, HostBehaviour]] = None,
+        default: Optional[HostBehaviour] = None,
+        seed: int = 0,
+    ):
+        self.recording = recording
+        self.hosts = hosts or {}
+        self.default = default or HostBehaviour()
+        self._random = random.Random(seed)
+        self.requests: Counter[str] = Counter()
+        self.failures: Counter[str] = Counter()
+        self.unrecorded: list[str] = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        behaviour = self.hosts.get(host, self.default)
+        self.requests[host] += 1
+        failed = self._random.random() < behaviour.failure_rate
+        latency = behaviour.latency + self._random.uniform(0, behaviour.jitter)
+
+        if failed and behaviour.failure == "error":
+            self.failures[host] += 1
+            raise httpx.ConnectError("injected connection error", request=request)
+        if latency > 0:
+            await asyncio.sleep(latency)
+        if failed:
+            self.failures[host] += 1
+            if behaviour.failure == "timeout":
+                raise httpx.ReadTimeout("injected read timeout", request=request)
+            return httpx.Response(503, text="injected failure")
+
+        response = self.recording.response(request)
+        if response is None:
+            self.unrecorded.append(Recording.key(request.method, str(request.url)))
+            return httpx.Response(404, text="not recorded")
+        return response
@@ -0,0 +1,211 @@
+"""Order of the book metadata providers, learned per ISBN range
+
+The providers don't cover the same books: BnF finds the 978-2 French titles,
+Google Books the English ones, BAnQ the Quebec publishers. Every provider
+lookup is recorded, found or not and with its latency, under the ISBN
+ranges of the book as given by `isbnlib.mask`:
+
+    978-2-89540-324-1 -> "978-2-89", "978-2"
+
+that is the registration group, and the group with the first two digits of
+the registrant, which tells the Quebec publishers apart from the French
+ones. The lookups of an ISBN use the statistics of the narrowest range that
+has seen `constants.PROVIDER_SCHEDULER_MIN_LOOKUPS` lookups, and keep the
+default order of `BOOK_PROVIDERS` before that.
+
+The providers are still queried at once, but the records are taken in the
+learned order, so that a lookup doesn't wait for a provider that rarely
+finds the range. Providers below `constants.PROVIDER_SCHEDULER_DEFER_HIT_RATE`
+are only queried when the others found nothing. The statistics are saved in
+the `providerstatstable` table and loaded at startup.
+"""
+
+from typing import Optional, Sequence, TypeVar
+
+import math
+
+import isbnlib
+from sqlmodel import Session, select
+
+from backend.models import ProviderStatsTable
+from ..internals import constants
+
+# Weight of a new latency in the moving average
+LATENCY_SMOOTHING = 0.2
+
+T = TypeVar("T")
+
+
+def isbn_ranges(isbn: str) -> list[str]:
+    """ISBN ranges of an EAN-13, from the narrowest
+
+    Returns
+    ----------
+    [group and registrant prefix, group], or only the EAN prefix when
+    `isbnlib` doesn't know the range of the ISBN
+    """
+    try:
+        parts = isbnlib.mask(isbn).split("-")
+    except isbnlib.NotValidISBNError:
+        parts = []
+    if len(parts) < 4:
+        return [isbn[:3]]
+    group = f"{parts[0]}-{parts[1]}"
+    return [f"{group}-{parts[2][:2]}", group]
+
+
+class RangeStats:
+    """Lookups of a provider for an ISBN range"""
+
+    def __init__(
+        self,
+        lookups: int = 0,
+        hits: int = 0,
+        failures: int = 0,
+        latency_ms: Optional[float] = None,
+    ):
+        self.lookups = lookups
+        self.hits = hits
+        self.failures = failures
+        self.latency_ms = latency_ms
+
+    def record(self, latency: float, found: bool, failed: bool) -> None:
+        self.lookups += 1
+        self.hits += found
+        self.failures += failed
+        latency_ms = latency * 1000
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += LATENCY_SMOOTHING * (latency_ms - self.latency_ms)
+
+    @property
+    def hit_rate(self) -> float:
+        # one hit out of two lookups as a prior, for the ranges barely seen
+        return (self.hits + 1) / (self.lookups + 2)
+
+
+class ProviderScheduler:
+    """Statistics of the providers per ISBN range and the order they give"""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.stats: dict[tuple[str, str], RangeStats] = {}
+        # lookups of the ISBN range by its most queried provider
+        self.range_lookups: dict[str, int] = {}
+        self.unsaved = False
+
+    def range_stats(self, isbn_range: str, provider: str) -> RangeStats:
+        key = (isbn_range, provider)
+        if key not in self.stats:
+            self.stats[key] = RangeStats()
+        return self.stats[key]
+
+    def record(
+        self,
+        isbn: str,
+        provider: str,
+        latency: float,
+        found: bool,
+        failed: bool = False,
+    ) -> None:
+        """Record a lookup of an EAN-13 by a provider"""
+        for isbn_range in isbn_ranges(isbn):
+            stats = self.range_stats(isbn_range, provider)
+            stats.record(latency, found, failed)
+            self.range_lookups[isbn_range] = max(
+                self.range_lookups.get(isbn_range, 0), stats.lookups
+            )
+        self.unsaved = True
+
+    def _trusted_range(self, isbn: str) -> Optional[str]:
+        for isbn_range in isbn_ranges(isbn):
+            lookups = self.range_lookups.get(isbn_range, 0)
+            if lookups >= constants.PROVIDER_SCHEDULER_MIN_LOOKUPS:
+                return isbn_range
+        return None
+
+    def order(
+        self, isbn: str, providers: Sequence[tuple[str, T]]
+    ) -> tuple[list[tuple[str, T]], list[tuple[str, T]]]:
+        """Order the providers of a lookup
+
+        Parameters
+        ----------
+        isbn:
+            EAN-13 searched
+        providers:
+            (name, lookup) pairs in their default order
+
+        Returns
+        ----------
+        (providers to query at once by priority, providers to query after)
+        """
+        isbn_range = self._trusted_range(isbn)
+        if isbn_range is None:
+            return list(providers), []
+
+        def key(item: tuple[int, tuple[str, T]]):
+            index, (name, _) = item
+            stats = self.stats.get((isbn_range, name), RangeStats())
+            latency = stats.latency_ms if stats.latency_ms is not None else math.inf
+            # hit rates within 10 % are tied, the faster provider goes first
+            return (-round(stats.hit_rate, 1), latency, index)
+
+        ordered = [provider for _, provider in sorted(enumerate(providers), key=key)]
+        now, deferred = [], []
+        for name, lookup in ordered:
+            stats = self.stats.get((isbn_range, name))
+            if (
+                stats is not None
+                and stats.lookups >= constants.PROVIDER_SCHEDULER_MIN_LOOKUPS
+                and stats.hit_rate < constants.PROVIDER_SCHEDULER_DEFER_HIT_RATE
+            ):
+                deferred.append((name, lookup))
+            else:
+                now.append((name, lookup))
+        if not now:
+            return deferred, []
+        return now, deferred
+
+    def load(self, session: Session) -> None:
+        """Load the statistics saved in the database"""
+        self.reset()
+        for row in session.exec(select(ProviderStatsTable)):
+            self.stats[(row.isbn_range, row.provider)] = RangeStats(
+                row.lookups, row.hits, row.failures, row.latency_ms
+            )
+            self.range_lookups[row.isbn_range] = max(
+                self.range_lookups.get(row.isbn_range, 0), row.lookups
+            )
+
+    def save(self, session: Session) -> None:
+        """Save the statistics in the database"""
+        if not self.unsaved:
+            return
+        # run in a worker thread: the lookups recorded meanwhile are saved
+        # the next time
+        self.unsaved = False
+        rows = [
+            ProviderStatsTable(
+                isbn_range=isbn_range,
+                provider=provider,
+                lookups=stats.lookups,
+                hits=stats.hits,
+                failures=stats.failures,
+                latency_ms=stats.latency_ms,
+            )
+            for (isbn_range, provider), stats in list(self.stats.items())
+        ]
+        try:
+            for row in rows:
+                session.merge(row)
+            session.commit()
+        except Exception:
+            self.unsaved = True
+            raise
+
+
+provider_scheduler = ProviderScheduler()
@@ -0,0 +1,144 @@
+"""Sort and filter query language of the list APIs
+
+`?sort=+title,-author` sorts on one or more fields, `+` (or no sign) for
+ascending and `-` for descending. `?filter[archived]=false` keeps the rows
+whose field equals the value, a repeated filter keeps the rows equal to
+any of its values.
+
+Only indexed columns are accepted by default, so that a client can't make
+the database sort or scan a whole table without an index.
+"""
+
+from datetime import date
+from typing import Iterable, Optional
+
+import re
+
+from fastapi import HTTPException
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlmodel import SQLModel
+from starlette.datastructures import QueryParams
+
+from ..internals import constants
+from ..internals.table_management import (
+    NORMALIZED_COLUMNS,
+    SortColumn,
+    column_python_type,
+)
+
+FILTER_PARAMETER = re.compile(r"^filter\[(\w+)\]$")
+
+BOOLEAN_VALUES = {"true": True, "1": True, "false": False, "0": False}
+
+
+def indexed_columns(table: type[SQLModel]) -> dict[str, InstrumentedAttribute]:
+    """Public columns of a table leading an index, by name"""
+    names = {column.name for column in table.__table__.primary_key.columns}
+    for index in table.__table__.indexes:
+        names.add(index.columns[0].name)
+    names -= set(NORMALIZED_COLUMNS.get(table, {}).values())
+    return {name: getattr(table, name) for name in sorted(names)}
+
+
+def _column(
+    columns: dict[str, InstrumentedAttribute], name: str, kind: str
+) -> InstrumentedAttribute:
+    if name not in columns:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid {kind} field: {name}, expected one of {', '.join(columns)}",
+        )
+    return columns[name]
+
+
+def parse_sort(
+    sort: Optional[str], columns: dict[str, InstrumentedAttribute]
+) -> list[SortColumn]:
+    """Parse a sort parameter, e.g. "+title,-author"
+
+    A "+" sent unencoded in the query string is decoded as a space, which is
+    read as "+" too.
+    """
+    if not sort:
+        return []
+
+    sort_columns = []
+    for field in sort.split(","):
+        descending = field.startswith("-")
+        name = field.lstrip(" +-")
+        sort_columns.append((_column(columns, name, "sort"), descending))
+    return sort_columns
+
+
+def _parse_value(column: InstrumentedAttribute, name: str, value: str):
+    python_type = column_python_type(column)
+    try:
+        if python_type is bool:
+            return BOOLEAN_VALUES[value.lower()]
+        if python_type is date:
+            return date.fromisoformat(value)
+        return python_type(value)
+    except (KeyError, ValueError):
+        raise HTTPException(
+            status_code=400, detail=f"Invalid filter value for {name}: {value}"
+        )
+
+
+def parse_filters(
+    query_params: QueryParams, columns: dict[str, InstrumentedAttribute]
+) -> list:
+    """Parse the filter[<field>]=<value> parameters into where clauses"""
+    clauses = []
+    for parameter in dict.fromkeys(query_params.keys()):
+        match = FILTER_PARAMETER.match(parameter)
+        if match is None:
+            continue
+        name = match.group(1)
+        column = _column(columns, name, "filter")
+        values = [
+            _parse_value(column, name, value)
+            for value in query_params.getlist(parameter)
+        ]
+        clauses.append(column == values[0] if len(values) == 1 else column.in_(values))
+    return clauses
+
+
+def compile_query(
+    statement: constants.STATEMENT_TYPE,
+    table: type[SQLModel],
+    sort: Optional[str],
+    query_params: QueryParams,
+    allowed_columns: Optional[Iterable[str]] = None,
+) -> tuple[constants.STATEMENT_TYPE, list[SortColumn]]:
+    """Apply the sort and filter parameters of a request to a statement
+
+    Parameters
+    ----------
+    statement:
+        result of SQLModel select
+        ex: statement = select(Book)
+    table
+    sort:
+        sort query parameter
+    query_params:
+        request query parameters, holding the filter[<field>] parameters
+    allowed_columns:
+        names of the columns that can be sorted and filtered,
+        the indexed columns of the table by default
+
+    Returns
+    ----------
+    (filtered statement, sort columns to give to paginate)
+
+    Raises
+    ----------
+    HTTPException 400 for a field that can't be used or an invalid value
+    """
+    if allowed_columns is None:
+        columns = indexed_columns(table)
+    else:
+        columns = {name: getattr(table, name) for name in allowed_columns}
+
+    for clause in parse_filters(query_params, columns):
+        statement = statement.where(clause)
+    return statement, parse_sort(sort, columns)
@@ -0,0 +1,182 @@
+"""Book fields of the Sudoc RDF/XML records
+
+The records of `https://www.sudoc.fr/<ppn>.rdf` were parsed by an rdflib
+graph and queried with SPARQL for six values. `extract_sudoc_fields` reads
+them in one streaming pass of `xml.etree.ElementTree.iterparse` instead:
+the properties of the `bibo:Book` resources, whether typed by their element
+or by `rdf:type`, are collected and the elements are released as soon as
+they are read.
+
+It only reads the plain RDF/XML written by Sudoc. Any construct it doesn't
+handle in the book fields, such as typed or XML literals, relative or blank
+book identifiers, or a field given twice, raises `UnsupportedRdf`, and
+`sudoc_fields` falls back to the rdflib query, so that the fields are the
+same as the query would give.
+"""
+
+from io import BytesIO
+from typing import Optional
+
+import xml.etree.ElementTree as ET
+
+RDF = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}"
+BIBO_BOOK = "http://purl.org/ontology/bibo/Book"
+
+# Field of the SPARQL query: property, required
+SUDOC_FIELDS: dict[str, tuple[str, bool]] = {
+    "title": ("{http://purl.org/dc/elements/1.1/}title", True),
+    "abstract": ("{http://purl.org/dc/terms/}abstract", False),
+    "date": ("{http://purl.org/dc/elements/1.1/}date", True),
+    "publisher": ("{http://purl.org/dc/elements/1.1/}publisher", True),
+    "format": ("{http://purl.org/dc/elements/1.1/}format", True),
+}
+FIELD_PROPERTIES = {tag for tag, _ in SUDOC_FIELDS.values()}
+
+SUDOC_NAMESPACES = {
+    "bibo": "http://purl.org/ontology/bibo/",
+    "dc": "http://purl.org/dc/elements/1.1/",
+    "dcterms": "http://purl.org/dc/terms/",
+}
+SUDOC_QUERY = """
+select ?book ?title ?abstract ?date ?publisher ?format where {
+    ?book a bibo:Book .
+    ?book dc:title ?title .
+    OPTIONAL { ?book dcterms:abstract ?abstract }
+    ?book dc:date ?date .
+    ?book dc:publisher ?publisher .
+    ?book dc:format ?format .
+}"""
+
+
+class UnsupportedRdf(Exception):
+    """The record uses RDF/XML not handled by the streaming extractor"""
+
+
+def _tag_uri(tag: str) -> str:
+    # "{namespace}name" -> "namespacename"
+    return tag[1:].replace("}", "", 1) if tag.startswith("{") else tag
+
+
+class _Node:
+    def __init__(self, subject: Optional[str]):
+        self.subject = subject
+
+
+def extract_sudoc_fields(content: bytes) -> Optional[dict[str, Optional[str]]]:
+    """Fields of the book of a Sudoc record, read in one pass
+
+    Returns
+    ----------
+    dict of the `SUDOC_FIELDS` and "book", the book URI, abstract None when
+    missing, or None when the record has no book with all the fields
+
+    Raises
+    ----------
+    UnsupportedRdf, xml.etree.ElementTree.ParseError
+    """
+    types: dict[Optional[str], set[str]] = {}
+    values: dict[Optional[str], dict[str, list[Optional[str]]]] = {}
+    order: list[Optional[str]] = []  # subjects in document order
+
+    # nodes and properties alternate in RDF/XML, a stack of both
+    stack: list[Optional[_Node]] = []
+    for event, element in ET.iterparse(BytesIO(content), events=("start", "end")):
+        tag = element.tag
+        if event == "start":
+            if not stack:
+                if tag != f"{RDF}RDF":
+                    raise UnsupportedRdf("root element is not rdf:RDF")
+                stack.append(None)
+            elif len(stack) % 2 == 1:
+                # node element, child of rdf:RDF or of a property
+                subject = element.get(f"{RDF}about")
+                if subject is not None and ":" not in subject:
+                    subject = None  # relative to the document URL
+                if subject not in types:
+                    types[subject] = set()
+                    values[subject] = {}
+                    order.append(subject)
+                if tag != f"{RDF}Description":
+                    types[subject].add(_tag_uri(tag))
+                # property attributes
+                for name, value in element.attrib.items():
+                    if name == f"{RDF}type":
+                        types[subject].add(value)
+                    elif name in FIELD_PROPERTIES:
+                        values[subject].setdefault(name, []).append(value)
+                stack.append(_Node(subject))
+            else:
+                stack.append(None)
+            continue
+
+        # end of an element
+        stack.pop()
+        if len(stack) % 2 == 0 and stack:
+            # property element, its node is on the top of the stack
+            node = stack[-1]
+            resource = element.get(f"{RDF}resource")
+            if tag == f"{RDF}type" and resource is not None:
+                types[node.subject].add(resource)
+            elif tag in FIELD_PROPERTIES:
+                if (
+                    len(element)
+                    or resource is not None
+                    or element.get(f"{RDF}parseType") is not None
+                    or element.get(f"{RDF}datatype") is not None
+                    or element.get(f"{RDF}nodeID") is not None
+                ):
+                    values[node.subject].setdefault(tag, []).append(None)
+                else:
+                    values[node.subject].setdefault(tag, []).append(element.text or "")
+        # read, release its content
+        element.clear()
+
+    books = [subject for subject in order if BIBO_BOOK in types[subject]]
+    rows = []
+    for subject in books:
+        properties = values[subject]
+        if any(
+            required and tag not in properties
+            for tag, required in SUDOC_FIELDS.values()
+        ):
+            continue
+        if subject is None:
+            raise UnsupportedRdf("book without an absolute rdf:about")
+        row: dict[str, Optional[str]] = {"book": subject}
+        for field, (tag, _) in SUDOC_FIELDS.items():
+            found = properties.get(tag, [None])
+            if len(found) > 1 or (found[0] is None and tag in properties):
+                raise UnsupportedRdf(f"{field} is not a single plain literal")
+            row[field] = found[0]
+        rows.append(row)
+
+    if len(rows) > 1:
+        raise UnsupportedRdf("several books")
+    return rows[0] if rows else None
+
+
+def query_sudoc_fields(text: str) -> Optional[dict[str, Optional[str]]]:
+    """Fields of the book of a Sudoc record, by the rdflib query"""
+    from rdflib import Graph  # heavy import, only for the records it reads
+
+    graph = Graph()
+    graph.parse(data=text, format="application/rdf+xml")
+    for row in graph.query(SUDOC_QUERY, initNs=SUDOC_NAMESPACES):
+        return {
+            "book": row.book,
+            "title": row.title,
+            "abstract": row.abstract,
+            "date": row.date,
+            "publisher": row.publisher,
+            "format": row.format,
+        }
+    return None
+
+
+def sudoc_fields(content: bytes, text: str) -> Optional[dict[str, Optional[str]]]:
+    """Fields of the book of a Sudoc record, streamed or queried by rdflib"""
+    try:
+        return extract_sudoc_fields(content)
+    except (UnsupportedRdf, ET.ParseError) as error:
+        print(f"Sudoc: {type(error).__name__} {error}, parsed by rdflib")
+        return query_sudoc_fields(text)
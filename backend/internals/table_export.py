@@ -0,0 +1,86 @@
+"""Streaming export of whole tables as NDJSON or CSV
+
+Rows are read through a server-side cursor in chunks of
+`constants.EXPORT_CHUNK_SIZE` and written as soon as they are read, so the
+memory used by an export doesn't depend on the size of the table.
+"""
+
+from enum import Enum
+from io import StringIO
+from typing import Iterator
+
+import csv
+
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, SQLModel
+
+from ..internals import constants
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv",
+}
+
+
+def export_rows(
+    session: Session,
+    statement: constants.STATEMENT_TYPE,
+    public_model: type[SQLModel],
+    export_format: ExportFormat,
+) -> Iterator[str]:
+    """Serialize the rows of a statement, one chunk of rows at a time
+
+    The rows are read with a new session on the same database, the session
+    of the request being closed before the response is streamed.
+    """
+    fields = list(public_model.model_fields)
+    include = set(fields)
+
+    with Session(session.get_bind()) as export_session:
+        result = export_session.exec(
+            statement.execution_options(yield_per=constants.EXPORT_CHUNK_SIZE)
+        )
+
+        if export_format == ExportFormat.csv:
+            buffer = StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+            for rows in result.partitions():
+                for row in rows:
+                    values = row.model_dump(mode="json", include=include)
+                    writer.writerow(
+                        "" if values[f] is None else values[f] for f in fields
+                    )
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+        else:
+            for rows in result.partitions():
+                yield "".join(
+                    row.model_dump_json(include=include) + "\n" for row in rows
+                )
+
+
+def export_response(
+    session: Session,
+    statement: constants.STATEMENT_TYPE,
+    public_model: type[SQLModel],
+    export_format: ExportFormat,
+    name: str,
+) -> StreamingResponse:
+    """Stream the rows of a statement as a file attachment"""
+    return StreamingResponse(
+        export_rows(session, statement, public_model, export_format),
+        media_type=MEDIA_TYPES[export_format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{export_format.value}"'
+        },
+    )
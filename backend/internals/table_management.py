@@ -1,15 +1,172 @@
 from backend.models import (
+    BookTable,
+    MemberTable,
     PaginationMetadata,
 )
 from ..internals import constants
-from sqlalchemy.sql import func
-from sqlmodel import Session
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import InstrumentedAttribute
+from sqlalchemy.sql import and_, false, func, literal, or_
+from sqlmodel import Session, SQLModel, select
+from typing import Optional, Sequence
 
+import base64
+import json
 import math
+import os
+import threading
+import unicodedata
+import weakref
+
+# (column, descending) pair of a sort order
+SortColumn = tuple[InstrumentedAttribute, bool]
+
+
+def database_key(engine: Engine):
+    """Key of the database of an engine
+
+    The path of a SQLite database file, shared by the sync and async engines
+    opened on it, else the engine itself, e.g. for in-memory databases.
+    """
+    database = engine.url.database
+    if engine.url.query.get("uri") == "true" and database.startswith("file:"):
+        # read-only connections, e.g. file:database.db?mode=ro&uri=true
+        database = database.removeprefix("file:")
+    if engine.url.get_backend_name() == "sqlite" and database not in (
+        None,
+        "",
+        ":memory:",
+    ):
+        return os.path.abspath(database)
+    return engine
+
+
+class _PerDatabase:
+    """Dict of values per database, kept as long as its engine for engine keys"""
+
+    def __init__(self) -> None:
+        self._files: dict[str, dict[str, int]] = {}
+        self._engines: weakref.WeakKeyDictionary[Engine, dict[str, int]] = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def get(self, engine: Engine) -> dict[str, int]:
+        key = database_key(engine)
+        if isinstance(key, str):
+            return self._files.setdefault(key, {})
+        return self._engines.setdefault(key, {})
+
+
+class RowCountCache:
+    """Per-database cache of unfiltered table row counts
+
+    Counts are dropped by `invalidate` whenever a route inserts or deletes rows.
+    A generation number per table prevents a count computed before an
+    invalidation from being stored after it.
+
+    The writes of other processes, e.g. other workers or the LiteFS
+    primary replicating to this node, don't call `invalidate`: every count is
+    dropped when the `PRAGMA data_version` of the connection reading the
+    cache shows a commit from another connection since its last read.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._counts = _PerDatabase()
+        self._generations = _PerDatabase()
+
+    def get(self, session: Session, table: type[SQLModel]) -> int:
+        engine = session.get_bind()
+        name = table.__tablename__
+        self._check_data_version(session)
+        with self._lock:
+            counts = self._counts.get(engine)
+            if name in counts:
+                return counts[name]
+            generation = self._generations.get(engine).get(name, 0)
+
+        total_items = count_items(session, select(table))
+
+        with self._lock:
+            if self._generations.get(engine).get(name, 0) == generation:
+                self._counts.get(engine)[name] = total_items
+        return total_items
+
+    def invalidate(self, session: Session, table: type[SQLModel]) -> None:
+        self._invalidate(session.get_bind(), [table.__tablename__])
+
+    def _invalidate(self, engine: Engine, names: Sequence[str]) -> None:
+        with self._lock:
+            counts = self._counts.get(engine)
+            generations = self._generations.get(engine)
+            for name in names:
+                counts.pop(name, None)
+                generations[name] = generations.get(name, 0) + 1
+
+    def _check_data_version(self, session: Session) -> None:
+        connection = session.connection()
+        data_version = connection.exec_driver_sql("PRAGMA data_version").scalar()
+        # unknown on a new connection, the database may have changed
+        if connection.info.get("data_version") != data_version:
+            self._invalidate(session.get_bind(), list(SQLModel.metadata.tables))
+            connection.info["data_version"] = data_version
+
+
+row_count_cache = RowCountCache()
+
+
+def _count_statement(statement: constants.STATEMENT_TYPE):
+    return select(func.count()).select_from(statement.order_by(None).subquery())
+
+
+def count_items(session: Session, statement: constants.STATEMENT_TYPE) -> int:
+    """Count the rows returned by a statement
+
+    The statement is wrapped in a `SELECT COUNT(*)` subquery so that rows
+    are counted by the database instead of being loaded in memory.
+
+    Parameters
+    ----------
+    statement:
+        result of SQLModel select
+        ex: statement = select(Book).where(Book.available == True)
+
+    Returns
+    ----------
+    int
+    """
+    return session.exec(_count_statement(statement)).one()
+
+
+def invalidate_row_count(session: Session, table: type[SQLModel]) -> None:
+    """Drop the cached row count of a table, to call after an insert or a delete"""
+    row_count_cache.invalidate(session, table)
+    # dropped again by a group session once committed
+    session.info.setdefault("changed_tables", set()).add(table)
+
+
+def build_paginate_metadata(
+    total_items: int, limit: int, next_cursor: Optional[str] = None
+) -> PaginationMetadata:
+    """Get pagination metadata from a total item count"""
+    # Calculate total pages
+    total_pages = math.ceil(total_items / limit) if total_items > 0 else 1
+
+    metadata = PaginationMetadata(
+        total_items=total_items,
+        total_pages=total_pages,
+        next_cursor=next_cursor,
+    )
+    return metadata
 
 
 def get_paginate_metadata(
-    session: Session, statement: constants.STATEMENT_TYPE, limit: int
+    session: Session,
+    statement: constants.STATEMENT_TYPE,
+    limit: int,
+    cached_table: Optional[type[SQLModel]] = None,
 ) -> PaginationMetadata:
     """Get metadata from a table from a statement
 
@@ -19,23 +176,234 @@ def get_paginate_metadata(
         result of SQLModel select
         ex: statement = select(Book)
     limit
+    cached_table:
+        table selected without filter by the statement,
+        its row count is then read from the row count cache
 
     Returns
     ----------
     PaginationMetadata
     """
     # Query total item count
-    total_items = len(session.exec(statement).all())
-    # Calculate total pages
-    total_pages = math.ceil(total_items / limit) if total_items > 0 else 1
+    if cached_table is not None:
+        total_items = row_count_cache.get(session, cached_table)
+    else:
+        total_items = count_items(session, statement)
+    return build_paginate_metadata(total_items, limit)
 
-    metadata = PaginationMetadata(
-        total_items=total_items,
-        total_pages=total_pages,
+
+def order_clauses(order: Sequence[SortColumn]) -> list:
+    """ORDER BY clauses of (column, descending) pairs"""
+    return [
+        column.desc() if descending else column.asc() for column, descending in order
+    ]
+
+
+def column_python_type(column: InstrumentedAttribute) -> type:
+    """Python type of the values of a column"""
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        # SQLModel AutoString
+        return str
+
+
+def encode_cursor(sort_key: str, values: list) -> str:
+    """Encode the sort values of the last row of a page in an opaque cursor"""
+    payload = json.dumps({"sort": sort_key, "values": values}, default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_key: str, order: list[SortColumn]) -> list:
+    """Decode a cursor made by `encode_cursor` for the same sort order
+
+    Raises
+    ----------
+    HTTPException 400 when the cursor is malformed or was made for another sort
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+        if payload["sort"] != sort_key or len(payload["values"]) != len(order):
+            raise ValueError("cursor made for another sort order")
+        values = []
+        for (column, _), value in zip(order, payload["values"]):
+            python_type = column_python_type(column)
+            if isinstance(value, bool) and python_type is not bool:
+                # bool is a subclass of int
+                raise TypeError("bool value of a non-bool column")
+            if value is not None and not isinstance(value, python_type):
+                value = python_type.fromisoformat(value)
+            values.append(value)
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _after(column: InstrumentedAttribute, descending: bool, value):
+    # SQLite sorts NULL before any value
+    if value is None:
+        return false() if descending else column.is_not(None)
+    # bound parameter, SQLAlchemy doesn't compare a column with a bool constant
+    value = literal(value, column.type)
+    if descending:
+        return or_(column < value, column.is_(None))
+    return column > value
+
+
+def keyset_condition(order: list[SortColumn], values: list):
+    """Condition selecting the rows that come after `values` in `order`"""
+    condition = false()
+    for (column, descending), value in reversed(list(zip(order, values))):
+        if value is None:
+            equal = column.is_(None)
+        else:
+            equal = column == literal(value, column.type)
+        condition = or_(_after(column, descending, value), and_(equal, condition))
+    return condition
+
+
+def paginate(
+    session: Session,
+    statement: constants.STATEMENT_TYPE,
+    page: int,
+    limit: int,
+    cached_table: Optional[type[SQLModel]] = None,
+    cursor: Optional[str] = None,
+    sort: Sequence[SortColumn] = (),
+    keyset: bool = True,
+) -> tuple[list, PaginationMetadata]:
+    """Get one page of a statement and its pagination metadata
+
+    Rows are ordered by the `sort` columns then by id. The page is selected
+    either with an offset computed from `page`, or, when a `cursor` is given,
+    with a keyset condition on the sort values of the last row of the
+    previous page, so that deep pages cost the same as the first one. The
+    metadata carries the cursor of the next page when the page is full.
+
+    The total item count of a filtered statement is returned by the page
+    query itself, in an uncorrelated `(SELECT COUNT(*) ...)` column that
+    SQLite evaluates once. A `COUNT(*) OVER()` window column would give the
+    same result but makes SQLite buffer every matching row before applying
+    the limit.
+
+    Parameters
+    ----------
+    statement:
+        result of SQLModel select, with its filters
+        ex: statement = select(Book).where(Book.available == True)
+    page:
+        ignored when a cursor is given
+    limit
+    cached_table:
+        table selected without filter by the statement,
+        its row count is then read from the row count cache
+    cursor:
+        next_cursor of the metadata of the previous page
+    sort:
+        (column, descending) pairs
+    keyset:
+        False when the statement is already ordered by an expression,
+        such as a search rank, that a cursor can't encode
+
+    Returns
+    ----------
+    (page data, PaginationMetadata)
+    """
+    table = statement.column_descriptions[0]["entity"]
+    order = [*sort, (table.id, False)]
+    sort_key = ",".join(
+        f"{'-' if descending else '+'}{column.key}" for column, descending in order
     )
-    return metadata
+
+    page_statement = statement.order_by(*order_clauses(order)).limit(limit)
+    if cursor is not None:
+        values = decode_cursor(cursor, sort_key, order)
+        page_statement = page_statement.where(keyset_condition(order, values))
+        offset = 0
+    else:
+        offset = (page - 1) * limit
+        page_statement = page_statement.offset(offset)
+
+    if cached_table is not None:
+        data = list(session.exec(page_statement).all())
+        total_items = row_count_cache.get(session, cached_table)
+    else:
+        rows = session.execute(
+            page_statement.add_columns(
+                _count_statement(statement).scalar_subquery().label("total_items")
+            )
+        ).all()
+        data = [row[0] for row in rows]
+        if rows:
+            total_items = rows[0].total_items
+        elif offset > 0 or cursor is not None:
+            # Page after the last one: no row carries the total
+            total_items = count_items(session, statement)
+        else:
+            total_items = 0
+
+    next_cursor = None
+    if keyset and len(data) == limit:
+        last = data[-1]
+        next_cursor = encode_cursor(
+            sort_key, [getattr(last, column.key) for column, _ in order]
+        )
+    return data, build_paginate_metadata(total_items, limit, next_cursor)
+
+
+# Normalized shadow column of each searchable column, by table
+NORMALIZED_COLUMNS: dict[type[SQLModel], dict[str, str]] = {
+    BookTable: {"title": "title_normalized", "author": "author_normalized"},
+    MemberTable: {
+        "firstname": "firstname_normalized",
+        "surname": "surname_normalized",
+    },
+}
 
 
 def normalize_string(string: str) -> str:
-    """normalize strings (case-insensitive, remove spaces and special characters)"""
-    return func.replace(func.replace(func.lower(string), " ", ""), "-", "")
+    """normalize strings (case and accent insensitive, remove spaces and dashes)"""
+    decomposed = unicodedata.normalize("NFKD", string)
+    folded = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return folded.casefold().replace(" ", "").replace("-", "")
+
+
+def fill_normalized_columns(table: type[SQLModel], values: dict) -> dict:
+    """Add the normalized shadow columns of a row given as a dict"""
+    for column, normalized_column in NORMALIZED_COLUMNS.get(table, {}).items():
+        if column in values:
+            value = values[column]
+            values[normalized_column] = (
+                normalize_string(value) if value is not None else None
+            )
+    return values
+
+
+def _update_normalized_columns(mapper, connection, target: SQLModel) -> None:
+    for column, normalized_column in NORMALIZED_COLUMNS[type(target)].items():
+        value = getattr(target, column)
+        setattr(
+            target,
+            normalized_column,
+            normalize_string(value) if value is not None else None,
+        )
+
+
+for _table in NORMALIZED_COLUMNS:
+    event.listen(_table, "before_insert", _update_normalized_columns)
+    event.listen(_table, "before_update", _update_normalized_columns)
+
+
+def normalized_prefix_condition(table: type[SQLModel], column: str, value: str):
+    """Condition matching the rows whose column starts with value
+
+    Both sides are normalized, the comparison is a range on the indexed
+    normalized shadow column of the column.
+    """
+    normalized_column = getattr(table, NORMALIZED_COLUMNS[table][column])
+    prefix = normalize_string(value)
+    if not prefix:
+        return normalized_column.is_not(None)
+    upper_bound = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(normalized_column >= prefix, normalized_column < upper_bound)
@@ -0,0 +1,176 @@
+"""Single writer of the database, with group commits
+
+SQLite lets one connection write at a time. Instead of each request taking
+the file lock and syncing its own commit, the `WriteCoordinator` started
+with the application runs the database writes of the routes on a single
+connection, in a dedicated thread. The writes queued while a group is
+being committed form the next group, up to
+`constants.GROUP_COMMIT_MAXIMAL_SIZE` writes:
+
+- each write runs in a SAVEPOINT, its error rolls back only its changes
+  and is raised to its request
+- the group is committed once, with a single sync of the journal, then
+  each request gets its result
+
+The writes are the functions the routes give to their `SessionRunner`,
+they call `session.commit()` as usual: in a group, it only flushes.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import asyncio
+
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+from ..internals import constants
+from ..internals.table_management import row_count_cache
+
+
+class GroupSession(Session):
+    """Session of a group of writes, committed by the `WriteCoordinator`"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # tables with rows inserted or deleted, their counts are dropped,
+        # also those of `invalidate_row_count`, e.g. after Core inserts
+        self.changed_tables: set[type[SQLModel]] = self.info.setdefault(
+            "changed_tables", set()
+        )
+
+    def commit(self) -> None:
+        self.changed_tables.update(type(row) for row in (*self.new, *self.deleted))
+        self.flush()
+
+    def commit_group(self) -> None:
+        super().commit()
+
+
+def create_writer_engine(url: str) -> Engine:
+    """Engine of the single writer connection
+
+    Its transactions start with BEGIN IMMEDIATE, which takes the write lock
+    at once, and handle the SAVEPOINTs of the writes, which the sqlite3
+    module doesn't.
+    """
+    engine = create_engine(
+        url, connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record) -> None:
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def on_begin(connection) -> None:
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return engine
+
+
+class WriteCoordinator:
+    """Queue of the database writes, run in groups by a single writer
+
+    Parameters
+    ----------
+    engine:
+        engine of the writer, see `create_writer_engine`
+    maximal_group:
+        writes committed together
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        maximal_group: int = constants.GROUP_COMMIT_MAXIMAL_SIZE,
+    ):
+        self.engine = engine
+        self.maximal_group = maximal_group
+        self.groups = 0  # committed, for the diagnostics and benchmarks
+        self.writes = 0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="database-writer"
+        )
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._work())
+
+    async def stop(self) -> None:
+        """Commit the queued writes, then stop the writer"""
+        if self._task is not None:
+            await self._queue.join()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._executor.shutdown()
+
+    async def write(self, work: Callable, *args, **kwargs):
+        """Run `work(session, *args, **kwargs)` in the next group
+
+        Returns
+        ----------
+        result of the work once its group is committed,
+        raises its exception when it failed or when the commit failed
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((work, args, kwargs, future))
+        return await future
+
+    async def _work(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self._queue.get()]
+            while len(group) < self.maximal_group and not self._queue.empty():
+                group.append(self._queue.get_nowait())
+            try:
+                outcomes = await loop.run_in_executor(
+                    self._executor, self._commit_group, group
+                )
+                for (*_, future), (result, exception) in zip(group, outcomes):
+                    if future.cancelled():
+                        continue
+                    if exception is not None:
+                        future.set_exception(exception)
+                    else:
+                        future.set_result(result)
+            finally:
+                for _ in group:
+                    self._queue.task_done()
+
+    def _commit_group(self, group: list) -> list[tuple]:
+        outcomes = []
+        with GroupSession(self.engine, expire_on_commit=False) as session:
+            try:
+                for work, args, kwargs, _ in group:
+                    try:
+                        with session.begin_nested():
+                            result = work(session, *args, **kwargs)
+                        outcomes.append((result, None))
+                    except Exception as exception:
+                        outcomes.append((None, exception))
+                session.commit_group()
+            except Exception as exception:
+                session.rollback()
+                return [(None, exception)] * len(group)
+
+            # counted rows that changed before the commit may be cached
+            for table in session.changed_tables:
+                row_count_cache.invalidate(session, table)
+        self.groups += 1
+        self.writes += len(group)
+        return outcomes
+
+
+def get_write_coordinator(request: Request) -> Optional[WriteCoordinator]:
+    """Get the write coordinator for FastAPI Dependency
+
+    None when the application was started without its lifespan,
+    each route then commits its own writes.
+    """
+    return getattr(request.app.state, "write_coordinator", None)
@@ -1,9 +1,30 @@
 from contextlib import asynccontextmanager
 from fastapi import Depends, FastAPI
 from fastapi.staticfiles import StaticFiles
+from sqlmodel import Session
+from starlette.concurrency import run_in_threadpool
 
-from backend.database import create_db_and_tables
-from backend.routers import book, family, member, circulation
+import asyncio
+
+from backend.database import (
+    create_db_and_tables,
+    enable_storage_profile,
+    get_database_settings,
+    global_engine,
+    sqlite_url,
+)
+from backend.internals import constants
+from backend.internals.cover_store import (
+    close_cover_store,
+    create_cover_store,
+    get_cover_store_settings,
+)
+from backend.internals.enrichment import EnrichmentQueue
+from backend.internals.http_client import create_http_client, get_http_client_settings
+from backend.internals.litefs import LiteFSMiddleware, get_litefs_settings, is_primary
+from backend.internals.provider_scheduler import provider_scheduler
+from backend.internals.write_coordinator import WriteCoordinator, create_writer_engine
+from backend.routers import admin, book, cover, family, member, circulation
 from backend.users import (
     auth_backend,
     auth_cookie_backend,
@@ -13,13 +34,61 @@ from backend.users import (
 from backend.models import User, UserCreate, UserRead, UserUpdate
 
 
+def save_provider_stats() -> None:
+    if not is_primary(get_litefs_settings()):
+        # read-only LiteFS replica
+        return
+    with Session(global_engine) as session:
+        provider_scheduler.save(session)
+
+
+async def save_provider_stats_periodically() -> None:
+    while True:
+        await asyncio.sleep(constants.PROVIDER_SCHEDULER_SAVE_INTERVAL)
+        try:
+            await run_in_threadpool(save_provider_stats)
+        except Exception as exception:
+            # e.g. database is locked, saved again at the next interval
+            print(f"Provider scheduler: {type(exception).__name__} {exception}")
+
+
 @asynccontextmanager
 async def startup(app: FastAPI):
-    create_db_and_tables()
-    yield
+    # LiteFS replicas are read-only, the primary creates the tables and runs
+    # the enrichment jobs
+    primary = is_primary(get_litefs_settings())
+    if primary:
+        create_db_and_tables()
+    with Session(global_engine) as session:
+        provider_scheduler.load(session)
+    saver = asyncio.create_task(save_provider_stats_periodically())
+    writer_engine = create_writer_engine(sqlite_url)
+    enable_storage_profile(writer_engine, get_database_settings())
+    app.state.write_coordinator = WriteCoordinator(writer_engine)
+    app.state.write_coordinator.start()
+    # shared by the book metadata providers
+    async with create_http_client(get_http_client_settings()) as http_client:
+        app.state.http_client = http_client
+        app.state.cover_store = create_cover_store(get_cover_store_settings())
+        app.state.enrichment_queue = EnrichmentQueue(
+            global_engine, http_client, app.state.cover_store
+        )
+        if primary:
+            app.state.enrichment_queue.start()
+        try:
+            yield
+        finally:
+            await app.state.enrichment_queue.stop()
+            await app.state.write_coordinator.stop()
+            writer_engine.dispose()
+            close_cover_store(app.state.cover_store)
+            saver.cancel()
+            save_provider_stats()
 
 
 app = FastAPI(lifespan=startup)
+# writes answered by the LiteFS primary, reads by any node
+app.add_middleware(LiteFSMiddleware, settings=get_litefs_settings())
 
 API_PREFIX = "/api/v1"
 
@@ -27,6 +96,8 @@ app.include_router(book.router, prefix=API_PREFIX)
 app.include_router(family.router, prefix=API_PREFIX)
 app.include_router(member.router, prefix=API_PREFIX)
 app.include_router(circulation.router, prefix=API_PREFIX)
+app.include_router(admin.router, prefix=API_PREFIX)
+app.include_router(cover.router)
 
 # Auth
 
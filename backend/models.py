@@ -1,9 +1,12 @@
-from datetime import date
+from datetime import date, datetime
+from sqlalchemy import Index
 from sqlmodel import Field, Relationship, SQLModel
 from typing import Optional
 from pydantic import PositiveInt
 from pydantic_extra_types.language_code import LanguageAlpha2
 
+from backend.internals import constants
+
 # from fastapi_users.db import SQLAlchemyBaseUserTableUUID
 from fastapi_users_db_sqlmodel import SQLModelBaseUserDB
 from fastapi_users import schemas
@@ -48,6 +51,18 @@ class SharedUpdate(SQLModel):
 class PaginationMetadata(SQLModel):
     total_items: int  # total number of items available in the dataset
     total_pages: int  # total number of pages
+    next_cursor: Optional[str] = None  # cursor of the next page, if any
+
+
+class BulkImportError(SQLModel):
+    row: int  # number of the row in the imported file, starting at 1
+    detail: str
+
+
+class BulkImportReport(SQLModel):
+    inserted: int  # number of rows inserted
+    errors: list[BulkImportError]  # rows not inserted
+    ignored_columns: list[str] = []  # not fields of the table
 
 
 # Book
@@ -72,12 +87,29 @@ class BookBase(SharedBase):
 
 
 class BookTable(BookBase, table=True):
+    # composite indexes of the common filter and sort combinations
+    __table_args__ = (
+        Index(
+            "ix_booktable_archived_available_title", "archived", "available", "title"
+        ),
+        Index(
+            "ix_booktable_category_type_category_age", "category_type", "category_age"
+        ),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    # normalized copies for searches, maintained on write
+    title_normalized: Optional[str] = Field(default=None, index=True)
+    author_normalized: Optional[str] = Field(default=None, index=True)
+    # of the thumbnails in the cover store, only set by the store, indexed
+    # to make them again
+    cover_hash: Optional[str] = Field(default=None, index=True)
     circulation_history: list["CirculationTable"] = Relationship(back_populates="book")
 
 
 class BookPublic(BookBase):
     id: int
+    cover_hash: Optional[str] = None
 
 
 class BooksPublic(SQLModel):
@@ -89,6 +121,11 @@ class BookCreate(BookBase):
     pass
 
 
+class BookRecord(BookCreate):
+    # found by an ISBN lookup, with the hash of its cover in the cover store
+    cover_hash: Optional[str] = None
+
+
 class BookUpdate(SharedUpdate):
     title: Optional[str] = None
     author: Optional[str] = None
@@ -106,6 +143,80 @@ class BookUpdate(SharedUpdate):
     publication_date: Optional[str] = None
 
 
+class IsbnBatch(SQLModel):
+    isbns: list[str] = Field(max_length=constants.ISBN_BATCH_MAXIMAL_SIZE)
+
+
+class EnrichmentJobBase(SQLModel):
+    isbn: str  # EAN-13
+    book_id: int = Field(foreign_key="booktable.id", index=True)
+    # pending, running, done, not_found or failed
+    status: str = Field(default="pending", index=True)
+    attempts: int = 0  # lookups started
+    error: Optional[str] = None  # of the last attempt
+
+
+class EnrichmentJobTable(EnrichmentJobBase, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    created_date: datetime
+    updated_date: datetime
+
+
+class EnrichmentJobPublic(EnrichmentJobBase):
+    id: int
+
+
+class IsbnCacheTable(SQLModel, table=True):
+    isbn: str = Field(primary_key=True)  # EAN-13
+    book: Optional[str] = None  # BookCreate as JSON, None when not found
+    cached_date: datetime
+    last_used_date: datetime = Field(index=True)
+
+
+class ProviderStatsTable(SQLModel, table=True):
+    isbn_range: str = Field(primary_key=True)  # e.g. "978-2" or "978-2-89"
+    provider: str = Field(primary_key=True)
+    lookups: int = 0
+    hits: int = 0  # lookups that found the book
+    failures: int = 0
+    latency_ms: Optional[float] = None  # moving average
+
+
+class IsbnCachePurge(SQLModel):
+    deleted: int  # number of entries deleted
+
+
+class ProviderHealthPublic(SQLModel):
+    provider: str
+    state: str  # circuit breaker state: closed, open or half_open
+    lookups: int
+    failures: int
+    skipped: int  # lookups skipped while the circuit was open
+    error_rate: float  # of the last lookups
+    latency_p50_ms: Optional[float] = None
+    latency_p95_ms: Optional[float] = None
+    last_error: Optional[str] = None
+
+
+class HostRatePublic(SQLModel):
+    host: str
+    rate: float  # requests per second currently allowed
+    maximal_rate: float
+    tokens: float
+
+
+class ProvidersHealth(SQLModel):
+    providers: list[ProviderHealthPublic]
+    hosts: list[HostRatePublic]
+
+
+class DatabaseDiagnostics(SQLModel):
+    storage_profile: str
+    configured_pragmas: dict[str, str]  # of the profile and its overrides
+    pragmas: dict[str, str]  # read from a connection
+    sqlite_version: str
+
+
 # Family
 
 
@@ -147,11 +258,16 @@ class MemberBase(SharedBase):
     firstname: str
     surname: str
     birthdate: Optional[date] = None
-    family_id: Optional[int] = Field(default=None, foreign_key="familytable.id")
+    family_id: Optional[int] = Field(
+        default=None, foreign_key="familytable.id", index=True
+    )
 
 
 class MemberTable(MemberBase, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
+    # normalized copies for searches, maintained on write
+    firstname_normalized: Optional[str] = Field(default=None, index=True)
+    surname_normalized: Optional[str] = Field(default=None, index=True)
     family: Optional[FamilyTable] = Relationship(back_populates="members")
     circulation_history: list["CirculationTable"] = Relationship(
         back_populates="member"
@@ -183,11 +299,11 @@ class MemberUpdate(SharedUpdate):
 
 
 class CirculationBase(SharedBase):
-    borrowed_date: date
+    borrowed_date: date = Field(index=True)
     returned_date: Optional[date] = None
 
-    book_id: int = Field(default=None, foreign_key="booktable.id")
-    member_id: int = Field(default=None, foreign_key="membertable.id")
+    book_id: int = Field(default=None, foreign_key="booktable.id", index=True)
+    member_id: int = Field(default=None, foreign_key="membertable.id", index=True)
 
 
 class CirculationTable(CirculationBase, table=True):
@@ -0,0 +1,71 @@
+import sqlite3
+
+from fastapi import APIRouter, Depends, Query
+from sqlmodel import Session
+from typing_extensions import Annotated
+
+from backend.database import (
+    DatabaseSettings,
+    get_database_settings,
+    get_session,
+    read_pragmas,
+)
+from backend.models import DatabaseDiagnostics, IsbnCachePurge, ProvidersHealth
+from backend.users import current_superuser
+from ..internals.isbn_cache import (
+    IsbnCacheSettings,
+    get_isbn_cache_settings,
+    purge_cache,
+)
+from ..internals.provider_health import provider_health
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(current_superuser)],
+)
+
+
+@router.delete("/isbn-cache", response_model=IsbnCachePurge)
+def purge_isbn_cache(
+    *,
+    session: Session = Depends(get_session),
+    cache_settings: Annotated[IsbnCacheSettings, Depends(get_isbn_cache_settings)],
+    expired_only: bool = Query(default=False),
+):
+    """
+    Empty the cache of the books found by ISBN, or only drop its expired
+    entries. Superusers only.
+    """
+    deleted = purge_cache(session, cache_settings, expired_only)
+    return IsbnCachePurge(deleted=deleted)
+
+
+@router.get("/providers", response_model=ProvidersHealth)
+def read_providers_health():
+    """
+    Circuit breaker state, error rate and latency of the book metadata
+    providers, and request rate currently allowed to their hosts.
+    Superusers only.
+    """
+    return provider_health.snapshot()
+
+
+@router.get("/database", response_model=DatabaseDiagnostics)
+def read_database_diagnostics(
+    *,
+    session: Session = Depends(get_session),
+    settings: Annotated[DatabaseSettings, Depends(get_database_settings)],
+):
+    """
+    Storage profile of the database, with the PRAGMAs it sets and their
+    values on a connection. Superusers only.
+    """
+    return DatabaseDiagnostics(
+        storage_profile=settings.storage_profile.value,
+        configured_pragmas={
+            name: str(value) for name, value in settings.pragmas().items()
+        },
+        pragmas=read_pragmas(session),
+        sqlite_version=sqlite3.sqlite_version,
+    )
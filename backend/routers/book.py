@@ -1,12 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, select
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+)
+from fastapi.responses import StreamingResponse
+from httpx import AsyncClient
+from sqlmodel import Session, or_, select
+from typing import Optional
 from typing_extensions import Annotated
 from backend.config import get_settings, Settings
-from backend.database import get_session
-from backend.models import BookTable, BookPublic, BooksPublic, BookCreate, BookUpdate
-from backend.internals.book_notice import isbn2book
+from backend.database import (
+    SessionRunner,
+    get_read_session_runner,
+    get_session,
+    get_session_runner,
+)
+from backend.models import (
+    BookTable,
+    BookPublic,
+    BooksPublic,
+    BookCreate,
+    BookUpdate,
+    BulkImportReport,
+    EnrichmentJobPublic,
+    EnrichmentJobTable,
+    IsbnBatch,
+)
+from backend.internals.book_search import search_books_statement
 from ..internals import constants
-from ..internals.table_management import get_paginate_metadata
+from ..internals.bulk_import import import_rows, parse_rows
+from ..internals.cover_store import CoverStore, get_cover_store
+from ..internals.enrichment import (
+    FINISHED_STATUSES,
+    EnrichmentQueue,
+    create_job,
+    get_enrichment_queue,
+    run_job,
+)
+from ..internals.http_client import get_http_client
+from ..internals.isbn_cache import IsbnCacheSettings, get_isbn_cache_settings
+from ..internals.isbn_batch import ingest_isbns, ndjson_events
+from ..internals.query_language import compile_query
+from ..internals.table_export import ExportFormat, export_response
+from ..internals.table_management import (
+    invalidate_row_count,
+    order_clauses,
+    normalized_prefix_condition,
+    paginate,
+)
 
 
 router = APIRouter(
@@ -15,23 +61,117 @@ router = APIRouter(
 )
 
 
-@router.post("", response_model=BookPublic)
-def create_book(*, session: Session = Depends(get_session), book: BookCreate):
+def _create_book(session: Session, book: BookCreate) -> BookTable:
     db_data = BookTable.model_validate(book)
     session.add(db_data)
     session.commit()
     session.refresh(db_data)
+    invalidate_row_count(session, BookTable)
     return db_data
 
 
-@router.post("/{isbn}", response_model=BookPublic)
+def _read_book(session: Session, book_id: int) -> BookTable:
+    book = session.get(BookTable, book_id)
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+    return book
+
+
+def _update_book(session: Session, book_id: int, book: BookUpdate) -> BookTable:
+    db_book = _read_book(session, book_id)
+    book_data = book.model_dump(exclude_unset=True)
+    if "cover" in book_data and book_data["cover"] != db_book.cover:
+        # the thumbnails are those of the former cover
+        book_data["cover_hash"] = None
+    db_book.sqlmodel_update(book_data)
+    session.add(db_book)
+    session.commit()
+    session.refresh(db_book)
+    return db_book
+
+
+def _delete_book(session: Session, book_id: int) -> None:
+    book = _read_book(session, book_id)
+    session.delete(book)
+    session.commit()
+    invalidate_row_count(session, BookTable)
+
+
+def _read_enrichment_job(session: Session, book_id: int) -> EnrichmentJobTable:
+    statement = select(EnrichmentJobTable).where(EnrichmentJobTable.book_id == book_id)
+    job = session.exec(statement).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Enrichment job not found")
+    return job
+
+
+@router.post("", response_model=BookPublic)
+async def create_book(
+    *, runner: SessionRunner = Depends(get_session_runner), book: BookCreate
+):
+    return await runner.write(_create_book, book)
+
+
+@router.post("/bulk", response_model=BulkImportReport)
+async def bulk_create_books(
+    *,
+    runner: SessionRunner = Depends(get_session_runner),
+    body: bytes = Body(media_type="application/x-ndjson"),
+    content_type: str = Header(default=None),
+):
+    """
+    Create books from an NDJSON (application/x-ndjson) or CSV (text/csv)
+    body, one book per line. Rows that can't be created are reported
+    in errors, the others are created.
+    """
+    rows = parse_rows(body, content_type)
+    return await import_rows(runner, BookTable, BookCreate, rows)
+
+
+@router.post("/isbn/batch")
+async def create_books_isbn_batch(
+    *,
+    session: Session = Depends(get_session),
+    settings: Annotated[Settings, Depends(get_settings)],
+    cache_settings: Annotated[IsbnCacheSettings, Depends(get_isbn_cache_settings)],
+    client: Annotated[Optional[AsyncClient], Depends(get_http_client)],
+    cover_store: Annotated[Optional[CoverStore], Depends(get_cover_store)],
+    batch: IsbnBatch,
+):
+    """
+    Create the books of a list of ISBNs, looked up concurrently.\n
+    Progress is streamed as NDJSON, one line per ISBN with its status
+    (created with the book id, not_found, invalid, duplicate or error),
+    then a "done" line with the count of each status.
+    """
+    events = ingest_isbns(
+        session.get_bind(),
+        batch.isbns,
+        settings,
+        cache_settings,
+        client=client,
+        cover_store=cover_store,
+    )
+    return StreamingResponse(ndjson_events(events), media_type="application/x-ndjson")
+
+
+@router.post("/{isbn}", response_model=EnrichmentJobPublic, status_code=202)
 async def create_book_isbn(
     *,
     session: Session = Depends(get_session),
+    runner: SessionRunner = Depends(get_session_runner),
     settings: Annotated[Settings, Depends(get_settings)],
+    cache_settings: Annotated[IsbnCacheSettings, Depends(get_isbn_cache_settings)],
+    client: Annotated[Optional[AsyncClient], Depends(get_http_client)],
+    cover_store: Annotated[Optional[CoverStore], Depends(get_cover_store)],
+    queue: Annotated[Optional[EnrichmentQueue], Depends(get_enrichment_queue)],
+    background_tasks: BackgroundTasks,
     isbn: str,
 ):
     """
+    Create a book holding only its ISBN, and return the job filling in its
+    record and cover in the background. Its status is pending, running,
+    done, not_found or failed, see GET /books/{book_id}/enrichment.\n
     Isbn for reference :\n
     978-2013944762
     9782253067900
@@ -43,22 +183,30 @@ async def create_book_isbn(
     9782361934996
     9782815310253
     """
-    book = await isbn2book(isbn, settings)
+    job = await runner.write(create_job, isbn)
+    if job is None:
+        raise HTTPException(status_code=400, detail="Invalid ISBN")
 
-    if book is None:
-        raise HTTPException(status_code=400, detail="Item not found")
-
-    db_data = BookTable.model_validate(book)
-    session.add(db_data)
-    session.commit()
-    session.refresh(db_data)
-    return db_data
+    if queue is not None:
+        queue.submit(job.id, settings, cache_settings)
+    else:
+        background_tasks.add_task(
+            run_job,
+            session.get_bind(),
+            job.id,
+            settings,
+            cache_settings,
+            client=client,
+            cover_store=cover_store,
+        )
+    return job
 
 
 @router.get("", response_model=BooksPublic)
-def read_books(
+async def read_books(
     *,
-    session: Session = Depends(get_session),
+    runner: SessionRunner = Depends(get_read_session_runner),
+    request: Request,
     page: int = Query(
         default=constants.DEFAULT_MINIMAL_VALUE, ge=constants.DEFAULT_MINIMAL_VALUE
     ),
@@ -67,50 +215,133 @@ def read_books(
         le=constants.LIMIT_MAXIMAL_VALUE,
         ge=constants.DEFAULT_MINIMAL_VALUE,
     ),
+    sort: str = Query(default=None),
+    cursor: str = Query(default=None),
     available: bool = Query(default=None),
+    search: str = Query(default=None),
 ):
-    offset = (page - 1) * limit
-
+    """
+    sort: fields separated by commas, "+" (default) ascending, "-" descending,
+    e.g. sort=+title,-author\n
+    filter[field]: equality filter, repeat it to accept several values,
+    e.g. filter[archived]=false\n
+    Only indexed fields can be sorted and filtered.\n
+    search: title or author starting with it, case, accents, spaces and
+    dashes ignored
+    """
     # Filter data
-    statement = select(BookTable)
+    statement, sort_columns = compile_query(
+        select(BookTable), BookTable, sort, request.query_params
+    )
     if available is not None:
         statement = statement.where(BookTable.available == available)
+    if search is not None:
+        statement = statement.where(
+            or_(
+                normalized_prefix_condition(BookTable, "title", search),
+                normalized_prefix_condition(BookTable, "author", search),
+            )
+        )
+    cached_table = BookTable if statement.whereclause is None else None
 
     # Return paginated data
-    books = session.exec(statement.offset(offset).limit(limit)).all()
-    metadata = get_paginate_metadata(session, select(BookTable), limit)
+    books, metadata = await runner.run(
+        paginate,
+        statement,
+        page,
+        limit,
+        cached_table=cached_table,
+        cursor=cursor,
+        sort=sort_columns,
+    )
+
+    return BooksPublic(data=books, meta=metadata)
+
+
+@router.get("/search", response_model=BooksPublic)
+async def search_books(
+    *,
+    runner: SessionRunner = Depends(get_read_session_runner),
+    q: str = Query(min_length=1),
+    page: int = Query(
+        default=constants.DEFAULT_MINIMAL_VALUE, ge=constants.DEFAULT_MINIMAL_VALUE
+    ),
+    limit: int = Query(
+        default=constants.LIMIT_DEFAULT_VALUE,
+        le=constants.LIMIT_MAXIMAL_VALUE,
+        ge=constants.DEFAULT_MINIMAL_VALUE,
+    ),
+):
+    """
+    Full-text search in title, author, abstract, publisher and topics,
+    best match first. Accents and case are ignored, words may be truncated.
+    """
+    books, metadata = await runner.run(
+        paginate, search_books_statement(q), page, limit, keyset=False
+    )
 
     return BooksPublic(data=books, meta=metadata)
 
 
+@router.get("/export")
+def export_books(
+    *,
+    session: Session = Depends(get_session),
+    request: Request,
+    format: ExportFormat = Query(default=ExportFormat.ndjson),
+    sort: str = Query(default=None),
+):
+    """
+    Stream all the books as NDJSON or CSV.\n
+    Accepts the sort and filter parameters of the list API.
+    """
+    statement, sort_columns = compile_query(
+        select(BookTable), BookTable, sort, request.query_params
+    )
+    statement = statement.order_by(*order_clauses(sort_columns), BookTable.id)
+
+    return export_response(session, statement, BookPublic, format, "books")
+
+
 @router.get("/{book_id}", response_model=BookPublic)
-def read_book(*, session: Session = Depends(get_session), book_id: int):
-    book = session.get(BookTable, book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    return book
+async def read_book(
+    *, runner: SessionRunner = Depends(get_read_session_runner), book_id: int
+):
+    return await runner.run(_read_book, book_id)
+
+
+@router.get("/{book_id}/enrichment", response_model=EnrichmentJobPublic)
+async def read_book_enrichment(
+    *,
+    runner: SessionRunner = Depends(get_read_session_runner),
+    queue: Annotated[Optional[EnrichmentQueue], Depends(get_enrichment_queue)],
+    book_id: int,
+    wait: float = Query(default=0, ge=0, le=constants.ENRICHMENT_MAXIMAL_WAIT),
+):
+    """
+    Job filling in a book created from its ISBN.\n
+    wait: seconds to wait for the end of the job before answering
+    """
+    job = await runner.run(_read_enrichment_job, book_id)
+
+    if wait and queue is not None and job.status not in FINISHED_STATUSES:
+        await queue.wait(job.id, wait)
+        await runner.run(Session.refresh, job)
+    return job
 
 
 @router.patch("/{book_id}", response_model=BookPublic)
-def update_book(
-    *, session: Session = Depends(get_session), book_id: int, book: BookUpdate
+async def update_book(
+    *,
+    runner: SessionRunner = Depends(get_session_runner),
+    book_id: int,
+    book: BookUpdate,
 ):
-    db_book = session.get(BookTable, book_id)
-    if not db_book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    book_data = book.model_dump(exclude_unset=True)
-    db_book.sqlmodel_update(book_data)
-    session.add(db_book)
-    session.commit()
-    session.refresh(db_book)
-    return db_book
+    return await runner.write(_update_book, book_id, book)
 
 
 @router.delete("/{book_id}", status_code=204)
-def delete_book(*, session: Session = Depends(get_session), book_id: int):
-    book = session.get(BookTable, book_id)
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-    session.delete(book)
-    session.commit()
-    return
+async def delete_book(
+    *, runner: SessionRunner = Depends(get_session_runner), book_id: int
+):
+    await runner.write(_delete_book, book_id)
@@ -1,8 +1,13 @@
 from datetime import date
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlmodel import Session, select
 
-from backend.database import get_session
+from backend.database import (
+    SessionRunner,
+    get_read_session_runner,
+    get_session,
+    get_session_runner,
+)
 from backend.models import (
     CirculationTable,
     CirculationPublic,
@@ -12,7 +17,13 @@ from backend.models import (
     CirculationPublicWithRelationship,
 )
 from ..internals import constants
-from ..internals.table_management import get_paginate_metadata
+from ..internals.query_language import compile_query
+from ..internals.table_export import ExportFormat, export_response
+from ..internals.table_management import (
+    invalidate_row_count,
+    order_clauses,
+    paginate,
+)
 
 router = APIRouter(
     prefix="/circulations",
@@ -20,21 +31,66 @@ router = APIRouter(
 )
 
 
-@router.post("", response_model=CirculationPublic)
-def create_circulation(
-    *, session: Session = Depends(get_session), circulation: CirculationCreate
-):
+def _create_circulation(
+    session: Session, circulation: CirculationCreate
+) -> CirculationTable:
     db_data = CirculationTable.model_validate(circulation)
     session.add(db_data)
     session.commit()
     session.refresh(db_data)
+    invalidate_row_count(session, CirculationTable)
     return db_data
 
 
+def _get_circulation(session: Session, circulation_id: int) -> CirculationTable:
+    circulation = session.get(CirculationTable, circulation_id)
+    if not circulation:
+        raise HTTPException(status_code=404, detail="Circulation not found")
+    return circulation
+
+
+def _read_circulation(
+    session: Session, circulation_id: int
+) -> CirculationPublicWithRelationship:
+    # with its relationships, loaded before the session is closed
+    return CirculationPublicWithRelationship.model_validate(
+        _get_circulation(session, circulation_id)
+    )
+
+
+def _update_circulation(
+    session: Session, circulation_id: int, circulation: CirculationUpdate
+) -> CirculationTable:
+    db_circulation = _get_circulation(session, circulation_id)
+    circulation_data = circulation.model_dump(exclude_unset=True)
+    db_circulation.sqlmodel_update(circulation_data)
+    session.add(db_circulation)
+    session.commit()
+    session.refresh(db_circulation)
+    return db_circulation
+
+
+def _delete_circulation(session: Session, circulation_id: int) -> None:
+    circulation = _get_circulation(session, circulation_id)
+    session.delete(circulation)
+    session.commit()
+    invalidate_row_count(session, CirculationTable)
+
+
+@router.post("", response_model=CirculationPublic)
+async def create_circulation(
+    *,
+    runner: SessionRunner = Depends(get_session_runner),
+    circulation: CirculationCreate,
+):
+    return await runner.write(_create_circulation, circulation)
+
+
 @router.get("", response_model=CirculationsPublic)
-def read_circulations(
+async def read_circulations(
     *,
-    session: Session = Depends(get_session),
+    runner: SessionRunner = Depends(get_read_session_runner),
+    request: Request,
     page: int = Query(
         default=constants.DEFAULT_MINIMAL_VALUE, ge=constants.DEFAULT_MINIMAL_VALUE
     ),
@@ -43,53 +99,85 @@ def read_circulations(
         le=constants.LIMIT_MAXIMAL_VALUE,
         ge=constants.DEFAULT_MINIMAL_VALUE,
     ),
+    sort: str = Query(default=None),
+    cursor: str = Query(default=None),
     borrowed_date_start: date = Query(default=constants.DATE_DEFAULT_START_VALUE),
     borrowed_date_end: date = Query(default=constants.DATE_DEFAULT_END_VALUE),
 ):
-    offset = page * limit - limit
-    circulations = session.exec(
+    """
+    sort: fields separated by commas, "+" (default) ascending, "-" descending,
+    e.g. sort=-borrowed_date,+member_id\n
+    filter[field]: equality filter, repeat it to accept several values,
+    e.g. filter[archived]=false\n
+    Only indexed fields can be sorted and filtered: archived, book_id,
+    borrowed_date, id, member_id.
+    """
+    statement = (
         select(CirculationTable)
         .where(CirculationTable.borrowed_date >= borrowed_date_start)
         .where(CirculationTable.borrowed_date <= borrowed_date_end)
-        .offset(offset)
-        .limit(limit)
-    ).all()
-    metadata = get_paginate_metadata(session, select(CirculationTable), limit)
+    )
+    statement, sort_columns = compile_query(
+        statement, CirculationTable, sort, request.query_params
+    )
+
+    circulations, metadata = await runner.run(
+        paginate, statement, page, limit, cursor=cursor, sort=sort_columns
+    )
 
     return CirculationsPublic(data=circulations, meta=metadata)
 
 
+@router.get("/export")
+def export_circulations(
+    *,
+    session: Session = Depends(get_session),
+    request: Request,
+    format: ExportFormat = Query(default=ExportFormat.ndjson),
+    sort: str = Query(default=None),
+    borrowed_date_start: date = Query(default=None),
+    borrowed_date_end: date = Query(default=None),
+):
+    """
+    Stream all the circulations as NDJSON or CSV.\n
+    Accepts the sort and filter parameters of the list API.
+    """
+    statement = select(CirculationTable)
+    if borrowed_date_start is not None:
+        statement = statement.where(
+            CirculationTable.borrowed_date >= borrowed_date_start
+        )
+    if borrowed_date_end is not None:
+        statement = statement.where(CirculationTable.borrowed_date <= borrowed_date_end)
+    statement, sort_columns = compile_query(
+        statement, CirculationTable, sort, request.query_params
+    )
+    statement = statement.order_by(*order_clauses(sort_columns), CirculationTable.id)
+
+    return export_response(
+        session, statement, CirculationPublic, format, "circulations"
+    )
+
+
 @router.get("/{circulation_id}", response_model=CirculationPublicWithRelationship)
-def read_circulation(*, session: Session = Depends(get_session), circulation_id: int):
-    circulation = session.get(CirculationTable, circulation_id)
-    if not circulation:
-        raise HTTPException(status_code=404, detail="Circulation not found")
-    return circulation
+async def read_circulation(
+    *, runner: SessionRunner = Depends(get_read_session_runner), circulation_id: int
+):
+    return await runner.run(_read_circulation, circulation_id)
 
 
 @router.patch("/{circulation_id}", response_model=CirculationPublic)
-def update_circulation(
+async def update_circulation(
     *,
-    session: Session = Depends(get_session),
+    runner: SessionRunner = Depends(get_session_runner),
     circulation_id: int,
     circulation: CirculationUpdate,
 ):
-    db_circulation = session.get(CirculationTable, circulation_id)
-    if not db_circulation:
-        raise HTTPException(status_code=404, detail="Circulation not found")
-    circulation_data = circulation.model_dump(exclude_unset=True)
-    db_circulation.sqlmodel_update(circulation_data)
-    session.add(db_circulation)
-    session.commit()
-    session.refresh(db_circulation)
-    return db_circulation
+    return await runner.write(_update_circulation, circulation_id, circulation)
 
 
 @router.delete("/{circulation_id}", status_code=204)
-def delete_circulation(*, session: Session = Depends(get_session), circulation_id: int):
-    circulation = session.get(CirculationTable, circulation_id)
-    if not circulation:
-        raise HTTPException(status_code=404, detail="Circulation not found")
-    session.delete(circulation)
-    session.commit()
-    return
+async def delete_circulation(
+    *, runner: SessionRunner = Depends(get_session_runner), circulation_id: int
+):
+    await runner.write(_delete_circulation, circulation_id)
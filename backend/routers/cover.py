@@ -0,0 +1,64 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from httpx import AsyncClient
+from sqlmodel import Session, select
+from typing import Optional
+from typing_extensions import Annotated
+
+import re
+
+from backend.database import SessionRunner, get_read_session_runner
+from backend.models import BookTable
+from ..internals import constants
+from ..internals.cover_store import CoverStore, get_cover_store
+from ..internals.http_client import get_http_client
+
+router = APIRouter(
+    prefix="/covers",
+    tags=["covers"],
+)
+
+THUMBNAIL_NAME = re.compile(r"(?P<digest>[0-9a-f]{64})-(?P<size>\d+)\.webp")
+
+
+def _read_cover_url(session: Session, digest: str) -> Optional[str]:
+    return session.exec(
+        select(BookTable.cover)
+        .where(BookTable.cover_hash == digest, BookTable.cover.is_not(None))
+        .limit(1)
+    ).first()
+
+
+@router.get("/{name}", response_class=FileResponse)
+async def read_cover(
+    *,
+    runner: SessionRunner = Depends(get_read_session_runner),
+    cover_store: Annotated[Optional[CoverStore], Depends(get_cover_store)],
+    client: Annotated[Optional[AsyncClient], Depends(get_http_client)],
+    name: str,
+):
+    """
+    Cover thumbnail <cover_hash>-<size>.webp of a book, size in 128, 256, 512
+    """
+    match = THUMBNAIL_NAME.fullmatch(name)
+    if (
+        cover_store is None
+        or match is None
+        or int(match["size"]) not in constants.COVER_THUMBNAIL_SIZES
+    ):
+        raise HTTPException(status_code=404, detail="Cover not found")
+
+    digest = match["digest"]
+    path = cover_store.path(digest, int(match["size"]))
+    if not path.is_file():
+        # e.g. stored by another node, made again from the cover of its book
+        url = await runner.run(_read_cover_url, digest)
+        if url is None or not await cover_store.restore(digest, url, client):
+            raise HTTPException(status_code=404, detail="Cover not found")
+
+    # named by their content, the thumbnails never change
+    return FileResponse(
+        path,
+        media_type="image/webp",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
@@ -1,7 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+)
 from sqlmodel import Session, select
 
-from backend.database import get_session
+from backend.database import (
+    SessionRunner,
+    get_read_session_runner,
+    get_session_runner,
+)
 from backend.models import (
     FamilyTable,
     FamilyPublic,
@@ -9,9 +21,15 @@ from backend.models import (
     FamilyCreate,
     FamilyUpdate,
     FamilyPublicWithMembers,
+    BulkImportReport,
 )
 from ..internals import constants
-from ..internals.table_management import get_paginate_metadata
+from ..internals.bulk_import import import_rows, parse_rows
+from ..internals.query_language import compile_query
+from ..internals.table_management import (
+    invalidate_row_count,
+    paginate,
+)
 
 router = APIRouter(
     prefix="/families",
@@ -19,19 +37,74 @@ router = APIRouter(
 )
 
 
-@router.post("", response_model=FamilyPublic)
-def create_family(*, session: Session = Depends(get_session), family: FamilyCreate):
+def _create_family(session: Session, family: FamilyCreate) -> FamilyTable:
     db_data = FamilyTable.model_validate(family)
     session.add(db_data)
     session.commit()
     session.refresh(db_data)
+    invalidate_row_count(session, FamilyTable)
     return db_data
 
 
+def _get_family(session: Session, family_id: int) -> FamilyTable:
+    family = session.get(FamilyTable, family_id)
+    if not family:
+        raise HTTPException(status_code=404, detail="Family not found")
+    return family
+
+
+def _read_family(session: Session, family_id: int) -> FamilyPublicWithMembers:
+    # with its relationships, loaded before the session is closed
+    return FamilyPublicWithMembers.model_validate(_get_family(session, family_id))
+
+
+def _update_family(
+    session: Session, family_id: int, family: FamilyUpdate
+) -> FamilyTable:
+    db_family = _get_family(session, family_id)
+    family_data = family.model_dump(exclude_unset=True)
+    db_family.sqlmodel_update(family_data)
+    session.add(db_family)
+    session.commit()
+    session.refresh(db_family)
+    return db_family
+
+
+def _delete_family(session: Session, family_id: int) -> None:
+    family = _get_family(session, family_id)
+    session.delete(family)
+    session.commit()
+    invalidate_row_count(session, FamilyTable)
+
+
+@router.post("", response_model=FamilyPublic)
+async def create_family(
+    *, runner: SessionRunner = Depends(get_session_runner), family: FamilyCreate
+):
+    return await runner.write(_create_family, family)
+
+
+@router.post("/bulk", response_model=BulkImportReport)
+async def bulk_create_families(
+    *,
+    runner: SessionRunner = Depends(get_session_runner),
+    body: bytes = Body(media_type="application/x-ndjson"),
+    content_type: str = Header(default=None),
+):
+    """
+    Create families from an NDJSON (application/x-ndjson) or CSV (text/csv)
+    body, one family per line. Rows that can't be created are reported
+    in errors, the others are created.
+    """
+    rows = parse_rows(body, content_type)
+    return await import_rows(runner, FamilyTable, FamilyCreate, rows)
+
+
 @router.get("", response_model=FamiliesPublic)
-def read_families(
+async def read_families(
     *,
-    session: Session = Depends(get_session),
+    runner: SessionRunner = Depends(get_read_session_runner),
+    request: Request,
     page: int = Query(
         default=constants.DEFAULT_MINIMAL_VALUE, ge=constants.DEFAULT_MINIMAL_VALUE
     ),
@@ -40,42 +113,53 @@ def read_families(
         le=constants.LIMIT_MAXIMAL_VALUE,
         ge=constants.DEFAULT_MINIMAL_VALUE,
     ),
+    sort: str = Query(default=None),
+    cursor: str = Query(default=None),
 ):
-    offset = page * limit - limit
-    families = session.exec(select(FamilyTable).offset(offset).limit(limit)).all()
-    metadata = get_paginate_metadata(session, select(FamilyTable), limit)
+    """
+    sort: fields separated by commas, "+" (default) ascending, "-" descending,
+    e.g. sort=-id\n
+    filter[field]: equality filter, repeat it to accept several values,
+    e.g. filter[archived]=false\n
+    Only indexed fields can be sorted and filtered: archived, id.
+    """
+    statement, sort_columns = compile_query(
+        select(FamilyTable), FamilyTable, sort, request.query_params
+    )
+    cached_table = FamilyTable if statement.whereclause is None else None
+
+    families, metadata = await runner.run(
+        paginate,
+        statement,
+        page,
+        limit,
+        cached_table=cached_table,
+        cursor=cursor,
+        sort=sort_columns,
+    )
 
     return FamiliesPublic(data=families, meta=metadata)
 
 
 @router.get("/{family_id}", response_model=FamilyPublicWithMembers)
-def read_family(*, session: Session = Depends(get_session), family_id: int):
-    family = session.get(FamilyTable, family_id)
-    if not family:
-        raise HTTPException(status_code=404, detail="Family not found")
-    return family
+async def read_family(
+    *, runner: SessionRunner = Depends(get_read_session_runner), family_id: int
+):
+    return await runner.run(_read_family, family_id)
 
 
 @router.patch("/{family_id}", response_model=FamilyPublic)
-def update_family(
-    *, session: Session = Depends(get_session), family_id: int, family: FamilyUpdate
+async def update_family(
+    *,
+    runner: SessionRunner = Depends(get_session_runner),
+    family_id: int,
+    family: FamilyUpdate,
 ):
-    db_family = session.get(FamilyTable, family_id)
-    if not db_family:
-        raise HTTPException(status_code=404, detail="Family not found")
-    family_data = family.model_dump(exclude_unset=True)
-    db_family.sqlmodel_update(family_data)
-    session.add(db_family)
-    session.commit()
-    session.refresh(db_family)
-    return db_family
+    return await runner.write(_update_family, family_id, family)
 
 
 @router.delete("/{family_id}", status_code=204)
-def delete_family(*, session: Session = Depends(get_session), family_id: int):
-    family = session.get(FamilyTable, family_id)
-    if not family:
-        raise HTTPException(status_code=404, detail="Family not found")
-    session.delete(family)
-    session.commit()
-    return
+async def delete_family(
+    *, runner: SessionRunner = Depends(get_session_runner), family_id: int
+):
+    await runner.write(_delete_family, family_id)
@@ -1,7 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, select
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+)
+from sqlmodel import Session, or_, select
 
-from backend.database import get_session
+from backend.database import (
+    SessionRunner,
+    get_read_session_runner,
+    get_session,
+    get_session_runner,
+)
 from backend.models import (
     MemberTable,
     MemberPublic,
@@ -9,9 +22,18 @@ from backend.models import (
     MemberCreate,
     MemberUpdate,
     MemberPublicWithFamily,
+    BulkImportReport,
 )
 from ..internals import constants
-from ..internals.table_management import get_paginate_metadata
+from ..internals.bulk_import import import_rows, parse_rows
+from ..internals.query_language import compile_query
+from ..internals.table_export import ExportFormat, export_response
+from ..internals.table_management import (
+    invalidate_row_count,
+    order_clauses,
+    normalized_prefix_condition,
+    paginate,
+)
 
 router = APIRouter(
     prefix="/members",
@@ -19,19 +41,74 @@ router = APIRouter(
 )
 
 
-@router.post("", response_model=MemberPublic)
-def create_member(*, session: Session = Depends(get_session), member: MemberCreate):
+def _create_member(session: Session, member: MemberCreate) -> MemberTable:
     db_data = MemberTable.model_validate(member)
     session.add(db_data)
     session.commit()
     session.refresh(db_data)
+    invalidate_row_count(session, MemberTable)
     return db_data
 
 
+def _get_member(session: Session, member_id: int) -> MemberTable:
+    member = session.get(MemberTable, member_id)
+    if not member:
+        raise HTTPException(status_code=404, detail="Member not found")
+    return member
+
+
+def _read_member(session: Session, member_id: int) -> MemberPublicWithFamily:
+    # with its relationships, loaded before the session is closed
+    return MemberPublicWithFamily.model_validate(_get_member(session, member_id))
+
+
+def _update_member(
+    session: Session, member_id: int, member: MemberUpdate
+) -> MemberTable:
+    db_member = _get_member(session, member_id)
+    member_data = member.model_dump(exclude_unset=True)
+    db_member.sqlmodel_update(member_data)
+    session.add(db_member)
+    session.commit()
+    session.refresh(db_member)
+    return db_member
+
+
+def _delete_member(session: Session, member_id: int) -> None:
+    member = _get_member(session, member_id)
+    session.delete(member)
+    session.commit()
+    invalidate_row_count(session, MemberTable)
+
+
+@router.post("", response_model=MemberPublic)
+async def create_member(
+    *, runner: SessionRunner = Depends(get_session_runner), member: MemberCreate
+):
+    return await runner.write(_create_member, member)
+
+
+@router.post("/bulk", response_model=BulkImportReport)
+async def bulk_create_members(
+    *,
+    runner: SessionRunner = Depends(get_session_runner),
+    body: bytes = Body(media_type="application/x-ndjson"),
+    content_type: str = Header(default=None),
+):
+    """
+    Create members from an NDJSON (application/x-ndjson) or CSV (text/csv)
+    body, one member per line. Rows that can't be created are reported
+    in errors, the others are created.
+    """
+    rows = parse_rows(body, content_type)
+    return await import_rows(runner, MemberTable, MemberCreate, rows)
+
+
 @router.get("", response_model=MembersPublic)
-def read_members(
+async def read_members(
     *,
-    session: Session = Depends(get_session),
+    runner: SessionRunner = Depends(get_read_session_runner),
+    request: Request,
     page: int = Query(
         default=constants.DEFAULT_MINIMAL_VALUE, ge=constants.DEFAULT_MINIMAL_VALUE
     ),
@@ -40,42 +117,83 @@ def read_members(
         le=constants.LIMIT_MAXIMAL_VALUE,
         ge=constants.DEFAULT_MINIMAL_VALUE,
     ),
+    search: str = Query(default=None),
+    sort: str = Query(default=None),
+    cursor: str = Query(default=None),
 ):
-    offset = page * limit - limit
-    members = session.exec(select(MemberTable).offset(offset).limit(limit)).all()
-    metadata = get_paginate_metadata(session, select(MemberTable), limit)
+    """
+    sort: fields separated by commas, "+" (default) ascending, "-" descending,
+    e.g. sort=+family_id,-id\n
+    filter[field]: equality filter, repeat it to accept several values,
+    e.g. filter[archived]=false\n
+    Only indexed fields can be sorted and filtered: archived, family_id, id.\n
+    search: firstname or surname starting with it, case, accents, spaces and
+    dashes ignored
+    """
+    statement, sort_columns = compile_query(
+        select(MemberTable), MemberTable, sort, request.query_params
+    )
+    if search is not None:
+        statement = statement.where(
+            or_(
+                normalized_prefix_condition(MemberTable, "firstname", search),
+                normalized_prefix_condition(MemberTable, "surname", search),
+            )
+        )
+    cached_table = MemberTable if statement.whereclause is None else None
+
+    members, metadata = await runner.run(
+        paginate,
+        statement,
+        page,
+        limit,
+        cached_table=cached_table,
+        cursor=cursor,
+        sort=sort_columns,
+    )
 
     return MembersPublic(data=members, meta=metadata)
 
 
+@router.get("/export")
+def export_members(
+    *,
+    session: Session = Depends(get_session),
+    request: Request,
+    format: ExportFormat = Query(default=ExportFormat.ndjson),
+    sort: str = Query(default=None),
+):
+    """
+    Stream all the members as NDJSON or CSV.\n
+    Accepts the sort and filter parameters of the list API.
+    """
+    statement, sort_columns = compile_query(
+        select(MemberTable), MemberTable, sort, request.query_params
+    )
+    statement = statement.order_by(*order_clauses(sort_columns), MemberTable.id)
+
+    return export_response(session, statement, MemberPublic, format, "members")
+
+
 @router.get("/{member_id}", response_model=MemberPublicWithFamily)
-def read_member(*, session: Session = Depends(get_session), member_id: int):
-    member = session.get(MemberTable, member_id)
-    if not member:
-        raise HTTPException(status_code=404, detail="Member not found")
-    return member
+async def read_member(
+    *, runner: SessionRunner = Depends(get_read_session_runner), member_id: int
+):
+    return await runner.run(_read_member, member_id)
 
 
 @router.patch("/{member_id}", response_model=MemberPublic)
-def update_member(
-    *, session: Session = Depends(get_session), member_id: int, member: MemberUpdate
+async def update_member(
+    *,
+    runner: SessionRunner = Depends(get_session_runner),
+    member_id: int,
+    member: MemberUpdate,
 ):
-    db_member = session.get(MemberTable, member_id)
-    if not db_member:
-        raise HTTPException(status_code=404, detail="Member not found")
-    member_data = member.model_dump(exclude_unset=True)
-    db_member.sqlmodel_update(member_data)
-    session.add(db_member)
-    session.commit()
-    session.refresh(db_member)
-    return db_member
+    return await runner.write(_update_member, member_id, member)
 
 
 @router.delete("/{member_id}", status_code=204)
-def delete_member(*, session: Session = Depends(get_session), member_id: int):
-    member = session.get(MemberTable, member_id)
-    if not member:
-        raise HTTPException(status_code=404, detail="Member not found")
-    session.delete(member)
-    session.commit()
-    return
+async def delete_member(
+    *, runner: SessionRunner = Depends(get_session_runner), member_id: int
+):
+    await runner.write(_delete_member, member_id)
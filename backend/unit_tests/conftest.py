@@ -1,31 +1,151 @@
 # conftest.py
 # see https://gist.github.com/peterhurford/09f7dcda0ab04b95c026c60fa49c2a68 to introdue modularity
+import asyncio
+import httpx
 import pytest
 
 from fastapi.testclient import TestClient
-from sqlmodel import Session, SQLModel, create_engine
-from sqlmodel.pool import StaticPool
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from backend.database import get_session
+from backend.database import (
+    DatabaseSettings,
+    enable_storage_profile,
+    get_async_read_session,
+    get_async_session,
+    get_database_settings,
+    get_read_session,
+    get_session,
+)
+from backend import main
+from backend.internals.cover_store import CoverStoreSettings
+from backend.internals.migrations import migrate
+from backend.internals.provider_health import provider_health
+from backend.internals.provider_scheduler import provider_scheduler
 from backend.main import app
 
 
+@pytest.fixture(name="database_path")
+def database_path_fixture(tmp_path):
+    """Database file shared by the sync and async engines of a test"""
+    return tmp_path / "test.db"
+
+
 @pytest.fixture(name="session")
-def session_fixture():
+def session_fixture(database_path):
     engine = create_engine(
-        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        f"sqlite:///{database_path}", connect_args={"check_same_thread": False}
     )
-    SQLModel.metadata.create_all(engine)
+    enable_storage_profile(engine, DatabaseSettings())
+    migrate(engine)
     with Session(engine) as session:
         yield session
+    engine.dispose()
+
+
+@pytest.fixture(name="database_settings")
+def database_settings_fixture():
+    return DatabaseSettings(async_sessions=True)
 
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: Session, database_path, database_settings):
+    # each request of the test client runs in its own event loop,
+    # the aiosqlite connections can't be pooled across them
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{database_path}", poolclass=NullPool
+    )
+    read_url = f"file:{database_path}?mode=ro&uri=true"
+    read_engine = create_engine(
+        f"sqlite:///{read_url}", connect_args={"check_same_thread": False}
+    )
+    async_read_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{read_url}", poolclass=NullPool
+    )
+    for engine in (
+        read_engine,
+        async_engine.sync_engine,
+        async_read_engine.sync_engine,
+    ):
+        enable_storage_profile(engine, database_settings)
+
     def get_session_override():
         return session
 
+    async def get_async_session_override():
+        async with AsyncSession(async_engine, expire_on_commit=False) as session:
+            yield session
+
+    def get_read_session_override():
+        with Session(read_engine) as session:
+            yield session
+
+    async def get_async_read_session_override():
+        async with AsyncSession(async_read_engine) as session:
+            yield session
+
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_async_session] = get_async_session_override
+    app.dependency_overrides[get_read_session] = get_read_session_override
+    app.dependency_overrides[get_async_read_session] = get_async_read_session_override
+    app.dependency_overrides[get_database_settings] = lambda: database_settings
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
+    read_engine.dispose()
+
+
+@pytest.fixture(name="lifespan")
+def lifespan_fixture(client, session: Session, database_path, tmp_path, monkeypatch):
+    """Run `requests(http_client, write_coordinator)` in the lifespan of the
+    application, on the database of the test
+
+    The requests can be concurrent, the writes of the routes go through the
+    write coordinator started by the lifespan.
+    """
+    monkeypatch.setattr(main, "create_db_and_tables", lambda: None)
+    monkeypatch.setattr(main, "global_engine", session.get_bind())
+    monkeypatch.setattr(main, "sqlite_url", f"sqlite:///{database_path}")
+    monkeypatch.setattr(
+        main, "get_database_settings", lambda: DatabaseSettings(foreign_keys=True)
+    )
+    monkeypatch.setattr(
+        main,
+        "get_cover_store_settings",
+        lambda: CoverStoreSettings(directory=tmp_path / "covers"),
+    )
+
+    async def run_in_lifespan(requests):
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(
+                transport=transport, base_url="http://testserver"
+            ) as http_client:
+                return await requests(http_client, app.state.write_coordinator)
+
+    def run(requests):
+        try:
+            return asyncio.run(run_in_lifespan(requests))
+        finally:
+            # the other tests run without the lifespan
+            for name in (
+                "write_coordinator",
+                "http_client",
+                "cover_store",
+                "enrichment_queue",
+            ):
+                if hasattr(app.state, name):
+                    delattr(app.state, name)
+
+    return run
+
+
+@pytest.fixture(autouse=True)
+def provider_health_fixture():
+    """Start every test with closed circuits, full token buckets and the
+    default provider order"""
+    provider_health.reset()
+    provider_scheduler.reset()
+    yield provider_health
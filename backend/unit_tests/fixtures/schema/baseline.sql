@@ -0,0 +1,78 @@
+-- Schema of the databases created by the baseline release
+CREATE TABLE user (
+	id CHAR(32) NOT NULL,
+	email VARCHAR NOT NULL,
+	hashed_password VARCHAR NOT NULL,
+	is_active BOOLEAN NOT NULL,
+	is_superuser BOOLEAN NOT NULL,
+	is_verified BOOLEAN NOT NULL,
+	PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_user_email ON user (email);
+CREATE TABLE booktable (
+	archived BOOLEAN NOT NULL,
+	created_date DATE,
+	last_update_date DATE,
+	title VARCHAR NOT NULL,
+	author VARCHAR NOT NULL,
+	abstract VARCHAR,
+	publisher VARCHAR,
+	catalog VARCHAR,
+	category_type VARCHAR,
+	category_age VARCHAR,
+	category_topics VARCHAR,
+	language VARCHAR,
+	cover VARCHAR,
+	available BOOLEAN NOT NULL,
+	isbn INTEGER,
+	format VARCHAR,
+	publication_date VARCHAR,
+	record_source VARCHAR,
+	id INTEGER NOT NULL,
+	PRIMARY KEY (id)
+);
+CREATE INDEX ix_booktable_author ON booktable (author);
+CREATE INDEX ix_booktable_catalog ON booktable (catalog);
+CREATE INDEX ix_booktable_title ON booktable (title);
+CREATE INDEX ix_booktable_available ON booktable (available);
+CREATE INDEX ix_booktable_archived ON booktable (archived);
+CREATE INDEX ix_booktable_category_age ON booktable (category_age);
+CREATE INDEX ix_booktable_category_type ON booktable (category_type);
+CREATE TABLE familytable (
+	archived BOOLEAN NOT NULL,
+	created_date DATE,
+	last_update_date DATE,
+	email VARCHAR,
+	phone_number VARCHAR,
+	id INTEGER NOT NULL,
+	PRIMARY KEY (id)
+);
+CREATE INDEX ix_familytable_archived ON familytable (archived);
+CREATE TABLE membertable (
+	archived BOOLEAN NOT NULL,
+	created_date DATE,
+	last_update_date DATE,
+	family_referent BOOLEAN NOT NULL,
+	firstname VARCHAR NOT NULL,
+	surname VARCHAR NOT NULL,
+	birthdate DATE,
+	family_id INTEGER,
+	id INTEGER NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(family_id) REFERENCES familytable (id)
+);
+CREATE INDEX ix_membertable_archived ON membertable (archived);
+CREATE TABLE circulationtable (
+	archived BOOLEAN NOT NULL,
+	created_date DATE,
+	last_update_date DATE,
+	borrowed_date DATE NOT NULL,
+	returned_date DATE,
+	book_id INTEGER NOT NULL,
+	member_id INTEGER NOT NULL,
+	id INTEGER NOT NULL,
+	PRIMARY KEY (id),
+	FOREIGN KEY(book_id) REFERENCES booktable (id),
+	FOREIGN KEY(member_id) REFERENCES membertable (id)
+);
+CREATE INDEX ix_circulationtable_archived ON circulationtable (archived);
@@ -0,0 +1,109 @@
+from fastapi.testclient import TestClient
+import json
+
+
+def post_bulk(client: TestClient, content: str, content_type: str):
+    return client.post(
+        "/api/v1/books/bulk", content=content, headers={"content-type": content_type}
+    )
+
+
+def test_bulk_create_book_ndjson(client: TestClient) -> None:
+    rows = [{"title": f"title {index}", "author": "author"} for index in range(2500)]
+    content = "\n".join(json.dumps(row) for row in rows)
+
+    response = post_bulk(client, content, "application/x-ndjson")
+    assert response.status_code == 200
+    assert response.json() == {"inserted": 2500, "errors": [], "ignored_columns": []}
+
+    response = client.get("/api/v1/books?limit=1&sort=-id")
+    assert response.json()["meta"]["total_items"] == 2500
+    assert response.json()["data"][0]["title"] == "title 2499"
+
+
+def test_bulk_create_book_csv(client: TestClient) -> None:
+    content = (
+        "title,author,available,isbn,language\n"
+        "Vol de nuit,Antoine de Saint-Exupéry,false,9782070360123,fr\n"
+        '"Title, with comma",author,,,\n'
+    )
+
+    response = post_bulk(client, content, "text/csv; charset=utf-8")
+    assert response.status_code == 200
+    assert response.json() == {"inserted": 2, "errors": [], "ignored_columns": []}
+
+    books = client.get("/api/v1/books").json()["data"]
+    assert books[0]["available"] is False
+    assert books[0]["isbn"] == 9782070360123
+    assert books[1]["title"] == "Title, with comma"
+    assert books[1]["available"] is True
+    assert books[1]["language"] is None
+
+    # normalized columns are filled for searches
+    response = client.get("/api/v1/books?search=vol de")
+    assert [book["title"] for book in response.json()["data"]] == ["Vol de nuit"]
+    response = client.get("/api/v1/books/search?q=exupery")
+    assert [book["title"] for book in response.json()["data"]] == ["Vol de nuit"]
+
+
+def test_bulk_create_book_with_errors(client: TestClient) -> None:
+    content = "\n".join(
+        [
+            '{"title": "first", "author": "author"}',
+            '{"title": "missing author"}',
+            "not json",
+            "",
+            '["not", "an object"]',
+            '{"title": "last", "author": "author", "isbn": -1}',
+            '{"title": "second", "author": "author"}',
+        ]
+    )
+
+    response = post_bulk(client, content, "application/x-ndjson")
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 2
+    assert [error["row"] for error in report["errors"]] == [2, 3, 5, 6]
+    assert "author" in report["errors"][0]["detail"]
+    assert "isbn" in report["errors"][3]["detail"]
+
+    books = client.get("/api/v1/books").json()["data"]
+    assert [book["title"] for book in books] == ["first", "second"]
+
+
+def test_bulk_create_book_unsupported_content_type(client: TestClient) -> None:
+    response = post_bulk(client, "<books/>", "application/xml")
+    assert response.status_code == 415
+    assert "detail" in response.json()
+
+
+def test_bulk_create_book_latin1_csv(client: TestClient) -> None:
+    content = "title,author\nÉlectre,Jean Giraudoux\n".encode("latin-1")
+
+    response = post_bulk(client, content, "text/csv")
+    assert response.status_code == 400
+    assert "utf-8" in response.json()["detail"]
+
+    response = post_bulk(client, content, "text/csv; charset=latin-1")
+    assert response.status_code == 200
+    assert response.json()["inserted"] == 1
+    assert client.get("/api/v1/books").json()["data"][0]["title"] == "Électre"
+
+    response = post_bulk(client, content, "text/csv; charset=unknown")
+    assert response.status_code == 415
+
+
+def test_bulk_create_book_extra_csv_columns(client: TestClient) -> None:
+    content = (
+        "title,author,shelf\n"
+        "Vol de nuit,Antoine de Saint-Exupéry,A2\n"
+        "Terre des hommes,Antoine de Saint-Exupéry,A3,extra\n"
+    )
+
+    response = post_bulk(client, content, "text/csv")
+    assert response.status_code == 200
+    assert response.json() == {
+        "inserted": 1,
+        "errors": [{"row": 2, "detail": "1 more cells than columns"}],
+        "ignored_columns": ["shelf"],
+    }
@@ -0,0 +1,200 @@
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+import asyncio
+import pytest
+import time
+
+from backend.config import Settings, get_settings
+from backend.internals import constants, enrichment, isbn_cache
+from backend.internals.enrichment import EnrichmentQueue, create_job, run_job
+from backend.internals.isbn_cache import IsbnCacheSettings
+from backend.main import app
+from backend.models import BookCreate, BookTable
+
+SETTINGS = Settings(
+    admin_email="admin@example.com",
+    google_api_key="key",
+    google_custom_search_engine="engine",
+)
+
+
+@pytest.fixture(name="lookups")
+def lookups_fixture(monkeypatch):
+    """Replace the providers lookup, return the looked up ISBNs"""
+    lookups = []
+    app.dependency_overrides[get_settings] = lambda: SETTINGS
+    monkeypatch.setattr(enrichment, "get_settings", lambda: SETTINGS)
+
+    async def isbn2book(isbn, settings, limits=None, client=None, failures=None):
+        lookups.append(isbn)
+        await asyncio.sleep(0.01)
+        if isbn == "9782070438617":
+            return BookCreate(title="L'Étranger", author="Albert Camus", isbn=isbn)
+        if isbn == "9780738531366":
+            failures.append("bnf")
+        return None
+
+    monkeypatch.setattr(isbn_cache, "isbn2book", isbn2book)
+    yield lookups
+
+
+def test_create_book_isbn(client: TestClient, lookups: list) -> None:
+    response = client.post("/api/v1/books/978-2070438617")
+    assert response.status_code == 202
+    job = response.json()
+    assert job["isbn"] == "9782070438617"
+
+    response = client.get(f"/api/v1/books/{job['book_id']}/enrichment")
+    assert response.status_code == 200
+    assert response.json()["status"] == "done"
+    assert response.json()["attempts"] == 1
+
+    response = client.get(f"/api/v1/books/{job['book_id']}")
+    assert response.json()["title"] == "L'Étranger"
+    assert response.json()["author"] == "Albert Camus"
+    assert response.json()["isbn"] == 9782070438617
+
+    # searchable by the title found
+    response = client.get("/api/v1/books", params={"search": "l'etranger"})
+    assert response.json()["meta"]["total_items"] == 1
+
+
+def test_create_book_isbn_not_found(client: TestClient, lookups: list) -> None:
+    response = client.post("/api/v1/books/9782253067900")
+    book_id = response.json()["book_id"]
+    response = client.get(f"/api/v1/books/{book_id}/enrichment")
+    assert response.json()["status"] == "not_found"
+
+    # the book is kept with its ISBN as title
+    response = client.get(f"/api/v1/books/{book_id}")
+    assert response.json()["title"] == "9782253067900"
+
+
+def test_create_book_isbn_failure(client: TestClient, lookups: list) -> None:
+    response = client.post("/api/v1/books/not-an-isbn")
+    assert response.status_code == 400
+    assert client.get("/api/v1/books").json()["meta"]["total_items"] == 0
+
+    response = client.post("/api/v1/books", json={"title": "t", "author": "a"})
+    response = client.get(f"/api/v1/books/{response.json()['id']}/enrichment")
+    assert response.status_code == 404
+
+
+def test_job_retried_while_providers_fail(session: Session, lookups: list) -> None:
+    engine = session.get_bind()
+    job = create_job(session, "9780738531366")
+
+    statuses = [
+        asyncio.run(run_job(engine, job.id, SETTINGS, IsbnCacheSettings()))
+        for _ in range(constants.ENRICHMENT_MAXIMAL_ATTEMPTS)
+    ]
+    assert statuses == ["pending"] * (constants.ENRICHMENT_MAXIMAL_ATTEMPTS - 1) + [
+        "failed"
+    ]
+    # finished jobs are not run again
+    assert asyncio.run(run_job(engine, job.id, SETTINGS, IsbnCacheSettings())) is None
+    assert len(lookups) == constants.ENRICHMENT_MAXIMAL_ATTEMPTS
+
+    session.refresh(job)
+    assert job.attempts == constants.ENRICHMENT_MAXIMAL_ATTEMPTS
+    assert job.error == "Providers failed: bnf"
+
+
+def test_job_of_deleted_book(session: Session, lookups: list) -> None:
+    job = create_job(session, "9782070438617")
+    session.delete(session.get(BookTable, job.book_id))
+    session.commit()
+
+    status = asyncio.run(
+        run_job(session.get_bind(), job.id, SETTINGS, IsbnCacheSettings())
+    )
+    assert status == "failed"
+    session.refresh(job)
+    assert job.error == "Book deleted"
+
+
+def test_queue_resumes_unfinished_jobs(session: Session, lookups: list) -> None:
+    engine = session.get_bind()
+    jobs = [create_job(session, "9782070438617") for _ in range(3)]
+    # interrupted by a restart
+    jobs[1].status = "running"
+    session.add(jobs[1])
+    session.commit()
+
+    async def main():
+        queue = EnrichmentQueue(engine, workers=2)
+        queue.start()
+        try:
+            await asyncio.gather(*(queue.wait(job.id, 5) for job in jobs))
+        finally:
+            await queue.stop()
+
+    asyncio.run(main())
+    for job in jobs:
+        session.refresh(job)
+        assert job.status == "done"
+        book = session.get(BookTable, job.book_id)
+        session.refresh(book)
+        assert book.title == "L'Étranger"
+    # two jobs at a time, the third one reads the cache
+    assert len(lookups) == 2
+
+
+def test_queue_wait_timeout(session: Session, lookups: list) -> None:
+    job = create_job(session, "9782070438617")
+
+    async def main():
+        queue = EnrichmentQueue(session.get_bind())
+        queue.start()
+        try:
+            # taken off the queue, the waits time out
+            queue._queue.get_nowait()
+            await asyncio.gather(queue.wait(job.id, 0.01), queue.wait(job.id, 0.02))
+            assert queue._finished == {}
+            assert queue._waiters == {}
+        finally:
+            await queue.stop()
+
+    asyncio.run(main())
+    session.refresh(job)
+    assert job.status == "pending"
+    assert lookups == []
+
+
+def test_queue_wait_not_started(session: Session, lookups: list) -> None:
+    job = create_job(session, "9782070438617")
+
+    async def main():
+        # e.g. on a LiteFS replica
+        queue = EnrichmentQueue(session.get_bind())
+        queue.submit(job.id)
+        start = time.monotonic()
+        await queue.wait(job.id, 5)
+        assert time.monotonic() - start < 1
+        assert queue._finished == {}
+
+    asyncio.run(main())
+    session.refresh(job)
+    assert job.status == "pending"
+    assert lookups == []
+
+
+def test_queue_wait_for_finished_job(session: Session, lookups: list) -> None:
+    job = create_job(session, "9782070438617")
+
+    async def main():
+        queue = EnrichmentQueue(session.get_bind())
+        queue.start()
+        try:
+            # finished before the wait, e.g. between the read of the job and it
+            await run_job(
+                session.get_bind(), job.id, SETTINGS, IsbnCacheSettings(), queue.limits
+            )
+            start = time.monotonic()
+            await queue.wait(job.id, 5)
+            assert time.monotonic() - start < 1
+            assert queue._finished == {}
+        finally:
+            await queue.stop()
+
+    asyncio.run(main())
@@ -0,0 +1,60 @@
+from fastapi.testclient import TestClient
+import csv
+import json
+
+from .test_book_read_all import add_a_lot_of_elements
+
+
+def test_export_book_without_book(client: TestClient) -> None:
+    response = client.get("/api/v1/books/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert response.text == ""
+
+    response = client.get("/api/v1/books/export?format=csv")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[0].startswith("archived,created_date")
+
+
+def test_export_book_ndjson(client: TestClient) -> None:
+    book_list = add_a_lot_of_elements(client, 1234)
+
+    response = client.get("/api/v1/books/export")
+    assert response.status_code == 200
+    assert 'filename="books.ndjson"' in response.headers["content-disposition"]
+    assert [json.loads(line) for line in response.text.splitlines()] == book_list
+
+
+def test_export_book_csv(client: TestClient) -> None:
+    book_list = add_a_lot_of_elements(client, 3, {"isbn": 9782070438617})
+    book_list += add_a_lot_of_elements(client, 2, {"abstract": 'with "quotes", commas'})
+
+    response = client.get("/api/v1/books/export?format=csv")
+    assert response.status_code == 200
+    rows = list(csv.DictReader(response.text.splitlines()))
+    assert len(rows) == 5
+    assert [int(row["id"]) for row in rows] == [book["id"] for book in book_list]
+    assert rows[0]["isbn"] == "9782070438617"
+    assert rows[0]["created_date"] == ""
+    assert rows[4]["abstract"] == 'with "quotes", commas'
+    assert rows[4]["available"] == "False"
+
+
+def test_export_book_sorted_and_filtered(client: TestClient) -> None:
+    book_list = add_a_lot_of_elements(client, 2, {"available": True, "title": "a"})
+    book_list += add_a_lot_of_elements(client, 2, {"available": True, "title": "b"})
+    add_a_lot_of_elements(client, 2, {"available": False})
+
+    response = client.get("/api/v1/books/export?filter[available]=true&sort=-title")
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == book_list[2:] + book_list[:2]
+
+
+def test_export_book_failure(client: TestClient) -> None:
+    response = client.get("/api/v1/books/export?format=xml")
+    assert response.status_code == 422
+
+    response = client.get("/api/v1/books/export?sort=abstract")
+    assert response.status_code == 400
@@ -0,0 +1,210 @@
+from fastapi.testclient import TestClient
+from io import BytesIO
+from pathlib import Path
+from PIL import Image
+import asyncio
+import httpx
+import isbnlib
+import json
+import pytest
+
+from backend.config import Settings, get_settings
+from backend.internals import isbn_cache
+from backend.internals.book_notice import ProviderLimits, _query_provider
+from backend.internals.http_client import get_http_client
+from backend.main import app
+from backend.models import BookCreate
+
+KNOWN_ISBNS = {"9782070438617": "L'Étranger", "9782253067900": "Le Horla"}
+BNF_SRU_BATCH = Path(__file__).parent / "fixtures" / "bnf" / "sru_batch.xml"
+
+
+async def no_bnf_batch(isbns, client=None):
+    return {}
+
+
+@pytest.fixture(name="settings")
+def settings_fixture():
+    settings = Settings(
+        admin_email="admin@example.com",
+        google_api_key="key",
+        google_custom_search_engine="engine",
+    )
+    app.dependency_overrides[get_settings] = lambda: settings
+    yield settings
+
+
+@pytest.fixture(name="lookups")
+def lookups_fixture(monkeypatch):
+    """Replace the providers lookup, return the looked up ISBNs"""
+    lookups = []
+
+    async def isbn2book(isbn, settings, limits=None, client=None, failures=None):
+        lookups.append(isbn)
+        await asyncio.sleep(0)
+        if isbn == "9780738531366":
+            raise RuntimeError("provider down")
+        if isbn not in KNOWN_ISBNS:
+            return None
+        return BookCreate(title=KNOWN_ISBNS[isbn], author="author", isbn=int(isbn))
+
+    monkeypatch.setattr(isbn_cache, "isbn2book", isbn2book)
+    monkeypatch.setattr(isbn_cache, "isbns2books_bnf", no_bnf_batch)
+    yield lookups
+
+
+def post_batch(client: TestClient, isbns: list) -> list:
+    response = client.post("/api/v1/books/isbn/batch", json={"isbns": isbns})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_isbn_batch_create_book(
+    client: TestClient, settings: Settings, lookups: list
+) -> None:
+    events = post_batch(
+        client,
+        [
+            "978-2070438617",
+            "2253067903",  # ISBN-10 of 9782253067900
+            "9782070438617",
+            "not an isbn",
+            "9782361934996",
+            "9780738531366",
+        ],
+    )
+
+    assert sorted(lookups) == [
+        "9780738531366",
+        "9782070438617",
+        "9782253067900",
+        "9782361934996",
+    ]
+    assert events[-1] == {
+        "status": "done",
+        "created": 2,
+        "not_found": 1,
+        "invalid": 1,
+        "duplicate": 1,
+        "error": 1,
+    }
+    statuses = {(event["isbn"], event["status"]) for event in events[:-1]}
+    assert statuses == {
+        ("9782070438617", "created"),
+        ("9782253067900", "created"),
+        ("9782070438617", "duplicate"),
+        ("not an isbn", "invalid"),
+        ("9782361934996", "not_found"),
+        ("9780738531366", "error"),
+    }
+
+    for event in events:
+        if event["status"] == "created":
+            response = client.get(f"/api/v1/books/{event['id']}")
+            assert response.json()["isbn"] == int(event["isbn"])
+            assert response.json()["title"] == KNOWN_ISBNS[event["isbn"]]
+    response = client.get("/api/v1/books")
+    assert response.json()["meta"]["total_items"] == 2
+
+
+def test_isbn_batch_create_book_in_several_transactions(
+    client: TestClient, settings: Settings, monkeypatch
+) -> None:
+    async def isbn2book(isbn, settings, limits=None, client=None, failures=None):
+        return BookCreate(title=isbn, author="author")
+
+    monkeypatch.setattr(isbn_cache, "isbn2book", isbn2book)
+    monkeypatch.setattr(isbn_cache, "isbns2books_bnf", no_bnf_batch)
+    isbns = [f"978207043{index:03}" for index in range(100)]
+    isbns = [isbn + isbnlib.check_digit13(isbn) for isbn in isbns]
+
+    events = post_batch(client, isbns)
+    assert events[-1]["created"] == 100
+    ids = [event["id"] for event in events[:-1]]
+    assert sorted(ids) == list(range(1, 101))
+    response = client.get("/api/v1/books")
+    assert response.json()["meta"]["total_items"] == 100
+
+
+def image(size: tuple[int, int]) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", size).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_isbn_batch_create_book_from_bnf_batch(
+    client: TestClient, settings: Settings, monkeypatch
+) -> None:
+    lookups = []
+
+    async def isbn2book(isbn, settings, limits=None, client=None, failures=None):
+        lookups.append(isbn)
+        return None
+
+    monkeypatch.setattr(isbn_cache, "isbn2book", isbn2book)
+    sru_queries = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/SRU":
+            sru_queries.append(request.url.params["query"])
+            return httpx.Response(200, content=BNF_SRU_BATCH.read_bytes())
+        if "cb44313447b" in request.url.params["idArk"]:
+            return httpx.Response(200, content=image((300, 450)))
+        return httpx.Response(200, content=image((92, 138)))  # default cover
+
+    bnf_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    app.dependency_overrides[get_http_client] = lambda: bnf_client
+    events = post_batch(client, ["9782070438617", "2253067903", "9782361934996"])
+
+    # one BnF request for the three ISBNs, the ISBN not found looked up again
+    assert sru_queries == [
+        'bib.fuzzyISBN all "9782070438617" or bib.fuzzyISBN all "9782253067900"'
+        ' or bib.fuzzyISBN all "9782361934996"'
+    ]
+    assert lookups == ["9782361934996"]
+    assert events[-1]["created"] == 2
+    assert events[-1]["not_found"] == 1
+
+    books = client.get("/api/v1/books").json()["data"]
+    assert sorted((book["isbn"], book["title"], book["cover"]) for book in books) == [
+        (
+            9782070438617,
+            "L'étranger",
+            "https://catalogue.bnf.fr/couverture?&appName=NE"
+            "&idArk=ark:/12148/cb44313447b&couverture=1",
+        ),
+        (9782253067900, "Le Horla", None),
+    ]
+
+
+def test_isbn_batch_create_book_failure(client: TestClient, settings: Settings) -> None:
+    response = client.post("/api/v1/books/isbn/batch", json={"isbns": "9782070438617"})
+    assert response.status_code == 422
+    response = client.post(
+        "/api/v1/books/isbn/batch", json={"isbns": ["9782070438617"] * 1001}
+    )
+    assert response.status_code == 422
+
+
+def test_provider_limits() -> None:
+    limits = ProviderLimits(concurrency=2)
+    running = {"bnf": 0, "sudoc": 0}
+    maximum = {"bnf": 0, "sudoc": 0}
+
+    async def lookup(provider):
+        running[provider] += 1
+        maximum[provider] = max(maximum[provider], running[provider])
+        await asyncio.sleep(0.001)
+        running[provider] -= 1
+
+    async def main():
+        await asyncio.gather(
+            *(
+                _query_provider(limits, provider, lookup, provider)
+                for provider in ["bnf", "sudoc"] * 10
+            )
+        )
+
+    asyncio.run(main())
+    assert maximum == {"bnf": 2, "sudoc": 2}
@@ -0,0 +1,143 @@
+import asyncio
+import pytest
+import time
+
+from backend.config import Settings
+from backend.internals import book_notice
+from backend.models import BookCreate
+
+SETTINGS = Settings(
+    admin_email="admin@example.com",
+    google_api_key="key",
+    google_custom_search_engine="engine",
+)
+
+
+class FakeProvider:
+    """Provider answering after `delay` seconds"""
+
+    def __init__(self, name: str, delay: float, found: bool, cover=None):
+        self.name = name
+        self.delay = delay
+        self.found = found
+        self.cover = cover
+        self.started = False
+        self.cancelled = False
+
+    async def __call__(self, isbn, client=None):
+        self.started = True
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if isinstance(self.found, Exception):
+            raise self.found
+        if not self.found:
+            return None
+        return BookCreate(title=self.name, author="author", cover=self.cover)
+
+
+@pytest.fixture(name="covers")
+def covers_fixture(monkeypatch):
+    """Replace the cover lookups, return the covers looked up"""
+    covers = []
+
+    async def openlibrarycover(isbn, client=None):
+        covers.append("openlibrary")
+        await asyncio.sleep(0.05)
+        return "https://covers.openlibrary.org/cover.jpg"
+
+    async def googleimagescover(isbn, apikey, seachengine, client=None):
+        covers.append("googleimages")
+        return "https://images.google.com/cover.jpg"
+
+    monkeypatch.setattr(book_notice, "openlibrarycover", openlibrarycover)
+    monkeypatch.setattr(book_notice, "googleimagescover", googleimagescover)
+    yield covers
+
+
+def use_providers(monkeypatch, *providers: FakeProvider) -> None:
+    monkeypatch.setattr(
+        book_notice,
+        "BOOK_PROVIDERS",
+        [(provider.name, provider) for provider in providers],
+    )
+
+
+def test_isbn2book_keeps_priority_order(monkeypatch, covers: list) -> None:
+    bnf = FakeProvider("bnf", 0.05, found=True)
+    googlebooks = FakeProvider("googlebooks", 0.01, found=True)
+    use_providers(monkeypatch, bnf, googlebooks)
+
+    book = asyncio.run(book_notice.isbn2book("9782070438617", SETTINGS))
+    assert book.title == "bnf"
+    assert book.isbn == "9782070438617"
+
+
+def test_isbn2book_cancels_lower_priority(monkeypatch, covers: list) -> None:
+    bnf = FakeProvider("bnf", 0.01, found=False)
+    googlebooks = FakeProvider("googlebooks", 0.02, found=True, cover="cover")
+    sudoc = FakeProvider("sudoc", 5, found=True)
+    use_providers(monkeypatch, bnf, googlebooks, sudoc)
+
+    start = time.perf_counter()
+    book = asyncio.run(book_notice.isbn2book("9782070438617", SETTINGS))
+    assert time.perf_counter() - start < 1
+    assert book.title == "googlebooks"
+    assert book.cover == "cover"
+    assert sudoc.started and sudoc.cancelled
+    # the concurrent cover lookup isn't waited for
+    assert covers == ["openlibrary"]
+
+
+def test_isbn2book_queries_providers_concurrently(monkeypatch, covers: list) -> None:
+    providers = [
+        FakeProvider(name, 0.1, found=name == "banq")
+        for name in ["bnf", "googlebooks", "openlibrary", "sudoc", "banq"]
+    ]
+    use_providers(monkeypatch, *providers)
+
+    start = time.perf_counter()
+    book = asyncio.run(book_notice.isbn2book("9782070438617", SETTINGS))
+    # sequential lookups and cover would take 0.55 s
+    assert time.perf_counter() - start < 0.3
+    assert book.title == "banq"
+    assert book.cover == "https://covers.openlibrary.org/cover.jpg"
+    assert covers == ["openlibrary"]
+
+
+def test_isbn2book_provider_failures(monkeypatch, covers: list) -> None:
+    monkeypatch.setitem(book_notice.PROVIDER_DEADLINES, "bnf", 0.05)
+    bnf = FakeProvider("bnf", 5, found=True)  # misses its deadline
+    googlebooks = FakeProvider("googlebooks", 0.01, found=KeyError("items"))
+    openlibrary = FakeProvider("openlibrary", 0.01, found=True)
+    use_providers(monkeypatch, bnf, googlebooks, openlibrary)
+
+    book = asyncio.run(book_notice.isbn2book("9782070438617", SETTINGS))
+    assert book.title == "openlibrary"
+    assert bnf.cancelled
+
+
+def test_isbn2book_not_found(monkeypatch, covers: list) -> None:
+    use_providers(
+        monkeypatch,
+        FakeProvider("bnf", 0.01, found=False),
+        FakeProvider("sudoc", 0.02, found=False),
+    )
+
+    assert asyncio.run(book_notice.isbn2book("9782070438617", SETTINGS)) is None
+    assert asyncio.run(book_notice.isbn2book("not an isbn", SETTINGS)) is None
+
+
+def test_isbn2book_cover_fallback(monkeypatch, covers: list) -> None:
+    async def openlibrarycover(isbn, client=None):
+        covers.append("openlibrary")
+        return None
+
+    monkeypatch.setattr(book_notice, "openlibrarycover", openlibrarycover)
+    use_providers(monkeypatch, FakeProvider("bnf", 0.01, found=True))
+
+    book = asyncio.run(book_notice.isbn2book("9782070438617", SETTINGS))
+    assert book.cover == "https://images.google.com/cover.jpg"
+    assert covers == ["openlibrary", "googleimages"]
@@ -1,6 +1,7 @@
 from fastapi.testclient import TestClient
 import pytest
 from ..internals import constants
+from ..internals.table_management import encode_cursor
 
 
 def add_a_lot_of_elements(
@@ -185,3 +186,202 @@ def test_read_all_book_filtered_by_available(
     current_book_list_not_available = get_all_books_filtered(client, "available=False")
     assert len(current_book_list_not_available) == not_available_count
     assert current_book_list_not_available == book_list_not_available
+
+
+def test_read_all_book_total_items_after_create_and_delete(
+    client: TestClient,
+) -> None:
+    book_list = add_a_lot_of_elements(client, 3)
+
+    response = client.get("/api/v1/books")
+    assert response.status_code == 200
+    assert response.json()["meta"]["total_items"] == 3
+
+    # the cached row count is invalidated by create and delete
+    add_a_lot_of_elements(client, 2)
+    response = client.get("/api/v1/books")
+    assert response.json()["meta"]["total_items"] == 5
+
+    response = client.delete(f"/api/v1/books/{book_list[0]['id']}")
+    assert response.status_code == 204
+    response = client.get("/api/v1/books")
+    assert response.json()["meta"]["total_items"] == 4
+
+
+def test_read_all_book_filtered_metadata(client: TestClient) -> None:
+    add_a_lot_of_elements(client, 25, {"available": True})
+    add_a_lot_of_elements(client, 5, {"available": False})
+
+    response = client.get("/api/v1/books?available=True&page=2")
+    assert response.status_code == 200
+    list_response = response.json()
+    assert len(list_response["data"]) == 5
+    assert list_response["meta"]["total_items"] == 25
+    assert list_response["meta"]["total_pages"] == 2
+
+    # page after the last one keeps the filtered total
+    response = client.get("/api/v1/books?available=False&page=3")
+    assert response.status_code == 200
+    list_response = response.json()
+    assert list_response["data"] == []
+    assert list_response["meta"]["total_items"] == 5
+    assert list_response["meta"]["total_pages"] == 1
+
+
+def get_all_books_with_cursor(client: TestClient, filter: str = "") -> list:
+    data_response = list()
+    response = client.get(f"/api/v1/books?limit=7&{filter}")
+    while True:
+        assert response.status_code == 200
+        list_response = response.json()
+        data_response.extend(list_response["data"])
+
+        # exit the loop when there is no next page
+        next_cursor = list_response["meta"]["next_cursor"]
+        if next_cursor is None:
+            break
+        response = client.get(f"/api/v1/books?limit=7&cursor={next_cursor}&{filter}")
+    return data_response
+
+
+def test_read_all_book_with_cursor(client: TestClient) -> None:
+    book_list = add_a_lot_of_elements(client, 30, {"available": True})
+
+    assert get_all_books_with_cursor(client, "available=True") == book_list
+
+
+def test_read_all_book_with_invalid_cursor(client: TestClient) -> None:
+    response = client.get("/api/v1/books?cursor=invalid")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_read_all_book_search(client: TestClient) -> None:
+    book_list = add_a_lot_of_elements(
+        client, 1, {"title": "L'Étranger", "author": "Albert Camus"}
+    )
+    book_list += add_a_lot_of_elements(
+        client, 1, {"title": "Vol de nuit", "author": "Antoine de Saint-Exupéry"}
+    )
+    add_a_lot_of_elements(client, 3)
+
+    assert get_all_books_filtered(client, "search=l'etr") == book_list[0:1]
+    assert get_all_books_filtered(client, "search=CAMUS") == []
+    assert get_all_books_filtered(client, "search=albert c") == book_list[0:1]
+    assert get_all_books_filtered(client, "search=antoinedesaint") == book_list[1:2]
+    assert len(get_all_books_filtered(client, "search=a")) == 5
+    assert get_all_books_filtered(client, "search=albert&available=True") == []
+
+
+@pytest.mark.parametrize(
+    "sort,expected",
+    [
+        ("+title", ["a", "a", "b", "c"]),
+        ("title", ["a", "a", "b", "c"]),
+        (" title", ["a", "a", "b", "c"]),  # "+" sent unencoded
+        ("-title", ["c", "b", "a", "a"]),
+        ("-title,-author", ["c", "b", "a", "a"]),
+    ],
+)
+def test_read_all_book_sorted(client: TestClient, sort: str, expected: list) -> None:
+    for title, author in [("b", "x"), ("a", "x"), ("c", "x"), ("a", "y")]:
+        add_a_lot_of_elements(client, 1, {"title": title, "author": author})
+
+    response = client.get("/api/v1/books", params={"sort": sort})
+    assert response.status_code == 200
+    assert [book["title"] for book in response.json()["data"]] == expected
+
+
+def test_read_all_book_sorted_with_cursor(client: TestClient) -> None:
+    book_list = []
+    for index in range(30):
+        category_type = None if index % 4 == 0 else f"type {index % 3}"
+        book_list += add_a_lot_of_elements(
+            client, 1, {"category_type": category_type, "available": True}
+        )
+
+    # NULL first in ascending order, rows of equal value ordered by id
+    def sort_key(book):
+        return (book["category_type"] is not None, book["category_type"] or "")
+
+    expected = sorted(book_list, key=sort_key)
+    assert get_all_books_with_cursor(client, "sort=+category_type") == expected
+    expected = sorted(book_list, key=sort_key, reverse=True)
+    assert get_all_books_with_cursor(client, "sort=-category_type") == expected
+
+
+def test_read_all_book_filtered(client: TestClient) -> None:
+    book_list_a = add_a_lot_of_elements(client, 3, {"catalog": "a", "archived": False})
+    book_list_b = add_a_lot_of_elements(client, 2, {"catalog": "b", "archived": False})
+    book_list_c = add_a_lot_of_elements(client, 2, {"catalog": "c", "archived": True})
+
+    assert get_all_books_filtered(client, "filter[archived]=false") == (
+        book_list_a + book_list_b
+    )
+    assert get_all_books_filtered(client, "filter[catalog]=b") == book_list_b
+    assert get_all_books_filtered(client, "filter[catalog]=a&filter[catalog]=c") == (
+        book_list_a + book_list_c
+    )
+    assert (
+        get_all_books_filtered(client, "filter[catalog]=c&filter[archived]=false") == []
+    )
+
+    response = client.get("/api/v1/books?filter[catalog]=a&limit=2")
+    assert response.json()["meta"]["total_items"] == 3
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "sort=abstract",  # not indexed
+        "sort=title_normalized",  # internal
+        "sort=unknown",
+        "filter[abstract]=x",
+        "filter[archived]=maybe",
+        "filter[id]=one",
+    ],
+)
+def test_read_all_book_sorted_or_filtered_failure(
+    client: TestClient, query: str
+) -> None:
+    response = client.get(f"/api/v1/books?{query}")
+    assert response.status_code == 400
+    assert "detail" in response.json()
+
+
+def test_read_all_book_cursor_of_another_sort(client: TestClient) -> None:
+    add_a_lot_of_elements(client, 5)
+
+    response = client.get("/api/v1/books?limit=2&sort=-title")
+    next_cursor = response.json()["meta"]["next_cursor"]
+    response = client.get(f"/api/v1/books?limit=2&cursor={next_cursor}")
+    assert response.status_code == 400
+
+
+def test_read_all_book_sorted_on_bool_with_cursor(client: TestClient) -> None:
+    book_list = []
+    for index in range(10):
+        book_list += add_a_lot_of_elements(client, 1, {"available": index % 3 != 0})
+
+    expected = sorted(book_list, key=lambda book: not book["available"])
+    assert get_all_books_with_cursor(client, "sort=-available") == expected
+    expected = sorted(book_list, key=lambda book: book["available"])
+    assert get_all_books_with_cursor(client, "sort=+available") == expected
+
+
+@pytest.mark.parametrize(
+    "params,sort_key,values",
+    [
+        ({}, "+id", [True]),  # bool is an int in Python
+        ({"sort": "-available"}, "-available,+id", ["yes", 1]),
+    ],
+)
+def test_read_all_book_forged_cursor(
+    client: TestClient, params: dict, sort_key: str, values: list
+) -> None:
+    add_a_lot_of_elements(client, 3)
+
+    cursor = encode_cursor(sort_key, values)
+    response = client.get("/api/v1/books", params={**params, "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
@@ -0,0 +1,99 @@
+from fastapi.testclient import TestClient
+import pytest
+
+
+def add_book(client: TestClient, update_init_data: dict = None) -> dict:
+    init_data = {
+        "title": "title",
+        "author": "author",
+        "abstract": "abstract",
+        "publisher": "publisher",
+        "category_topics": "category_topics",
+    }
+    if update_init_data:
+        for key, value in update_init_data.items():
+            init_data[key] = value
+
+    response = client.post("/api/v1/books", json=init_data)
+    assert response.status_code == 200
+    return response.json()
+
+
+def search_books(client: TestClient, query: str) -> list:
+    response = client.get("/api/v1/books/search", params={"q": query})
+    assert response.status_code == 200
+    return response.json()["data"]
+
+
+def test_search_book_without_book(client: TestClient) -> None:
+    assert search_books(client, "potter") == []
+
+
+@pytest.mark.parametrize(
+    "field",
+    ["title", "author", "abstract", "publisher", "category_topics"],
+)
+def test_search_book_by_field(client: TestClient, field: str) -> None:
+    book = add_book(client, {field: "Le Petit Prince"})
+    add_book(client)
+
+    assert search_books(client, "petit prince") == [book]
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["PETIT", "pet pri", "École", "ecole", "l'école", 'prince" (petit*'],
+)
+def test_search_book_query_normalization(client: TestClient, query: str) -> None:
+    book = add_book(client, {"title": "Le Petit Prince à l'école"})
+
+    assert search_books(client, query) == [book]
+
+
+def test_search_book_no_match(client: TestClient) -> None:
+    add_book(client, {"title": "Le Petit Prince"})
+
+    assert search_books(client, "potter") == []
+    assert search_books(client, "!!!") == []
+
+
+def test_search_book_ranking(client: TestClient) -> None:
+    in_abstract = add_book(client, {"abstract": "a story about a dragon"})
+    in_title = add_book(client, {"title": "Dragon"})
+
+    assert search_books(client, "dragon") == [in_title, in_abstract]
+
+
+def test_search_book_after_update_and_delete(client: TestClient) -> None:
+    book = add_book(client, {"title": "Le Petit Prince"})
+
+    response = client.patch(
+        f"/api/v1/books/{book['id']}", json={"title": "Vol de nuit"}
+    )
+    assert response.status_code == 200
+    assert search_books(client, "prince") == []
+    assert search_books(client, "nuit") == [response.json()]
+
+    response = client.delete(f"/api/v1/books/{book['id']}")
+    assert response.status_code == 204
+    assert search_books(client, "nuit") == []
+
+
+def test_search_book_with_pagination(client: TestClient) -> None:
+    for _ in range(25):
+        add_book(client, {"title": "Dragon"})
+    add_book(client)
+
+    response = client.get("/api/v1/books/search?q=dragon&page=2&limit=10")
+    assert response.status_code == 200
+    list_response = response.json()
+    assert len(list_response["data"]) == 10
+    assert list_response["meta"]["total_items"] == 25
+    assert list_response["meta"]["total_pages"] == 3
+    assert list_response["meta"]["next_cursor"] is None
+
+
+def test_search_book_without_query(client: TestClient) -> None:
+    response = client.get("/api/v1/books/search")
+    assert response.status_code == 422
+    assert "detail" in response.json()
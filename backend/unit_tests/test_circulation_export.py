@@ -0,0 +1,29 @@
+from fastapi.testclient import TestClient
+import json
+
+from .test_circulation_read_all import add_a_lot_of_elements
+
+
+def test_export_circulation_ndjson(client: TestClient) -> None:
+    circulation_list = add_a_lot_of_elements(client, 3, {"borrowed_date": "2010-01-01"})
+    circulation_list += add_a_lot_of_elements(client, 3)
+
+    # no default date range, unlike the list API
+    response = client.get("/api/v1/circulations/export")
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == circulation_list
+
+
+def test_export_circulation_filtered_by_borrowed_date(client: TestClient) -> None:
+    add_a_lot_of_elements(client, 3, {"borrowed_date": "2010-01-01"})
+    circulation_list = add_a_lot_of_elements(client, 2, {"borrowed_date": "2023-05-01"})
+    add_a_lot_of_elements(client, 3, {"borrowed_date": "2024-01-01"})
+
+    response = client.get(
+        "/api/v1/circulations/export"
+        "?borrowed_date_start=2023-01-01&borrowed_date_end=2023-12-31"
+    )
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert exported == circulation_list
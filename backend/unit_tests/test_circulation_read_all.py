@@ -223,3 +223,63 @@ def test_read_all_circulation_filtered_by_borrowed_date(client: TestClient) -> N
     )
     assert len(current_circulation_list) == len(expected_circulation_list)
     assert current_circulation_list == expected_circulation_list
+
+
+def test_read_all_circulation_filtered_metadata(client: TestClient) -> None:
+    add_a_lot_of_elements(client, 3, {"borrowed_date": "2022-12-04"})
+    add_a_lot_of_elements(client, 7, {"borrowed_date": "2023-12-04"})
+
+    response = client.get("/api/v1/circulations?borrowed_date_start=2023-01-01&limit=5")
+    assert response.status_code == 200
+    list_response = response.json()
+    assert len(list_response["data"]) == 5
+    assert list_response["meta"]["total_items"] == 7
+    assert list_response["meta"]["total_pages"] == 2
+
+
+def get_all_circulations_with_cursor(client: TestClient, filter: str = "") -> list:
+    data_response = list()
+    response = client.get(f"/api/v1/circulations?limit=7&{filter}")
+    while True:
+        assert response.status_code == 200
+        list_response = response.json()
+        data_response.extend(list_response["data"])
+
+        # exit the loop when there is no next page
+        next_cursor = list_response["meta"]["next_cursor"]
+        if next_cursor is None:
+            break
+        response = client.get(
+            f"/api/v1/circulations?limit=7&cursor={next_cursor}&{filter}"
+        )
+    return data_response
+
+
+def test_read_all_circulation_with_cursor(client: TestClient) -> None:
+    circulation_list = add_a_lot_of_elements(client, 30)
+
+    assert get_all_circulations_with_cursor(client) == circulation_list
+
+
+def test_read_all_circulation_with_invalid_cursor(client: TestClient) -> None:
+    response = client.get("/api/v1/circulations?cursor=invalid")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_read_all_circulation_sorted_and_filtered(client: TestClient) -> None:
+    circulation_list = add_a_lot_of_elements(client, 2, {"borrowed_date": "2023-01-04"})
+    circulation_list += add_a_lot_of_elements(
+        client, 2, {"borrowed_date": "2024-01-04"}
+    )
+    book_id = circulation_list[-1]["book_id"]
+
+    current_circulation_list = get_all_circulations_filtered(
+        client, "sort=-borrowed_date"
+    )
+    assert current_circulation_list == (circulation_list[2:] + circulation_list[:2])
+
+    current_circulation_list = get_all_circulations_filtered(
+        client, f"filter[book_id]={book_id}&sort=-borrowed_date"
+    )
+    assert current_circulation_list == circulation_list[2:]
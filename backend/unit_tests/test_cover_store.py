@@ -0,0 +1,193 @@
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+from io import BytesIO
+from PIL import Image
+import asyncio
+import hashlib
+import httpx
+import pytest
+from sqlmodel import Session, select
+
+from backend.config import Settings, get_settings
+from backend.internals import isbn_cache
+from backend.internals.cover_store import CoverStore, get_cover_store, recent_downloads
+from backend.internals.http_client import get_http_client
+from backend.main import app
+from backend.models import BookCreate, BookTable
+
+
+def cover_content(size: tuple = (600, 900), format: str = "PNG") -> bytes:
+    content = BytesIO()
+    Image.new("RGB", size, (200, 30, 30)).save(content, format)
+    return content.getvalue()
+
+
+@pytest.fixture(name="cover_store")
+def cover_store_fixture(tmp_path):
+    with ThreadPoolExecutor(1) as executor:
+        cover_store = CoverStore(tmp_path, executor)
+        app.dependency_overrides[get_cover_store] = lambda: cover_store
+        yield cover_store
+
+
+def store(cover_store: CoverStore, url: str, handler) -> str:
+    async def main():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await cover_store.store(url, client)
+
+    return asyncio.run(main())
+
+
+def test_cover_store_thumbnails(cover_store: CoverStore) -> None:
+    content = cover_content()
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=content)
+
+    digest = store(cover_store, "https://covers.example/1.png", handler)
+    assert digest == hashlib.sha256(content).hexdigest()
+    assert len(requests) == 1
+
+    for size, expected in [(128, (85, 128)), (256, (171, 256)), (512, (341, 512))]:
+        with Image.open(cover_store.path(digest, size)) as thumbnail:
+            assert thumbnail.format == "WEBP"
+            assert thumbnail.size == expected
+
+    # same content from another URL
+    assert store(cover_store, "https://covers.example/2.png", handler) == digest
+
+
+def test_cover_store_recent_download(cover_store: CoverStore) -> None:
+    content = cover_content(format="JPEG")
+    recent_downloads.add("https://covers.example/recent.jpg", content)
+
+    def handler(request):
+        raise AssertionError("downloaded again")
+
+    digest = store(cover_store, "https://covers.example/recent.jpg", handler)
+    assert digest == hashlib.sha256(content).hexdigest()
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        httpx.Response(404),
+        httpx.Response(200, content=b""),
+        httpx.Response(200, content=b"<html>not an image</html>"),
+    ],
+)
+def test_cover_store_failure(cover_store: CoverStore, response) -> None:
+    assert store(cover_store, "https://covers.example/x", lambda _: response) is None
+    assert list(cover_store.directory.iterdir()) == []
+
+
+def test_read_cover(client: TestClient, cover_store: CoverStore) -> None:
+    digest = store(
+        cover_store,
+        "https://covers.example/1.png",
+        lambda _: httpx.Response(200, content=cover_content()),
+    )
+
+    response = client.get(f"/covers/{digest}-256.webp")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert "immutable" in response.headers["cache-control"]
+    assert response.content == cover_store.path(digest, 256).read_bytes()
+
+    for name in [f"{digest}-300.webp", f"{'0' * 64}-256.webp", "x-256.webp"]:
+        response = client.get(f"/covers/{name}")
+        assert response.status_code == 404
+
+
+def test_create_book_isbn_stores_cover(
+    client: TestClient, cover_store: CoverStore, monkeypatch
+) -> None:
+    app.dependency_overrides[get_settings] = lambda: Settings(
+        admin_email="admin@example.com",
+        google_api_key="key",
+        google_custom_search_engine="engine",
+    )
+    content = cover_content()
+    url = "https://covers.example/9782070438617.png"
+
+    async def isbn2book(isbn, settings, limits=None, client=None, failures=None):
+        # as left by the providers that check the cover
+        recent_downloads.add(url, content)
+        return BookCreate(title="L'Étranger", author="Albert Camus", cover=url)
+
+    monkeypatch.setattr(isbn_cache, "isbn2book", isbn2book)
+
+    response = client.post("/api/v1/books/9782070438617")
+    assert response.status_code == 202
+    response = client.get(f"/api/v1/books/{response.json()['book_id']}")
+    digest = response.json()["cover_hash"]
+    assert digest == hashlib.sha256(content).hexdigest()
+    assert response.json()["cover"] == url
+    assert client.get(f"/covers/{digest}-128.webp").status_code == 200
+
+
+def test_read_cover_made_again(
+    client: TestClient, cover_store: CoverStore, session: Session
+) -> None:
+    content = cover_content()
+    digest = hashlib.sha256(content).hexdigest()
+    url = "https://covers.openlibrary.org/b/id/1-L.jpg"
+    # stored on another node, or before a restart
+    session.add(BookTable(title="t", author="a", cover=url, cover_hash=digest))
+    session.commit()
+    covers = {url: content}
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, content=covers[str(request.url)])
+
+    transport = httpx.MockTransport(handler)
+    app.dependency_overrides[get_http_client] = lambda: httpx.AsyncClient(
+        transport=transport
+    )
+
+    response = client.get(f"/covers/{digest}-128.webp")
+    assert response.status_code == 200
+    assert response.content == cover_store.path(digest, 128).read_bytes()
+
+    # the remote cover changed
+    covers[url] = cover_content((300, 300))
+    cover_store.path(digest, 256).unlink()
+    assert client.get(f"/covers/{digest}-256.webp").status_code == 404
+
+    # a cover written by a client isn't downloaded
+    book = session.exec(select(BookTable)).one()
+    book.cover = "https://internal.example/1.png"
+    session.add(book)
+    session.commit()
+    requests.clear()
+    cover_store.path(digest, 512).unlink()
+    assert client.get(f"/covers/{digest}-512.webp").status_code == 404
+    assert requests == []
+
+
+def test_cover_hash_not_written_by_clients(
+    client: TestClient, session: Session
+) -> None:
+    digest = hashlib.sha256(b"cover").hexdigest()
+    book = {"title": "t", "author": "a", "cover": "url", "cover_hash": digest}
+    response = client.post("/api/v1/books", json=book)
+    assert response.status_code == 200
+    assert response.json()["cover_hash"] is None
+
+    response = client.patch(
+        f"/api/v1/books/{response.json()['id']}", json={"cover_hash": digest}
+    )
+    assert response.json()["cover_hash"] is None
+
+    # a new cover drops the thumbnails of the former one
+    session.add(BookTable(title="t", author="a", cover="url", cover_hash=digest))
+    session.commit()
+    response = client.patch("/api/v1/books/2", json={"cover": "url"})
+    assert response.json()["cover_hash"] == digest
+    response = client.patch("/api/v1/books/2", json={"cover": "new url"})
+    assert response.json()["cover_hash"] is None
@@ -0,0 +1,158 @@
+from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+import asyncio
+import pytest
+
+from backend.database import (
+    DatabaseSettings,
+    StorageProfile,
+    enable_storage_profile,
+    read_pragmas,
+)
+from backend.internals.table_management import database_key, row_count_cache
+from backend.main import app
+from backend.models import BookTable
+from backend.users import current_superuser
+
+SESSIONS = [
+    DatabaseSettings(async_sessions=True),
+    DatabaseSettings(async_sessions=False),
+]
+
+
+@pytest.mark.parametrize("database_settings", SESSIONS, ids=["async", "sync"])
+def test_crud_routes(client: TestClient) -> None:
+    family = client.post("/api/v1/families", json={"email": "a@example.com"}).json()
+    member = client.post(
+        "/api/v1/members",
+        json={"firstname": "Ada", "surname": "Lovelace", "family_id": family["id"]},
+    ).json()
+    book = client.post("/api/v1/books", json={"title": "t", "author": "a"}).json()
+    circulation = client.post(
+        "/api/v1/circulations",
+        json={
+            "borrowed_date": "2024-01-02",
+            "book_id": book["id"],
+            "member_id": member["id"],
+        },
+    ).json()
+
+    # relationships loaded by the routes
+    response = client.get(f"/api/v1/members/{member['id']}")
+    assert response.json()["family"]["email"] == "a@example.com"
+    response = client.get(f"/api/v1/families/{family['id']}")
+    assert [member["firstname"] for member in response.json()["members"]] == ["Ada"]
+    response = client.get(f"/api/v1/circulations/{circulation['id']}")
+    assert response.json()["book"]["title"] == "t"
+    assert response.json()["member"]["surname"] == "Lovelace"
+
+    response = client.patch(f"/api/v1/books/{book['id']}", json={"title": "u"})
+    assert response.json()["title"] == "u"
+    response = client.get("/api/v1/books", params={"search": "u"})
+    assert response.json()["meta"]["total_items"] == 1
+
+    assert client.delete(f"/api/v1/circulations/{circulation['id']}").status_code == 204
+    assert client.delete(f"/api/v1/books/{book['id']}").status_code == 204
+    assert client.get(f"/api/v1/books/{book['id']}").status_code == 404
+    assert client.get("/api/v1/books").json()["meta"]["total_items"] == 0
+
+
+def test_row_count_shared_by_the_engines(client: TestClient, session: Session) -> None:
+    client.post("/api/v1/books", json={"title": "t", "author": "a"})
+    assert client.get("/api/v1/books").json()["meta"]["total_items"] == 1
+
+    # inserted through the sync session, read through the async one
+    session.add(BookTable(title="u", author="b"))
+    session.commit()
+    row_count_cache.invalidate(session, BookTable)
+    assert client.get("/api/v1/books").json()["meta"]["total_items"] == 2
+
+
+def test_row_count_after_writes_of_another_process(session: Session) -> None:
+    assert row_count_cache.get(session, BookTable) == 0
+    assert row_count_cache.get(session, BookTable) == 0
+
+    # e.g. another worker, or LiteFS replicating the writes of the primary
+    other_engine = create_engine(session.get_bind().url)
+    with other_engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO booktable (title, author, archived, available)"
+            " VALUES ('t', 'a', 0, 1)"
+        )
+    other_engine.dispose()
+
+    session.commit()  # new read transaction
+    assert row_count_cache.get(session, BookTable) == 1
+
+
+def test_database_key(tmp_path) -> None:
+    path = tmp_path / "test.db"
+    engine = create_engine(f"sqlite:///{path}")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    assert database_key(engine) == database_key(async_engine.sync_engine)
+
+    memory_engine = create_engine("sqlite://")
+    assert database_key(memory_engine) is memory_engine
+    assert database_key(create_engine("sqlite://")) is not memory_engine
+
+
+def test_storage_profile_pragmas(tmp_path) -> None:
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    enable_storage_profile(
+        engine,
+        DatabaseSettings(storage_profile=StorageProfile.litefs, busy_timeout=100),
+    )
+    with Session(engine) as session:
+        pragmas = read_pragmas(session)
+    assert pragmas["journal_mode"] == "wal"
+    assert pragmas["synchronous"] == "2"  # full
+    assert pragmas["mmap_size"] == "0"
+    assert pragmas["temp_store"] == "2"  # memory
+    assert pragmas["busy_timeout"] == "100"
+    assert pragmas["foreign_keys"] == "0"
+
+
+def test_storage_profile_async_engine(tmp_path) -> None:
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    enable_storage_profile(
+        async_engine.sync_engine, DatabaseSettings(foreign_keys=True)
+    )
+
+    async def main():
+        async with AsyncSession(async_engine) as session:
+            pragmas = await session.run_sync(read_pragmas)
+        await async_engine.dispose()
+        return pragmas
+
+    pragmas = asyncio.run(main())
+    assert pragmas["journal_mode"] == "wal"
+    assert pragmas["synchronous"] == "1"  # normal
+    assert pragmas["foreign_keys"] == "1"
+
+
+def test_storage_profile_read_only(tmp_path) -> None:
+    path = tmp_path / "test.db"
+    with Session(create_engine(f"sqlite:///{path}")) as session:
+        session.connection().exec_driver_sql("CREATE TABLE t (id INTEGER)")
+        session.commit()
+
+    # as on a LiteFS replica, the journal mode of the file is kept
+    engine = create_engine(f"sqlite:///file:{path}?mode=ro&uri=true")
+    enable_storage_profile(engine, DatabaseSettings())
+    with Session(engine) as session:
+        pragmas = read_pragmas(session)
+    assert pragmas["journal_mode"] == "delete"
+    assert pragmas["busy_timeout"] == "5000"
+
+
+def test_database_diagnostics(client: TestClient) -> None:
+    app.dependency_overrides[current_superuser] = lambda: None
+    response = client.get("/api/v1/admin/database")
+    assert response.status_code == 200
+    diagnostics = response.json()
+    assert diagnostics["storage_profile"] == "wal"
+    assert diagnostics["configured_pragmas"]["synchronous"] == "normal"
+    assert diagnostics["pragmas"]["journal_mode"] == "wal"
+    assert diagnostics["pragmas"]["synchronous"] == "1"
@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+
+
+def test_bulk_create_family_ndjson(client: TestClient) -> None:
+    content = '{"email": "first"}\n{"phone_number": "0123456789"}\n{"archived": "x"}\n'
+    response = client.post(
+        "/api/v1/families/bulk",
+        content=content,
+        headers={"content-type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 2
+    assert [error["row"] for error in report["errors"]] == [3]
+
+    response = client.get("/api/v1/families")
+    assert response.json()["meta"]["total_items"] == 2
@@ -117,3 +117,48 @@ def test_read_all_family_with_pagination_failure(
     assert response.status_code == 422
     data_response = response.json()
     assert "detail" in data_response
+
+
+def get_all_families_with_cursor(client: TestClient, filter: str = "") -> list:
+    data_response = list()
+    response = client.get(f"/api/v1/families?limit=7&{filter}")
+    while True:
+        assert response.status_code == 200
+        list_response = response.json()
+        data_response.extend(list_response["data"])
+
+        # exit the loop when there is no next page
+        next_cursor = list_response["meta"]["next_cursor"]
+        if next_cursor is None:
+            break
+        response = client.get(f"/api/v1/families?limit=7&cursor={next_cursor}&{filter}")
+    return data_response
+
+
+def test_read_all_family_with_cursor(client: TestClient) -> None:
+    family_list = add_a_lot_of_elements(client, 30)
+
+    assert get_all_families_with_cursor(client) == family_list
+
+
+def test_read_all_family_with_invalid_cursor(client: TestClient) -> None:
+    response = client.get("/api/v1/families?cursor=invalid")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+def test_read_all_family_filtered(client: TestClient) -> None:
+    family_list = add_a_lot_of_elements(client, 3)
+    response = client.patch(
+        f"/api/v1/families/{family_list[1]['id']}", json={"archived": True}
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/families?filter[archived]=true")
+    assert response.status_code == 200
+    list_response = response.json()
+    assert [family["id"] for family in list_response["data"]] == [family_list[1]["id"]]
+    assert list_response["meta"]["total_items"] == 1
+
+    response = client.get("/api/v1/families?filter[email]=test_email")
+    assert response.status_code == 400
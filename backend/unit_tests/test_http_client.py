@@ -0,0 +1,72 @@
+import asyncio
+import httpx
+
+from backend.internals.book_notice import isbn2book_googlebooks
+from backend.internals.http_client import (
+    PROVIDER_TIMEOUTS,
+    HostLimitedTransport,
+    HttpClientSettings,
+    create_http_client,
+)
+
+
+def test_host_limited_transport() -> None:
+    running = {}
+    maximum = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        host = request.url.host
+        running[host] = running.get(host, 0) + 1
+        maximum[host] = max(maximum.get(host, 0), running[host])
+        await asyncio.sleep(0.001)
+        running[host] -= 1
+        return httpx.Response(200, text="ok")
+
+    async def main():
+        transport = HostLimitedTransport(httpx.MockTransport(handler), 3)
+        async with httpx.AsyncClient(transport=transport) as client:
+            responses = await asyncio.gather(
+                *(
+                    client.get(f"https://{host}/")
+                    for host in ["a.example", "b.example"] * 10
+                )
+            )
+        assert all(response.text == "ok" for response in responses)
+
+    asyncio.run(main())
+    assert maximum == {"a.example": 3, "b.example": 3}
+
+
+def test_provider_uses_given_client() -> None:
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        volume_info = {
+            "title": "Vol de nuit",
+            "authors": ["Antoine de Saint-Exupéry"],
+            "language": "fr",
+        }
+        return httpx.Response(
+            200, json={"totalItems": 1, "items": [{"volumeInfo": volume_info}]}
+        )
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await isbn2book_googlebooks("9782070360123", client)
+
+    book = asyncio.run(main())
+    assert book.author == "Antoine de Saint-Exupéry"
+    assert len(requests) == 1
+    assert requests[0].url.host == "www.googleapis.com"
+    read_timeout = PROVIDER_TIMEOUTS["googlebooks"].read
+    assert requests[0].extensions["timeout"]["read"] == read_timeout
+
+
+def test_create_http_client_without_h2() -> None:
+    async def main():
+        client = create_http_client(HttpClientSettings(http2=True))
+        await client.aclose()
+
+    # falls back to HTTP/1.1 when h2 isn't installed
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+from datetime import timedelta
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlmodel import Session
+import pytest
+
+from backend.config import Settings, get_settings
+from backend.internals import isbn_cache
+from backend.internals.isbn_cache import (
+    IsbnCacheSettings,
+    get_isbn_cache_settings,
+    read_cache,
+    write_cache,
+)
+from backend.main import app
+from backend.models import BookCreate, IsbnCacheTable
+from backend.users import current_superuser
+
+
+@pytest.fixture(name="lookups")
+def lookups_fixture(monkeypatch):
+    """Replace the providers lookup, return the looked up ISBNs"""
+    lookups = []
+    app.dependency_overrides[get_settings] = lambda: Settings(
+        admin_email="admin@example.com",
+        google_api_key="key",
+        google_custom_search_engine="engine",
+    )
+
+    async def isbn2book(isbn, settings, limits=None, client=None, failures=None):
+        lookups.append(isbn)
+        if isbn == "9782070438617":
+            return BookCreate(title="L'Étranger", author="Albert Camus", cover="url")
+        if isbn == "9780738531366":
+            failures.append("bnf")
+        return None
+
+    monkeypatch.setattr(isbn_cache, "isbn2book", isbn2book)
+    yield lookups
+
+
+def enrichment(client: TestClient, isbn: str) -> dict:
+    response = client.post(f"/api/v1/books/{isbn}")
+    assert response.status_code == 202
+    book_id = response.json()["book_id"]
+    return client.get(f"/api/v1/books/{book_id}/enrichment").json()
+
+
+def test_isbn_cache_found(client: TestClient, lookups: list) -> None:
+    for isbn in ["978-2070438617", "2070438619", "9782070438617"]:
+        job = enrichment(client, isbn)
+        assert job["status"] == "done"
+        response = client.get(f"/api/v1/books/{job['book_id']}")
+        assert response.json()["title"] == "L'Étranger"
+        assert response.json()["cover"] == "url"
+    assert lookups == ["9782070438617"]
+
+    response = client.get("/api/v1/books")
+    assert response.json()["meta"]["total_items"] == 3
+
+
+def test_isbn_cache_not_found(client: TestClient, lookups: list) -> None:
+    for _ in range(2):
+        assert enrichment(client, "9782253067900")["status"] == "not_found"
+    assert lookups == ["9782253067900"]
+
+    # not cached when a provider failed
+    for _ in range(2):
+        job = enrichment(client, "9780738531366")
+        assert job["status"] == "pending"  # retried later
+        assert job["error"] == "Providers failed: bnf"
+    assert lookups == ["9782253067900", "9780738531366", "9780738531366"]
+
+
+def test_isbn_cache_expired(client: TestClient, lookups: list) -> None:
+    app.dependency_overrides[get_isbn_cache_settings] = lambda: IsbnCacheSettings(
+        ttl=timedelta(0), negative_ttl=timedelta(0)
+    )
+    for _ in range(2):
+        client.post("/api/v1/books/9782070438617")
+        client.post("/api/v1/books/9782253067900")
+    assert lookups == ["9782070438617", "9782253067900"] * 2
+
+
+def test_isbn_cache_least_recently_used(session: Session) -> None:
+    cache_settings = IsbnCacheSettings(max_entries=2)
+    book = BookCreate(title="title", author="author")
+
+    write_cache(session, "9782070438617", book, cache_settings)
+    write_cache(session, "9782253067900", None, cache_settings)
+    assert read_cache(session, "9782070438617", cache_settings).book is not None
+    write_cache(session, "9782377940820", book, cache_settings)
+
+    assert read_cache(session, "9782070438617", cache_settings) is not None
+    assert read_cache(session, "9782253067900", cache_settings) is None
+    assert read_cache(session, "9782377940820", cache_settings) is not None
+
+
+def test_isbn_cache_hit_written_with_next_write(session: Session) -> None:
+    cache_settings = IsbnCacheSettings()
+    write_cache(session, "9782070438617", None, cache_settings)
+    cached_date = session.get(IsbnCacheTable, "9782070438617").last_used_date
+    session.expire_all()
+
+    statements = []
+    event.listen(
+        session.get_bind(),
+        "before_cursor_execute",
+        lambda connection, cursor, statement, *args: statements.append(statement),
+    )
+    assert read_cache(session, "9782070438617", cache_settings) is not None
+    assert [statement.split()[0] for statement in statements] == ["SELECT"]
+
+    write_cache(session, "9782253067900", None, cache_settings)
+    session.expire_all()
+    assert session.get(IsbnCacheTable, "9782070438617").last_used_date > cached_date
+
+
+def test_isbn_cache_purge(client: TestClient, session: Session) -> None:
+    response = client.delete("/api/v1/admin/isbn-cache")
+    assert response.status_code == 401
+
+    app.dependency_overrides[current_superuser] = lambda: None
+    cache_settings = IsbnCacheSettings(negative_ttl=timedelta(0))
+    app.dependency_overrides[get_isbn_cache_settings] = lambda: cache_settings
+    book = BookCreate(title="title", author="author")
+    write_cache(session, "9782070438617", book, cache_settings)
+    write_cache(session, "9782253067900", None, cache_settings)
+    write_cache(session, "9782377940820", None, cache_settings)
+
+    response = client.delete("/api/v1/admin/isbn-cache?expired_only=true")
+    assert response.status_code == 200
+    assert response.json() == {"deleted": 2}
+
+    response = client.delete("/api/v1/admin/isbn-cache")
+    assert response.json() == {"deleted": 1}
+    assert read_cache(session, "9782070438617", cache_settings) is None
@@ -0,0 +1,82 @@
+import babelfish
+import isbnlib
+import pytest
+
+from backend.internals import isbn_language
+from backend.internals.isbn_language import (
+    isbn2language,
+    language_index,
+    registration_group,
+)
+
+
+def scan_isbn2language(isbn):
+    """Former implementation, scanning the languages of babelfish"""
+    words = isbnlib.info(isbn).split()
+    if not words:
+        return None
+    lang = words[0]
+    lang2 = [item.alpha2 for item in babelfish.LANGUAGE_MATRIX if item.name == lang]
+    if len(lang2) > 0:
+        return lang2[0]
+    return None
+
+
+def prefix_isbns(padding: str) -> list[str]:
+    """An ISBN of every prefix of up to 3 digits after the EAN prefix"""
+    isbns = []
+    for ean_prefix in ("978", "979"):
+        for length in range(1, 4):
+            for group in range(10**length):
+                digits = f"{ean_prefix}{group:0{length}d}".ljust(12, padding)
+                isbns.append(digits + isbnlib.check_digit13(digits))
+    return isbns
+
+
+def test_language_index() -> None:
+    index = language_index()
+    assert index["French"] == "fr"
+    assert index["English"] == "en"
+    assert "Japan" not in index
+
+
+def test_same_as_scan(monkeypatch) -> None:
+    monkeypatch.setattr(isbn_language, "group_languages", {})
+    # the ISBNs padded with nines are mostly read from the groups met
+    # with the ISBNs padded with zeros
+    for isbn in prefix_isbns("0") + prefix_isbns("9"):
+        assert isbn2language(isbn) == scan_isbn2language(isbn), isbn
+
+
+def test_registration_group() -> None:
+    assert registration_group("9782070438617") == "9782"
+    assert registration_group("9786000000004") == "978600"
+    assert registration_group("9789990100006") == "97899901"
+    assert registration_group("9786100000003") == ""
+
+
+def test_group_read_once(monkeypatch) -> None:
+    monkeypatch.setattr(isbn_language, "group_languages", {})
+    assert isbn2language("9782070438617") == "fr"
+    assert isbn2language("9784000000000") is None
+    assert isbn2language("9786100000003") is None
+    assert isbn_language.group_languages == {"9782": "fr", "9784": None}
+
+    def info(isbn):
+        raise AssertionError(isbn)
+
+    monkeypatch.setattr(isbnlib, "info", info)
+    assert isbn2language("9782266111560") == "fr"
+    assert isbn2language("9784101010014") is None
+
+
+def test_isbn_formats() -> None:
+    assert isbn2language("9782070438617") == "fr"
+    assert isbn2language("2070438619") == "fr"
+    assert isbn2language("978-3-16-148410-0") == "de"
+    assert isbn2language("9784000000000") is None
+
+
+def test_invalid_isbn() -> None:
+    with pytest.raises(isbnlib.NotValidISBNError):
+        isbn2language("9782070438618")
@@ -0,0 +1,232 @@
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from pathlib import Path
+import asyncio
+import httpx
+import pytest
+import threading
+import time
+
+from backend.database import get_database_settings
+from backend.internals import constants
+from backend.internals.litefs import (
+    PRIMARY_TXID,
+    TXID_COOKIE,
+    LiteFSMiddleware,
+    LiteFSSettings,
+    WriteForwarding,
+    is_primary,
+    read_txid,
+)
+
+
+def write_position(mount_dir: Path, txid: int) -> None:
+    database = Path(get_database_settings().name).name
+    (mount_dir / f"{database}-pos").write_text(f"{txid:016x}/9e0b9c3d5c2e32a5\n")
+
+
+def node_app(mount_dir: Path, client=None, **settings) -> FastAPI:
+    """Application of a node: writes commit a transaction, reads return the
+    position of the node"""
+    settings = LiteFSSettings(enabled=True, mount_dir=mount_dir, **settings)
+    node = FastAPI()
+    node.add_middleware(LiteFSMiddleware, settings=settings, client=client)
+
+    @node.post("/items")
+    def create_item():
+        txid = read_txid(settings) + 1
+        write_position(mount_dir, txid)
+        return {"txid": txid}
+
+    @node.delete("/items", status_code=204)
+    def delete_items():
+        write_position(mount_dir, read_txid(settings) + 1)
+
+    @node.post("/items/batch")
+    def create_items():
+        def events():
+            # one transaction per streamed line
+            for _ in range(3):
+                txid = read_txid(settings) + 1
+                write_position(mount_dir, txid)
+                yield f"{txid}\n"
+
+        return StreamingResponse(events(), media_type="application/x-ndjson")
+
+    @node.get("/items")
+    def read_items():
+        return {"txid": read_txid(settings)}
+
+    return node
+
+
+@pytest.fixture(name="primary_dir")
+def primary_dir_fixture(tmp_path):
+    primary_dir = tmp_path / "primary"
+    primary_dir.mkdir()
+    write_position(primary_dir, 3)
+    return primary_dir
+
+
+@pytest.fixture(name="replica_dir")
+def replica_dir_fixture(tmp_path):
+    replica_dir = tmp_path / "replica"
+    replica_dir.mkdir()
+    (replica_dir / ".primary").write_text("primary-host\n")
+    write_position(replica_dir, 3)
+    return replica_dir
+
+
+def test_disabled(tmp_path) -> None:
+    (tmp_path / ".primary").write_text("primary-host")
+    settings = LiteFSSettings(enabled=False, mount_dir=tmp_path)
+    assert is_primary(settings)
+
+    node = FastAPI()
+    node.add_middleware(LiteFSMiddleware, settings=settings)
+    node.post("/items")(lambda: {})
+    response = TestClient(node).post("/items")
+    assert response.status_code == 200
+    assert TXID_COOKIE not in response.cookies
+
+
+def test_write_on_primary(primary_dir) -> None:
+    assert is_primary(LiteFSSettings(enabled=True, mount_dir=primary_dir))
+    client = TestClient(node_app(primary_dir))
+
+    response = client.post("/items")
+    assert response.json() == {"txid": 4}
+    # position after the write
+    assert response.cookies[TXID_COOKIE] == f"{4:016x}"
+
+
+def test_streamed_write_on_primary(primary_dir) -> None:
+    client = TestClient(node_app(primary_dir))
+
+    response = client.post("/items/batch")
+    assert response.text == "4\n5\n6\n"
+    # sent before the writes
+    assert response.cookies[TXID_COOKIE] == PRIMARY_TXID
+
+    # read once the stream has ended
+    response = client.get("/items")
+    assert response.json() == {"txid": 6}
+    assert response.cookies[TXID_COOKIE] == f"{6:016x}"
+
+    # without body, not streamed
+    response = client.delete("/items")
+    assert response.status_code == 204
+    assert response.cookies[TXID_COOKIE] == f"{7:016x}"
+
+
+def test_streamed_write_client_disconnected(primary_dir) -> None:
+    node = node_app(primary_dir)
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/items/batch",
+        "raw_path": b"/items/batch",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+    }
+    received = []
+
+    async def receive():
+        if received:
+            await asyncio.Event().wait()
+        received.append(True)
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            raise OSError("Client disconnected")
+
+    async def main():
+        with pytest.raises(OSError):
+            await node(scope, receive, send)
+
+        # no streamed write running anymore, before the loop closes the
+        # body iterator
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=node), base_url="http://testserver"
+        ) as client:
+            client.cookies[TXID_COOKIE] = PRIMARY_TXID
+            return await client.get("/items")
+
+    response = asyncio.run(main())
+    txid = response.json()["txid"]
+    assert txid > 3
+    assert response.cookies[TXID_COOKIE] == f"{txid:016x}"
+
+
+def test_read_after_streamed_write_replayed_on_primary(replica_dir) -> None:
+    client = TestClient(node_app(replica_dir))
+    client.cookies[TXID_COOKIE] = PRIMARY_TXID
+
+    response = client.get("/items")
+    assert response.status_code == 409
+    assert response.headers["fly-replay"] == "instance=primary-host"
+
+
+def test_write_replayed_on_primary(replica_dir) -> None:
+    assert not is_primary(LiteFSSettings(enabled=True, mount_dir=replica_dir))
+    client = TestClient(node_app(replica_dir))
+
+    response = client.post("/items")
+    assert response.status_code == 409
+    assert response.headers["fly-replay"] == "instance=primary-host"
+    assert read_txid(LiteFSSettings(mount_dir=replica_dir)) == 3
+
+    assert client.get("/items").json() == {"txid": 3}
+
+
+def test_write_proxied_to_primary(primary_dir, replica_dir) -> None:
+    primary = node_app(primary_dir)
+    proxy_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=primary))
+    client = TestClient(
+        node_app(
+            replica_dir,
+            client=proxy_client,
+            forwarding=WriteForwarding.proxy,
+            primary_url="http://{primary}",
+        )
+    )
+
+    response = client.post("/items")
+    assert response.status_code == 200
+    assert response.json() == {"txid": 4}
+    assert response.cookies[TXID_COOKIE] == f"{4:016x}"
+
+
+def test_read_your_writes(replica_dir) -> None:
+    client = TestClient(node_app(replica_dir))
+    client.cookies[TXID_COOKIE] = f"{5:016x}"
+
+    # replicated while the read waits
+    replication = threading.Timer(0.05, write_position, (replica_dir, 5))
+    replication.start()
+    start = time.monotonic()
+    response = client.get("/items")
+    replication.join()
+
+    assert response.json() == {"txid": 5}
+    assert time.monotonic() - start < constants.LITEFS_CATCH_UP_TIMEOUT
+
+
+def test_read_after_catch_up_timeout(replica_dir, monkeypatch) -> None:
+    monkeypatch.setattr(constants, "LITEFS_CATCH_UP_TIMEOUT", 0.05)
+    client = TestClient(node_app(replica_dir))
+    client.cookies[TXID_COOKIE] = f"{5:016x}"
+
+    # served from the stale replica
+    response = client.get("/items")
+    assert response.json() == {"txid": 3}
+
+    client.cookies[TXID_COOKIE] = "not-a-txid"
+    assert client.get("/items").status_code == 200
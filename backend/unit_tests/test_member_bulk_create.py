@@ -0,0 +1,59 @@
+from fastapi.testclient import TestClient
+import httpx
+
+from backend.internals.write_coordinator import WriteCoordinator
+
+
+def test_bulk_create_member_csv(client: TestClient) -> None:
+    response = client.post("/api/v1/families", json={"email": "email"})
+    assert response.status_code == 200
+
+    content = (
+        "firstname,surname,birthdate,family_id,family_referent\n"
+        "Jean-Pierre,Dupont,2019-12-04,1,true\n"
+        "Jeanne,Émile,,,\n"
+        "Marie,Curie,not a date,,\n"
+    )
+    response = client.post(
+        "/api/v1/members/bulk", content=content, headers={"content-type": "text/csv"}
+    )
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 2
+    assert [error["row"] for error in report["errors"]] == [3]
+    assert "birthdate" in report["errors"][0]["detail"]
+
+    response = client.get("/api/v1/members?search=emile")
+    members = response.json()["data"]
+    assert [member["firstname"] for member in members] == ["Jeanne"]
+    response = client.get("/api/v1/members/1")
+    assert response.json()["family"]["email"] == "email"
+
+
+def test_bulk_create_member_with_the_other_writes(lifespan) -> None:
+    async def requests(client: httpx.AsyncClient, coordinator: WriteCoordinator):
+        response = await client.post("/api/v1/families", json={"email": "email"})
+        assert response.status_code == 200
+        content = (
+            "firstname,surname,family_id\n"
+            "Jean-Pierre,Dupont,1\n"
+            # refused by the foreign key
+            "Jeanne,Émile,404\n"
+        )
+        response = await client.post(
+            "/api/v1/members/bulk",
+            content=content,
+            headers={"content-type": "text/csv"},
+        )
+        assert response.status_code == 200
+        # written by the coordinator, as the family
+        assert coordinator.writes == 2
+
+        members = await client.get("/api/v1/members")
+        return response.json(), members.json()
+
+    report, members = lifespan(requests)
+    assert report["inserted"] == 1
+    assert [error["row"] for error in report["errors"]] == [2]
+    assert members["meta"]["total_items"] == 1
+    assert members["data"][0]["surname"] == "Dupont"
@@ -0,0 +1,24 @@
+from fastapi.testclient import TestClient
+import csv
+import json
+
+from .test_member_read_all import add_a_lot_of_elements
+
+
+def test_export_member_ndjson(client: TestClient) -> None:
+    member_list = add_a_lot_of_elements(client, 150)
+
+    response = client.get("/api/v1/members/export")
+    assert response.status_code == 200
+    assert [json.loads(line) for line in response.text.splitlines()] == member_list
+
+
+def test_export_member_csv(client: TestClient) -> None:
+    member_list = add_a_lot_of_elements(client, 150)
+
+    response = client.get("/api/v1/members/export?format=csv")
+    assert response.status_code == 200
+    assert 'filename="members.csv"' in response.headers["content-disposition"]
+    rows = list(csv.DictReader(response.text.splitlines()))
+    assert [int(row["id"]) for row in rows] == [member["id"] for member in member_list]
+    assert rows[0]["birthdate"] == "2019-12-04"
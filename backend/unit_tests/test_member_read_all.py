@@ -130,3 +130,98 @@ def test_read_all_member_with_pagination_failure(
     assert response.status_code == 422
     data_response = response.json()
     assert "detail" in data_response
+
+
+def get_all_members_with_cursor(client: TestClient, filter: str = "") -> list:
+    data_response = list()
+    response = client.get(f"/api/v1/members?limit=7&{filter}")
+    while True:
+        assert response.status_code == 200
+        list_response = response.json()
+        data_response.extend(list_response["data"])
+
+        # exit the loop when there is no next page
+        next_cursor = list_response["meta"]["next_cursor"]
+        if next_cursor is None:
+            break
+        response = client.get(f"/api/v1/members?limit=7&cursor={next_cursor}&{filter}")
+    return data_response
+
+
+def test_read_all_member_with_cursor(client: TestClient) -> None:
+    member_list = add_a_lot_of_elements(client, 150)
+
+    assert get_all_members_with_cursor(client) == member_list
+
+
+def test_read_all_member_with_invalid_cursor(client: TestClient) -> None:
+    response = client.get("/api/v1/members?cursor=invalid")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid cursor"
+
+
+@pytest.mark.parametrize(
+    "search,expected",
+    [
+        ("jean", ["Jean-Pierre Dupont", "Jeanne Émile"]),
+        ("JEANP", ["Jean-Pierre Dupont"]),
+        ("jean pierre", ["Jean-Pierre Dupont"]),
+        ("emi", ["Jeanne Émile", "Marie Émilie"]),
+        ("Émilie", ["Marie Émilie"]),
+        ("dup", ["Jean-Pierre Dupont"]),
+        ("pont", []),
+    ],
+)
+def test_read_all_member_search(
+    client: TestClient, search: str, expected: list
+) -> None:
+    for firstname, surname in [
+        ("Jean-Pierre", "Dupont"),
+        ("Jeanne", "Émile"),
+        ("Marie", "Émilie"),
+    ]:
+        member_data = {"firstname": firstname, "surname": surname}
+        response = client.post("/api/v1/members", json=member_data)
+        assert response.status_code == 200
+
+    response = client.get("/api/v1/members", params={"search": search})
+    assert response.status_code == 200
+    list_response = response.json()
+    names = [
+        f"{member['firstname']} {member['surname']}" for member in list_response["data"]
+    ]
+    assert names == expected
+    assert list_response["meta"]["total_items"] == len(expected)
+
+
+def test_read_all_member_search_after_update(client: TestClient) -> None:
+    member_data = {"firstname": "Jean", "surname": "Dupont"}
+    response = client.post("/api/v1/members", json=member_data)
+    assert response.status_code == 200
+    member = response.json()
+
+    response = client.patch(
+        f"/api/v1/members/{member['id']}", json={"surname": "Éluard"}
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/members?search=dupont")
+    assert response.json()["data"] == []
+    response = client.get("/api/v1/members?search=eluard")
+    assert [member["id"] for member in response.json()["data"]] == [member["id"]]
+
+
+def test_read_all_member_filtered_by_family(client: TestClient) -> None:
+    for email in ["first", "second"]:
+        response = client.post("/api/v1/families", json={"email": email})
+        assert response.status_code == 200
+    member_list = []
+    for family_id in [1, 2, 1]:
+        member_data = {"firstname": "a", "surname": "b", "family_id": family_id}
+        response = client.post("/api/v1/members", json=member_data)
+        assert response.status_code == 200
+        member_list.append(response.json())
+
+    response = client.get("/api/v1/members?filter[family_id]=1&sort=-id")
+    assert response.status_code == 200
+    assert response.json()["data"] == [member_list[2], member_list[0]]
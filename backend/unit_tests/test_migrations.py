@@ -0,0 +1,113 @@
+from sqlalchemy import event, inspect
+from pathlib import Path
+from sqlmodel import Session, SQLModel, create_engine, select
+import pytest
+
+from backend.internals import migrations
+from backend.internals.book_search import FTS_TABLE, search_books_statement
+from backend.internals.migrations import SCHEMA_VERSION, migrate, schema_version
+from backend.models import BookTable, CirculationTable, MemberTable
+
+BASELINE_SCHEMA = Path(__file__).parent / "fixtures" / "schema" / "baseline.sql"
+
+
+@pytest.fixture(name="engine")
+def engine_fixture(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    yield engine
+    engine.dispose()
+
+
+def index_names(engine, table: str) -> set[str]:
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_new_database(engine) -> None:
+    assert migrate(engine) == [
+        migration.__name__ for migration in migrations.MIGRATIONS
+    ]
+
+    with engine.connect() as connection:
+        assert schema_version(connection) == SCHEMA_VERSION
+    assert FTS_TABLE in inspect(engine).get_table_names()
+    assert "ix_enrichmentjobtable_unfinished" in index_names(
+        engine, "enrichmentjobtable"
+    )
+
+
+def test_up_to_date_database(engine) -> None:
+    migrate(engine)
+    statements = []
+    event.listen(
+        engine,
+        "before_cursor_execute",
+        lambda connection, cursor, statement, *args: statements.append(statement),
+    )
+
+    assert migrate(engine) == []
+    assert statements == ["PRAGMA user_version"]
+
+
+def test_database_created_before_the_migrations(engine) -> None:
+    with engine.begin() as connection:
+        connection.connection.executescript(BASELINE_SCHEMA.read_text())
+        connection.exec_driver_sql(
+            "INSERT INTO booktable (title, author, archived, available)"
+            " VALUES ('Électre', 'Jean Giraudoux', 0, 1)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO membertable"
+            " (firstname, surname, archived, family_referent)"
+            " VALUES ('Hélène', 'Boucher', 0, 0)"
+        )
+        connection.exec_driver_sql(
+            "INSERT INTO circulationtable"
+            " (borrowed_date, book_id, member_id, archived)"
+            " VALUES ('2024-01-02', 1, 1, 0)"
+        )
+
+    migrate(engine)
+
+    inspector = inspect(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        assert columns == {column.name for column in table.columns}
+        assert {index.name for index in table.indexes} <= index_names(
+            engine, table.name
+        )
+    with Session(engine) as session:
+        book = session.exec(select(BookTable)).one()
+        assert book.title_normalized == "electre"
+        assert book.author_normalized == "jeangiraudoux"
+        assert book.cover_hash is None
+        # indexed by the new FTS index
+        assert session.exec(search_books_statement("electre")).all() == [book]
+        member = session.exec(select(MemberTable)).one()
+        assert member.firstname_normalized == "helene"
+        assert session.exec(select(CirculationTable)).one().book_id == book.id
+
+
+def test_newer_schema_kept(engine) -> None:
+    with engine.begin() as connection:
+        connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION + 1}")
+
+    assert migrate(engine) == []
+    assert inspect(engine).get_table_names() == []
+
+
+def test_failed_migration_rolled_back(engine, monkeypatch) -> None:
+    def failing_migration(connection) -> None:
+        connection.exec_driver_sql("CREATE INDEX ix_booktable_isbn ON booktable (isbn)")
+        raise RuntimeError("failed")
+
+    migrate(engine)
+    monkeypatch.setattr(
+        migrations, "MIGRATIONS", [*migrations.MIGRATIONS, failing_migration]
+    )
+    monkeypatch.setattr(migrations, "SCHEMA_VERSION", SCHEMA_VERSION + 1)
+
+    with pytest.raises(RuntimeError):
+        migrate(engine)
+    with engine.connect() as connection:
+        assert schema_version(connection) == SCHEMA_VERSION
+    assert "ix_booktable_isbn" not in index_names(engine, "booktable")
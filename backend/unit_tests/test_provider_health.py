@@ -0,0 +1,193 @@
+from fastapi.testclient import TestClient
+import asyncio
+import httpx
+import pytest
+import time
+
+from backend.internals import book_notice
+from backend.internals.book_notice import _query_provider
+from backend.internals.http_client import HostLimitedTransport
+from backend.internals.provider_health import (
+    CircuitBreaker,
+    ProviderHealth,
+    TokenBucket,
+    provider_health,
+)
+from backend.main import app
+from backend.users import current_superuser
+
+
+async def failing_lookup(isbn):
+    raise httpx.ConnectError("connection refused")
+
+
+async def missing_lookup(isbn):
+    return None
+
+
+def query(lookup, failures: list = None):
+    return asyncio.run(
+        _query_provider(None, "bnf", lookup, "9782070438617", failures=failures)
+    )
+
+
+def test_circuit_breaker() -> None:
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.05)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial at a time
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    time.sleep(0.05)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_query_provider_skips_open_circuit() -> None:
+    for _ in range(5):
+        query(failing_lookup)
+    assert provider_health.breaker("bnf").state == "open"
+
+    calls = []
+
+    async def lookup(isbn):
+        calls.append(isbn)
+        return None
+
+    failures = []
+    assert query(lookup, failures) is None
+    assert calls == []
+    assert failures == ["bnf"]
+    assert provider_health.provider_stats("bnf").skipped == 1
+
+
+def test_query_provider_statistics() -> None:
+    for _ in range(3):
+        query(missing_lookup)
+    query(failing_lookup)
+
+    stats = provider_health.provider_stats("bnf")
+    assert stats.lookups == 4
+    assert stats.failures == 1
+    assert stats.error_rate == 0.25
+    assert stats.last_error == "ConnectError connection refused"
+    assert provider_health.breaker("bnf").consecutive_failures == 1
+
+    query(missing_lookup)
+    assert provider_health.breaker("bnf").consecutive_failures == 0
+
+
+def test_query_provider_cancelled_is_not_a_failure() -> None:
+    async def slow_lookup(isbn):
+        await asyncio.sleep(5)
+
+    async def main():
+        lookup = asyncio.create_task(_query_provider(None, "bnf", slow_lookup, "isbn"))
+        await asyncio.sleep(0.01)
+        lookup.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await lookup
+
+    asyncio.run(main())
+    assert provider_health.provider_stats("bnf").failures == 0
+
+
+def test_query_provider_throttled_beyond_its_deadline(monkeypatch) -> None:
+    monkeypatch.setitem(book_notice.PROVIDER_DEADLINES, "banq", 0.1)
+    health = ProviderHealth()
+    # an empty bucket, a token every 0.25 s
+    health.buckets["cap.banq.qc.ca"] = TokenBucket(rate=4.0, capacity=1.0)
+    health.buckets["cap.banq.qc.ca"].tokens = 0.0
+
+    async def lookup(isbn, client):
+        await client.get(f"https://cap.banq.qc.ca/{isbn}")
+        await client.get(f"https://cap.banq.qc.ca/{isbn}/cover")
+        return isbn
+
+    async def main():
+        transport = HostLimitedTransport(
+            httpx.MockTransport(lambda request: httpx.Response(200)), 3, health
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await _query_provider(
+                None, "banq", lookup, "9782070438617", client=client
+            )
+
+    assert asyncio.run(main()) == "9782070438617"
+    stats = provider_health.provider_stats("banq")
+    assert stats.failures == 0
+    # the waits for the tokens aren't part of the latency
+    assert stats.latency_ms(50) < 100
+
+
+def test_token_bucket() -> None:
+    bucket = TokenBucket(rate=100.0, capacity=1.0)
+
+    async def acquire(count: int) -> float:
+        start = time.perf_counter()
+        for _ in range(count):
+            await bucket.acquire()
+        return time.perf_counter() - start
+
+    assert asyncio.run(acquire(1)) < 0.005
+    assert asyncio.run(acquire(10)) >= 0.09
+
+    bucket.slow_down()
+    bucket.slow_down()
+    assert bucket.rate == 25.0
+    for _ in range(100):
+        bucket.speed_up()
+    assert bucket.rate == 100.0
+
+
+def test_transport_slows_down_on_too_many_requests() -> None:
+    health = ProviderHealth()
+
+    def handler(request):
+        return httpx.Response(429 if request.url.path == "/busy" else 200)
+
+    async def main():
+        transport = HostLimitedTransport(httpx.MockTransport(handler), 3, health)
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get("https://a.example/busy")
+            await client.get("https://b.example/")
+
+    asyncio.run(main())
+    assert (
+        health.bucket("a.example").rate == health.bucket("a.example").maximal_rate / 2
+    )
+    assert health.bucket("b.example").rate == health.bucket("b.example").maximal_rate
+
+
+def test_read_providers_health(client: TestClient) -> None:
+    response = client.get("/api/v1/admin/providers")
+    assert response.status_code == 401
+
+    app.dependency_overrides[current_superuser] = lambda: None
+    for _ in range(5):
+        query(failing_lookup)
+    provider_health.bucket("catalogue.bnf.fr")
+
+    response = client.get("/api/v1/admin/providers")
+    assert response.status_code == 200
+    providers = response.json()["providers"]
+    assert len(providers) == 1
+    assert providers[0]["provider"] == "bnf"
+    assert providers[0]["state"] == "open"
+    assert providers[0]["failures"] == 5
+    assert providers[0]["error_rate"] == 1.0
+    assert providers[0]["latency_p50_ms"] is not None
+    assert response.json()["hosts"][0]["host"] == "catalogue.bnf.fr"
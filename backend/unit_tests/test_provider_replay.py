@@ -0,0 +1,145 @@
+import asyncio
+import httpx
+import pytest
+import time
+from pathlib import Path
+
+from backend.config import Settings
+from backend.internals import book_notice
+from backend.internals.provider_replay import (
+    HostBehaviour,
+    Recording,
+    RecordingTransport,
+    ReplayTransport,
+)
+
+RECORDING = Path(__file__).parent / "fixtures" / "providers" / "recording.json"
+SETTINGS = Settings(
+    admin_email="admin@example.com",
+    google_api_key="key",
+    google_custom_search_engine="engine",
+)
+
+
+def lookup(isbn: str, transport: ReplayTransport, failures=None):
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await book_notice.isbn2book(
+                isbn, SETTINGS, client=client, failures=failures
+            )
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize(
+    "isbn,title,cover",
+    [
+        (
+            "9782070360123",
+            "Vol de nuit",
+            "https://catalogue.bnf.fr/couverture?&appName=NE"
+            "&idArk=ark:/12148/cb35250591c&couverture=1",
+        ),
+        (
+            "9780141036144",
+            "1984 Nineteen Eighty-Four",
+            "http://books.google.com/books/content?id=kotPYEqx7kMC"
+            "&printsec=frontcover&img=1&zoom=1&edge=curl&source=gbs_api",
+        ),
+        (
+            "9782890379046",
+            "Les saisons de l'érable",
+            "https://www.example-librairie.ca/images/9782890379046.jpg",
+        ),
+    ],
+)
+def test_isbn2book_replays_recording(isbn: str, title: str, cover: str) -> None:
+    transport = ReplayTransport(Recording.load(RECORDING))
+    book = lookup(isbn, transport)
+    assert book.title == title
+    assert book.cover == cover
+    assert transport.unrecorded == []
+
+
+def test_isbn2book_replays_not_found() -> None:
+    transport = ReplayTransport(Recording.load(RECORDING))
+    assert lookup("9791099999993", transport) is None
+    assert transport.unrecorded == []
+
+
+def test_replay_injected_failures() -> None:
+    transport = ReplayTransport(
+        Recording.load(RECORDING),
+        {"www.googleapis.com": HostBehaviour(failure_rate=1.0)},
+    )
+    failures = []
+    book = lookup("9780141036144", transport, failures)
+    # Google Books failed, the record comes from Open Library
+    assert book.title == "Nineteen Eighty-Four "
+    assert failures == ["googlebooks"]
+    assert transport.failures["www.googleapis.com"] == 1
+
+
+@pytest.mark.parametrize("failure", ["timeout", "status"])
+def test_replay_injected_failure_kinds(failure: str) -> None:
+    transport = ReplayTransport(
+        Recording.load(RECORDING),
+        default=HostBehaviour(latency=0.01, failure_rate=1.0, failure=failure),
+    )
+
+    async def main():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.get("https://www.sudoc.fr/services/isbn2ppn/1")
+
+    if failure == "timeout":
+        with pytest.raises(httpx.ReadTimeout):
+            asyncio.run(main())
+    else:
+        assert asyncio.run(main()).status_code == 503
+
+
+def test_replay_latency() -> None:
+    transport = ReplayTransport(
+        Recording.load(RECORDING),
+        default=HostBehaviour(latency=0.05, jitter=0.01),
+    )
+
+    start = time.perf_counter()
+    book = lookup("9782070360123", transport)
+    # the providers are queried concurrently, then the BnF cover
+    assert 0.1 <= time.perf_counter() - start < 0.5
+    assert book.title == "Vol de nuit"
+    assert transport.requests["catalogue.bnf.fr"] == 2
+
+
+def test_record_and_replay(tmp_path: Path) -> None:
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/cover.png":
+            return httpx.Response(200, content=b"\x89PNG\r\n\x1a\n\xff")
+        return httpx.Response(200, text="<record>é</record>")
+
+    async def get_all(transport):
+        async with httpx.AsyncClient(transport=transport) as client:
+            return [
+                await client.get(f"https://example.org/{path}")
+                for path in ["record?isbn=1", "cover.png", "missing"]
+            ]
+
+    recording = Recording()
+    asyncio.run(get_all(RecordingTransport(httpx.MockTransport(handler), recording)))
+    recording.save(tmp_path / "recording.json")
+    del recording.responses["GET https://example.org/missing"]
+
+    transport = ReplayTransport(recording)
+    record, cover, missing = asyncio.run(get_all(transport))
+    assert record.text == "<record>é</record>"
+    assert cover.content == b"\x89PNG\r\n\x1a\n\xff"
+    assert missing.status_code == 404
+    assert transport.unrecorded == ["GET https://example.org/missing"]
+
+    loaded = Recording.load(tmp_path / "recording.json")
+    assert loaded.responses.keys() == {
+        "GET https://example.org/record?isbn=1",
+        "GET https://example.org/cover.png",
+        "GET https://example.org/missing",
+    }
@@ -0,0 +1,148 @@
+import asyncio
+import threading
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session
+
+from backend import main
+from backend.internals import book_notice, constants
+from backend.internals.provider_scheduler import (
+    ProviderScheduler,
+    isbn_ranges,
+    provider_scheduler,
+)
+from backend.unit_tests.test_book_notice import SETTINGS, FakeProvider, use_providers
+
+FRENCH_ISBN = "9782070438617"
+QUEBEC_ISBN = "9782895403241"
+PROVIDERS = [("bnf", None), ("googlebooks", None), ("banq", None)]
+
+
+def names(providers) -> list[str]:
+    return [name for name, _ in providers]
+
+
+def learn(scheduler: ProviderScheduler, isbn: str, found: dict[str, bool]) -> None:
+    for _ in range(constants.PROVIDER_SCHEDULER_MIN_LOOKUPS):
+        for provider, hit in found.items():
+            scheduler.record(isbn, provider, 0.1, found=hit)
+
+
+def test_isbn_ranges() -> None:
+    assert isbn_ranges(FRENCH_ISBN) == ["978-2-07", "978-2"]
+    assert isbn_ranges(QUEBEC_ISBN) == ["978-2-89", "978-2"]
+    assert isbn_ranges("9791032703137") == ["979-10-32", "979-10"]
+    # invalid check digit
+    assert isbn_ranges("9782895403245") == ["978"]
+
+
+def test_default_order_until_enough_lookups() -> None:
+    scheduler = ProviderScheduler()
+    scheduler.record(QUEBEC_ISBN, "bnf", 0.1, found=False)
+    scheduler.record(QUEBEC_ISBN, "banq", 0.1, found=True)
+
+    now, deferred = scheduler.order(QUEBEC_ISBN, PROVIDERS)
+    assert names(now) == ["bnf", "googlebooks", "banq"]
+    assert deferred == []
+
+
+def test_order_per_isbn_range() -> None:
+    scheduler = ProviderScheduler()
+    learn(scheduler, FRENCH_ISBN, {"bnf": True, "googlebooks": True, "banq": False})
+    learn(scheduler, QUEBEC_ISBN, {"bnf": False, "googlebooks": True, "banq": True})
+
+    now, deferred = scheduler.order(FRENCH_ISBN, PROVIDERS)
+    assert names(now) == ["bnf", "googlebooks"]
+    assert names(deferred) == ["banq"]
+
+    now, deferred = scheduler.order(QUEBEC_ISBN, PROVIDERS)
+    assert names(now) == ["googlebooks", "banq"]
+    assert names(deferred) == ["bnf"]
+
+    # another French publisher, ordered by the whole group
+    now, deferred = scheduler.order("9782013944762", PROVIDERS)
+    assert names(now) == ["googlebooks", "bnf", "banq"]
+    assert deferred == []
+
+
+def test_order_by_latency_on_same_hit_rate() -> None:
+    scheduler = ProviderScheduler()
+    for _ in range(constants.PROVIDER_SCHEDULER_MIN_LOOKUPS):
+        scheduler.record(FRENCH_ISBN, "bnf", 0.5, found=True)
+        scheduler.record(FRENCH_ISBN, "googlebooks", 0.1, found=True)
+
+    now, _ = scheduler.order(FRENCH_ISBN, PROVIDERS)
+    assert names(now) == ["googlebooks", "bnf", "banq"]
+
+
+def test_save_and_load(session: Session) -> None:
+    scheduler = ProviderScheduler()
+    learn(scheduler, QUEBEC_ISBN, {"bnf": False, "banq": True})
+    scheduler.save(session)
+
+    restarted = ProviderScheduler()
+    restarted.load(session)
+    assert restarted.order(QUEBEC_ISBN, PROVIDERS) == scheduler.order(
+        QUEBEC_ISBN, PROVIDERS
+    )
+    stats = restarted.range_stats("978-2-89", "banq")
+    assert (stats.lookups, stats.hits, stats.latency_ms) == (20, 20, 100.0)
+
+    # saved again after new lookups only
+    restarted.record(QUEBEC_ISBN, "banq", 0.1, found=True)
+    restarted.save(session)
+    scheduler.load(session)
+    assert scheduler.range_stats("978-2-89", "banq").lookups == 21
+
+
+def test_periodic_save_survives_errors(monkeypatch) -> None:
+    monkeypatch.setattr(constants, "PROVIDER_SCHEDULER_SAVE_INTERVAL", 0.01)
+    saves = []
+
+    def save_provider_stats():
+        saves.append(threading.current_thread())
+        if len(saves) == 1:
+            raise OperationalError("UPDATE", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(main, "save_provider_stats", save_provider_stats)
+
+    async def run():
+        saver = asyncio.create_task(main.save_provider_stats_periodically())
+        while len(saves) < 2:
+            await asyncio.sleep(0.01)
+        saver.cancel()
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    # off the event loop
+    assert threading.main_thread() not in saves
+
+
+def test_isbn2book_learns_order(monkeypatch) -> None:
+    async def no_cover(*args, client=None):
+        return None
+
+    monkeypatch.setattr(book_notice, "openlibrarycover", no_cover)
+    monkeypatch.setattr(book_notice, "googleimagescover", no_cover)
+    bnf = FakeProvider("bnf", 0.02, found=False)
+    banq = FakeProvider("banq", 0.001, found=True)
+    use_providers(monkeypatch, bnf, banq)
+
+    async def main():
+        for _ in range(constants.PROVIDER_SCHEDULER_MIN_LOOKUPS):
+            book = await book_notice.isbn2book(QUEBEC_ISBN, SETTINGS)
+            assert book.title == "banq"
+
+    asyncio.run(main())
+    stats = provider_scheduler.range_stats("978-2-89", "bnf")
+    assert (stats.lookups, stats.hits) == (20, 0)
+
+    # BnF is now deferred, and not queried when BAnQ finds the book
+    bnf.started = False
+    book = asyncio.run(book_notice.isbn2book(QUEBEC_ISBN, SETTINGS))
+    assert book.title == "banq"
+    assert not bnf.started
+
+    # but still queried when BAnQ doesn't
+    banq.found = False
+    assert asyncio.run(book_notice.isbn2book(QUEBEC_ISBN, SETTINGS)) is None
+    assert bnf.started
@@ -0,0 +1,83 @@
+import asyncio
+import httpx
+import pytest
+from pathlib import Path
+
+from backend.internals import sudoc_rdf
+from backend.internals.book_notice import isbn2book_sudoc
+from backend.internals.sudoc_rdf import (
+    UnsupportedRdf,
+    extract_sudoc_fields,
+    query_sudoc_fields,
+    sudoc_fields,
+)
+
+FIXTURES = Path(__file__).parent / "fixtures" / "sudoc"
+RECORDS = ["000212369.rdf", "123456789.rdf"]
+
+
+def as_strings(fields):
+    return {key: None if value is None else str(value) for key, value in fields.items()}
+
+
+@pytest.mark.parametrize("record", RECORDS)
+def test_same_fields_as_rdflib(record: str) -> None:
+    content = (FIXTURES / record).read_bytes()
+    fields = extract_sudoc_fields(content)
+    assert fields == as_strings(query_sudoc_fields(content.decode()))
+
+
+def test_typed_literal_falls_back_to_rdflib() -> None:
+    content = (FIXTURES / "typed_date.rdf").read_bytes()
+    with pytest.raises(UnsupportedRdf):
+        extract_sudoc_fields(content)
+    assert str(sudoc_fields(content, content.decode())["date"]) == "1939"
+
+
+def test_no_book() -> None:
+    content = b"""<rdf:RDF
+        xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+        xmlns:dc="http://purl.org/dc/elements/1.1/">
+      <rdf:Description rdf:about="http://www.sudoc.fr/1/id">
+        <dc:title>Not a book</dc:title>
+      </rdf:Description>
+    </rdf:RDF>"""
+    assert extract_sudoc_fields(content) is None
+    assert query_sudoc_fields(content.decode()) is None
+
+
+@pytest.mark.parametrize("streamed", [True, False])
+def test_isbn2book_sudoc(monkeypatch, streamed: bool) -> None:
+    if not streamed:
+
+        def unsupported(content):
+            raise UnsupportedRdf("forced")
+
+        monkeypatch.setattr(sudoc_rdf, "extract_sudoc_fields", unsupported)
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if "isbn2ppn" in request.url.path:
+            return httpx.Response(
+                200,
+                text="<sudoc><query><isbn>9782070360123</isbn>"
+                "<result><ppn>000212369</ppn></result></query></sudoc>",
+            )
+        return httpx.Response(200, content=(FIXTURES / "000212369.rdf").read_bytes())
+
+    async def main():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            return await isbn2book_sudoc("9782070360123", client)
+
+    book = asyncio.run(main())
+    assert book.model_dump() == {
+        **book.model_dump(),
+        "title": "Vol de nuit",
+        "author": "Antoine de Saint-Exupéry",
+        "abstract": "",
+        "publication_date": "1972",
+        "publisher": "Gallimard",
+        "format": "1 vol. (186 p.) ; 18 cm",
+        "language": "fr",
+        "isbn": 9782070360123,
+        "record_source": "http://www.sudoc.fr/000212369/id",
+    }
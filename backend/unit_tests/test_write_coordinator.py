@@ -0,0 +1,197 @@
+from fastapi import HTTPException
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, SQLModel, create_engine, select
+import asyncio
+import httpx
+import pytest
+import threading
+
+from backend.database import SessionRunner
+from backend.internals.table_management import row_count_cache
+from backend.internals.write_coordinator import WriteCoordinator, create_writer_engine
+from backend.models import BookCreate, BookTable, BookUpdate
+from backend.routers.book import _create_book, _update_book
+
+
+@pytest.fixture(name="writer_engine")
+def writer_engine_fixture(tmp_path):
+    engine = create_writer_engine(f"sqlite:///{tmp_path / 'test.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def run_writes(engine, writes: list) -> tuple[WriteCoordinator, list]:
+    """Run (work, *args) writes concurrently through a coordinator"""
+
+    async def main():
+        coordinator = WriteCoordinator(engine)
+        coordinator.start()
+        try:
+            results = await asyncio.gather(
+                *(coordinator.write(*write) for write in writes),
+                return_exceptions=True,
+            )
+        finally:
+            await coordinator.stop()
+        return coordinator, results
+
+    return asyncio.run(main())
+
+
+def test_group_commit(writer_engine) -> None:
+    commits = []
+    event.listen(writer_engine, "commit", lambda connection: commits.append(1))
+
+    books = [BookCreate(title=f"t{index}", author="a") for index in range(10)]
+    coordinator, results = run_writes(
+        writer_engine, [(_create_book, book) for book in books]
+    )
+
+    assert [book.title for book in results] == [book.title for book in books]
+    assert len({book.id for book in results}) == 10
+    # queued together, committed once
+    assert coordinator.writes == 10
+    assert coordinator.groups == 1
+    assert len(commits) == 1
+
+
+def test_failed_write_rolled_back_alone(writer_engine) -> None:
+    def insert_without_title(session: Session) -> None:
+        session.add(BookTable(title=None, author="a"))
+        session.commit()
+
+    _, results = run_writes(
+        writer_engine,
+        [
+            (_create_book, BookCreate(title="first", author="a")),
+            (insert_without_title,),
+            (_update_book, 404, BookUpdate(title="missing")),
+            (_create_book, BookCreate(title="last", author="a")),
+        ],
+    )
+
+    assert isinstance(results[1], IntegrityError)
+    assert isinstance(results[2], HTTPException)
+    assert results[2].status_code == 404
+    with Session(writer_engine) as session:
+        titles = session.exec(select(BookTable.title).order_by(BookTable.id)).all()
+    assert titles == ["first", "last"]
+
+
+def test_row_count_invalidated_after_commit(writer_engine, tmp_path) -> None:
+    reader = create_engine(f"sqlite:///file:{tmp_path / 'test.db'}?mode=ro&uri=true")
+    with Session(reader) as session:
+        assert row_count_cache.get(session, BookTable) == 0
+
+    def insert_book(session: Session) -> None:
+        # without invalidating the count itself
+        session.add(BookTable(title="t", author="a"))
+        session.commit()
+
+    run_writes(writer_engine, [(insert_book,)])
+    with Session(reader) as session:
+        assert row_count_cache.get(session, BookTable) == 1
+    reader.dispose()
+
+
+def test_session_runner_write(writer_engine) -> None:
+    async def main():
+        coordinator = WriteCoordinator(writer_engine)
+        coordinator.start()
+        try:
+            with Session(writer_engine) as session:
+                runner = SessionRunner(session, coordinator)
+                return await runner.write(
+                    _create_book, BookCreate(title="t", author="a")
+                )
+        finally:
+            await coordinator.stop()
+
+    book = asyncio.run(main())
+    assert book.id == 1
+    assert book.title == "t"
+
+
+async def write_in_one_group(coordinator: WriteCoordinator, requests: list) -> list:
+    """Send requests while the writer is busy, so that their writes are
+    queued, then committed in one group"""
+    started = threading.Event()
+    released = threading.Event()
+
+    def busy(session: Session) -> None:
+        started.set()
+        released.wait(5)
+
+    busy_write = asyncio.create_task(coordinator.write(busy))
+    await asyncio.to_thread(started.wait, 5)
+    responses = asyncio.gather(*requests)
+    async with asyncio.timeout(5):
+        while coordinator._queue.qsize() < len(requests):
+            await asyncio.sleep(0.01)
+    groups = coordinator.groups
+    released.set()
+    await busy_write
+    results = await responses
+    # the busy write, then the group of the requests
+    assert coordinator.groups == groups + 2
+    return results
+
+
+def test_route_writes_committed_together(lifespan) -> None:
+    async def requests(client: httpx.AsyncClient, coordinator: WriteCoordinator):
+        for title in ("first", "second"):
+            await client.post("/api/v1/books", json={"title": title, "author": "a"})
+        response = await client.get("/api/v1/books")
+        assert response.json()["meta"]["total_items"] == 2
+
+        commits = []
+        event.listen(coordinator.engine, "commit", lambda connection: commits.append(1))
+        responses = await write_in_one_group(
+            coordinator,
+            [
+                client.post("/api/v1/books", json={"title": "third", "author": "a"}),
+                client.post("/api/v1/books", json={"title": "fourth", "author": "a"}),
+                client.patch("/api/v1/books/1", json={"title": "updated"}),
+                client.delete("/api/v1/books/2"),
+            ],
+        )
+        assert [response.status_code for response in responses] == [
+            200,
+            200,
+            200,
+            204,
+        ]
+        # the busy write didn't start a transaction
+        assert len(commits) == 1
+
+        # the cached count was dropped
+        response = await client.get("/api/v1/books")
+        assert response.json()["meta"]["total_items"] == 3
+        return {book["title"] for book in response.json()["data"]}
+
+    assert lifespan(requests) == {"updated", "third", "fourth"}
+
+
+def test_failed_route_write_rolled_back_alone(lifespan) -> None:
+    async def requests(client: httpx.AsyncClient, coordinator: WriteCoordinator):
+        member = {"firstname": "f", "surname": "s", "family_referent": False}
+        responses = await write_in_one_group(
+            coordinator,
+            [
+                client.post("/api/v1/members", json=member),
+                # refused by the foreign key
+                client.post("/api/v1/members", json={**member, "family_id": 404}),
+                client.patch("/api/v1/books/404", json={"title": "missing"}),
+                client.post("/api/v1/members", json={**member, "surname": "last"}),
+            ],
+        )
+        assert [response.status_code for response in responses] == [200, 500, 404, 200]
+
+        response = await client.get("/api/v1/members")
+        assert response.json()["meta"]["total_items"] == 2
+        return {member["surname"] for member in response.json()["data"]}
+
+    # queued in any order
+    assert lifespan(requests) == {"s", "last"}